@@ -0,0 +1,530 @@
+"""
+Бенчмарк обработки текстов: субтитров, Markdown и экспорта Telegram.
+
+Генерирует воспроизводимые синтетические корпуса нескольких размеров — .srt,
+.vtt в стиле автоматических субтитров YouTube (теги слов <c>, метки времени
+внутри реплик, повторы строк), Markdown со ссылками и хэштегами и HTML экспорта
+чата Telegram — и прогоняет через них основные функции текстовых скриптов:
+
+- srt_to_txt — convert_srt_to_txt.convert_file;
+- vtt_to_srt — vtt_to_srt.convert_vtt_file;
+- vtt_clean — vtt_to_srt.convert_vtt_to_clean_srt_and_txt (очистка повторов для download_subtitles);
+- markdown_cleaner — clean_markdown из Text scripts;
+- telegram — extract_text_from_html из Text scripts/TG.
+
+Для каждого инструмента и размера в JSON сохраняются МБ/с, файлов/с (лучший из
+--repeat прогонов), пиковая память по tracemalloc (отдельным прогоном — tracemalloc
+замедляет код) и SHA-256 результата. --compare сравнивает два файла результатов:
+ухудшение скорости или памяти больше --threshold и любое изменение результата
+на том же корпусе считаются регрессией.
+
+С --methods дополнительно сравнивается стоимость конвертации .vtt → .srt на один
+файл: встроенный конвертер в одном процессе, пулом процессов и запуск ffmpeg на
+каждый файл (если ffmpeg есть).
+
+Примеры:
+    python benchmark_text.py --output results.json
+    python benchmark_text.py --sizes small,medium,large --tools srt_to_txt,vtt_clean --output new.json
+    python benchmark_text.py --compare results.json new.json
+    python benchmark_text.py --methods --workers 4
+"""
+import os
+import sys
+import json
+import time
+import random
+import shutil
+import hashlib
+import argparse
+import platform
+import tempfile
+import tracemalloc
+import importlib.util
+
+import vtt_to_srt
+import convert_srt_to_txt
+
+SCRIPTS_DIR = os.path.dirname(os.path.abspath(__file__))
+TEXT_SCRIPTS_DIR = os.path.join(SCRIPTS_DIR, "Text scripts")
+
+WORDS = (
+    "сегодня мы разберём как устроен этот алгоритм и почему он работает быстрее "
+    "the quick brown fox jumps over the lazy dog while we talk about caching and latency"
+).split()
+
+# Размер корпуса: (количество файлов, единиц в файле — реплик, абзацев или сообщений)
+SIZES = {
+    "small": (50, 50),
+    "medium": (100, 400),
+    "large": (10, 5000),
+}
+TOOLS = ("srt_to_txt", "vtt_to_srt", "vtt_clean", "markdown_cleaner", "telegram")
+# Слова и фраза, которые удаляет markdown_cleaner в бенчмарке
+MARKDOWN_WORDS_TO_REMOVE = ["быстрее", "lazy", "(как устроен)"]
+
+# Метрики, для которых рост означает ухудшение, и наоборот
+LOWER_IS_BETTER = ("wall_seconds", "peak_memory_mb")
+HIGHER_IS_BETTER = ("mb_per_second", "files_per_second")
+
+def format_vtt_timestamp(milliseconds):
+    return (
+        f"{milliseconds // 3600000:02d}:{milliseconds // 60000 % 60:02d}:"
+        f"{milliseconds // 1000 % 60:02d}.{milliseconds % 1000:03d}"
+    )
+
+def generate_vtt(cues, seed):
+    """
+    Возвращает текст .vtt в стиле автоматических субтитров YouTube: каждая реплика
+    повторяет предыдущую строку и добавляет новую с тегами слов.
+    """
+    rng = random.Random(seed)
+    parts = ["WEBVTT\nKind: captions\nLanguage: ru\n\n"]
+    start = 0
+    previous = " "
+    for _ in range(cues):
+        words = [rng.choice(WORDS) for _ in range(rng.randint(4, 9))]
+        duration = rng.randint(1500, 4000)
+        tagged = words[0] + "".join(
+            f"<{format_vtt_timestamp(start + step * 200)}><c> {word}</c>" for step, word in enumerate(words[1:], 1)
+        )
+        parts.append(
+            f"{format_vtt_timestamp(start)} --> {format_vtt_timestamp(start + duration)} align:start position:0%\n"
+            f"{previous}\n{tagged}\n\n"
+        )
+        # Короткая реплика-«хвост», как у YouTube: только что сказанная строка без тегов
+        previous = " ".join(words)
+        parts.append(
+            f"{format_vtt_timestamp(start + duration)} --> {format_vtt_timestamp(start + duration + 10)} "
+            f"align:start position:0%\n{previous}\n \n\n"
+        )
+        start += duration + 10
+    return "".join(parts)
+
+def generate_srt(cues, seed):
+    """
+    Возвращает текст .srt: реплики в одну-две строки, иногда [музыка] и повторы строк.
+    """
+    rng = random.Random(seed)
+    parts = []
+    start = 0
+    line = ""
+    for number in range(1, cues + 1):
+        duration = rng.randint(1000, 4000)
+        lines = []
+        for _ in range(rng.randint(1, 2)):
+            if line and rng.random() < 0.2:
+                lines.append(line)
+                continue
+            line = " ".join(rng.choice(WORDS) for _ in range(rng.randint(3, 10)))
+            if rng.random() < 0.1:
+                line = rng.choice(("[музыка] ", "[Music] ", "[смех] ")) + line
+            lines.append(line)
+        parts.append(
+            f"{number}\n{format_vtt_timestamp(start).replace('.', ',')} --> "
+            f"{format_vtt_timestamp(start + duration).replace('.', ',')}\n" + "\n".join(lines) + "\n\n"
+        )
+        start += duration
+    return "".join(parts)
+
+def generate_markdown(paragraphs, seed):
+    """
+    Возвращает Markdown: заголовки и абзацы со ссылками, адресами и хэштегами.
+    """
+    rng = random.Random(seed)
+    parts = []
+    for number in range(paragraphs):
+        if number % 10 == 0:
+            parts.append(f"## {' '.join(rng.choice(WORDS) for _ in range(4)).capitalize()}\n\n")
+        words = [rng.choice(WORDS) for _ in range(rng.randint(20, 60))]
+        for _ in range(rng.randint(0, 3)):
+            position = rng.randrange(len(words))
+            words[position] = rng.choice((
+                f"[{words[position]}](https://example.com/{rng.randint(1, 999)})",
+                f"https://t.me/channel/{rng.randint(1, 99999)}",
+                f"#{rng.choice(WORDS)}",
+            ))
+        parts.append(" ".join(words).capitalize() + ".\n\n")
+    return "".join(parts)
+
+def generate_telegram_html(messages, seed):
+    """
+    Возвращает страницу HTML экспорта чата Telegram: сообщения с текстом, ссылками
+    и переносами строк, короткие сообщения, повторы и служебные сообщения без текста.
+    """
+    rng = random.Random(seed)
+    parts = [
+        '<!DOCTYPE html>\n<html>\n<head>\n<meta charset="utf-8"/>\n<title>Exported Data</title>\n'
+        '<link href="css/style.css" rel="stylesheet"/>\n</head>\n<body>\n<div class="page_wrap">\n'
+        '<div class="page_header"><div class="content"><div class="text bold">Канал</div></div></div>\n'
+        '<div class="page_body chat_page"><div class="history">\n'
+    ]
+    previous = ""
+    for number in range(1, messages + 1):
+        if rng.random() < 0.05:
+            parts.append(
+                f'<div class="message service" id="message{number}"><div class="body details">'
+                f'{rng.randint(1, 28)} January 2025</div></div>\n'
+            )
+            continue
+        if previous and rng.random() < 0.05:
+            text = previous
+        else:
+            words = [rng.choice(WORDS) for _ in range(rng.randint(2, 60))]
+            if len(words) > 10 and rng.random() < 0.3:
+                words[5] = f'<a href="https://example.com/{number}">{words[5]}</a>'
+            if len(words) > 20:
+                words[20] = "<br>" + words[20]
+            text = " ".join(words)
+        previous = text
+        parts.append(
+            f'<div class="message default clearfix" id="message{number}">\n'
+            f'<div class="pull_left userpic_wrap"><div class="userpic userpic2" style="width: 42px; height: 42px">'
+            f'<div class="initials" style="line-height: 42px">К</div></div></div>\n'
+            f'<div class="body">\n<div class="pull_right date details" title="01.01.2025 12:{number % 60:02d}:00">'
+            f'12:{number % 60:02d}</div>\n<div class="from_name">Канал</div>\n'
+            f'<div class="text">{text}</div>\n</div>\n</div>\n'
+        )
+    parts.append("</div></div>\n</div>\n</body>\n</html>\n")
+    return "".join(parts)
+
+# Вид корпуса: (генератор, имя файла по номеру)
+CORPUS_KINDS = {
+    "srt": (generate_srt, lambda number: f"{number:04d}.Видео {number}.ru.srt"),
+    "vtt": (generate_vtt, lambda number: f"{number:04d}.Видео {number}.ru.vtt"),
+    "md": (generate_markdown, lambda number: f"Заметки {number:04d}.md"),
+    "tg": (generate_telegram_html, lambda number: "messages.html" if number == 1 else f"messages{number}.html"),
+}
+
+def generate_corpus(corpus_dir, files, units, seed=0):
+    """
+    Создаёт корпус всех видов в подпапках corpus_dir (srt, vtt, md, tg).
+
+    :return: Словарь {вид: (список путей, суммарный размер в байтах, SHA-256 корпуса)}
+    """
+    corpus = {}
+    for kind, (generate, file_name) in CORPUS_KINDS.items():
+        kind_dir = os.path.join(corpus_dir, kind)
+        os.makedirs(kind_dir, exist_ok=True)
+        paths = []
+        digest = hashlib.sha256()
+        for number in range(1, files + 1):
+            content = generate(units, seed + number).encode("utf-8")
+            path = os.path.join(kind_dir, file_name(number))
+            with open(path, "wb") as corpus_file:
+                corpus_file.write(content)
+            digest.update(content)
+            paths.append(path)
+        corpus[kind] = (paths, sum(os.path.getsize(path) for path in paths), digest.hexdigest())
+    return corpus
+
+def load_script(path, name, cwd=None):
+    """
+    Загружает скрипт из файла как модуль (в именах скриптов Text scripts есть пробелы).
+    Вывод print скрипта отключается, чтобы не мешать замерам.
+
+    :param cwd: Папка, из которой выполнять скрипт (скрипт TG читает config.json из текущей папки)
+    """
+    spec = importlib.util.spec_from_file_location(name, path)
+    module = importlib.util.module_from_spec(spec)
+    module.print = lambda *args, **kwargs: None
+    previous_dir = os.getcwd()
+    if cwd is not None:
+        os.chdir(cwd)
+    try:
+        spec.loader.exec_module(module)
+    finally:
+        os.chdir(previous_dir)
+    return module
+
+def files_digest(paths):
+    """
+    Возвращает SHA-256 содержимого файлов по порядку.
+    """
+    digest = hashlib.sha256()
+    for path in paths:
+        with open(path, "rb") as output_file:
+            digest.update(output_file.read())
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+def make_tool(tool, work_dir):
+    """
+    Возвращает для инструмента вид корпуса и функцию прогона: она обрабатывает
+    список входных файлов и возвращает SHA-256 результата.
+    """
+    os.makedirs(work_dir, exist_ok=True)
+
+    def output_path(path, ext):
+        return os.path.join(work_dir, os.path.splitext(os.path.basename(path))[0] + ext)
+
+    if tool == "srt_to_txt":
+        def run(paths):
+            outputs = [output_path(path, ".txt") for path in paths]
+            for path, txt_path in zip(paths, outputs):
+                convert_srt_to_txt.convert_file(path, txt_path)
+            return files_digest(outputs)
+        return "srt", run
+
+    if tool == "vtt_to_srt":
+        def run(paths):
+            outputs = [output_path(path, ".srt") for path in paths]
+            for path, srt_path in zip(paths, outputs):
+                vtt_to_srt.convert_vtt_file(path, srt_path)
+            return files_digest(outputs)
+        return "vtt", run
+
+    if tool == "vtt_clean":
+        def run(paths):
+            outputs = []
+            for path in paths:
+                srt_path, txt_path = output_path(path, ".srt"), output_path(path, ".txt")
+                vtt_to_srt.convert_vtt_to_clean_srt_and_txt(path, srt_path, txt_path)
+                outputs += [srt_path, txt_path]
+            return files_digest(outputs)
+        return "vtt", run
+
+    if tool == "markdown_cleaner":
+        cleaner = load_script(os.path.join(TEXT_SCRIPTS_DIR, "python markdown_cleaner.py"), "markdown_cleaner")
+
+        def run(paths):
+            # clean_markdown пишет <имя>_cleaned.txt рядом с файлом, поэтому входы копируются в рабочую папку
+            outputs = []
+            for path in paths:
+                work_path = output_path(path, ".md")
+                if not os.path.exists(work_path):
+                    shutil.copyfile(path, work_path)
+                cleaner.clean_markdown(work_path, True, True, MARKDOWN_WORDS_TO_REMOVE)
+                outputs.append(os.path.splitext(work_path)[0] + "_cleaned.txt")
+            return files_digest(outputs)
+        return "md", run
+
+    if tool == "telegram":
+        tg_dir = os.path.join(TEXT_SCRIPTS_DIR, "TG")
+        shutil.copyfile(os.path.join(tg_dir, "config.json"), os.path.join(work_dir, "config.json"))
+        extractor = load_script(os.path.join(tg_dir, "html_to_markdown_extractor1.py"), "telegram_extractor", work_dir)
+
+        def run(paths):
+            # Журнал скрипта (process_log.txt) пишется в текущую папку — в рабочую
+            previous_dir = os.getcwd()
+            os.chdir(work_dir)
+            try:
+                seen_messages = set()
+                messages = []
+                for path in paths:
+                    messages += extractor.extract_text_from_html(os.path.abspath(path), seen_messages)
+            finally:
+                os.chdir(previous_dir)
+            separator = f"\n{extractor.SEPARATOR}\n"
+            return hashlib.sha256(separator.join(messages).encode("utf-8")).hexdigest()
+        return "tg", run
+
+    raise ValueError(f"неизвестный инструмент: {tool}")
+
+def benchmark_tool(tool, size, corpus, work_dir, repeat):
+    """
+    Замеряет инструмент на корпусе одного размера: лучшее время из repeat прогонов
+    и пиковую память отдельным прогоном под tracemalloc.
+    """
+    kind, run = make_tool(tool, work_dir)
+    paths, corpus_bytes, corpus_digest = corpus[kind]
+
+    timings = []
+    digests = set()
+    for _ in range(repeat):
+        started = time.perf_counter()
+        digests.add(run(paths))
+        timings.append(time.perf_counter() - started)
+    tracemalloc.start()
+    try:
+        digests.add(run(paths))
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    if len(digests) > 1:
+        print(f"  ВНИМАНИЕ: {tool} даёт разный результат на одном и том же корпусе")
+
+    wall_seconds = min(timings)
+    result = {
+        "tool": tool,
+        "size": size,
+        "files": len(paths),
+        "bytes": corpus_bytes,
+        "corpus_digest": corpus_digest,
+        "wall_seconds": round(wall_seconds, 4),
+        "mb_per_second": round(corpus_bytes / (1024 * 1024) / wall_seconds, 3) if wall_seconds else None,
+        "files_per_second": round(len(paths) / wall_seconds, 2) if wall_seconds else None,
+        "peak_memory_mb": round(peak / (1024 * 1024), 3),
+        "output_digest": sorted(digests)[0],
+    }
+    print(
+        f"{tool:<17} {size:<7} {result['mb_per_second']:>9.2f} МБ/с {result['files_per_second']:>10.1f} файлов/с "
+        f"{result['peak_memory_mb']:>8.2f} МБ пик"
+    )
+    return result
+
+def fresh_copy(corpus_dir, work_dir):
+    """
+    Копирует корпус в чистую рабочую папку, чтобы каждый прогон начинался с одинаковых файлов.
+    """
+    shutil.rmtree(work_dir, ignore_errors=True)
+    shutil.copytree(corpus_dir, work_dir)
+    return vtt_to_srt.find_vtt_files(work_dir)
+
+def measure(label, files, action):
+    started = time.perf_counter()
+    action()
+    elapsed = time.perf_counter() - started
+    result = {
+        "method": label,
+        "files": files,
+        "wall_seconds": round(elapsed, 4),
+        "ms_per_file": round(elapsed / files * 1000, 3) if files else 0.0,
+    }
+    print(f"{label:<28} {result['wall_seconds']:>9.3f} с  {result['ms_per_file']:>8.3f} мс/файл")
+    return result
+
+def benchmark_vtt(corpus_dir, work_dir, workers):
+    """
+    Сравнивает конвертацию .vtt → .srt: встроенный конвертер (один процесс и пул) и ffmpeg на каждый файл.
+    """
+    results = []
+    jobs = fresh_copy(corpus_dir, work_dir)
+    results.append(measure(
+        "vtt_to_srt, 1 процесс", len(jobs),
+        lambda: [vtt_to_srt.convert_vtt_file(vtt_path, srt_path) for vtt_path, srt_path in jobs],
+    ))
+    jobs = fresh_copy(corpus_dir, work_dir)
+    results.append(measure(
+        f"vtt_to_srt, {workers} процессов", len(jobs),
+        lambda: vtt_to_srt.convert_folder(work_dir, workers),
+    ))
+    if shutil.which("ffmpeg"):
+        jobs = fresh_copy(corpus_dir, work_dir)
+        results.append(measure(
+            "ffmpeg на каждый файл", len(jobs),
+            lambda: [vtt_to_srt.convert_with_ffmpeg(vtt_path, srt_path) for vtt_path, srt_path in jobs],
+        ))
+        native_ms = results[0]["ms_per_file"]
+        if native_ms:
+            print(f"Встроенный конвертер быстрее ffmpeg в {results[-1]['ms_per_file'] / native_ms:.1f} раза на файл")
+    else:
+        print("ffmpeg не найден — прежний способ не измерялся.")
+    return results
+
+def compare_results(baseline_path, candidate_path, threshold):
+    """
+    Сравнивает два файла результатов: метрики, ухудшившиеся больше чем на threshold,
+    и изменившийся результат на том же корпусе.
+
+    :return: Количество найденных регрессий
+    """
+    with open(baseline_path, "r", encoding="utf-8") as baseline_file:
+        baseline = json.load(baseline_file)
+    with open(candidate_path, "r", encoding="utf-8") as candidate_file:
+        candidate = json.load(candidate_file)
+
+    baseline_runs = {(run["tool"], run["size"]): run for run in baseline["runs"]}
+    regressions = 0
+    for run in candidate["runs"]:
+        label = f"{run['tool']}/{run['size']}"
+        base_run = baseline_runs.get((run["tool"], run["size"]))
+        if base_run is None:
+            print(f"{label}: нет в базовом файле, пропущено")
+            continue
+        if base_run["corpus_digest"] != run["corpus_digest"]:
+            print(f"{label}: корпус отличается (изменился генератор?), результат не сравнивается")
+        elif base_run["output_digest"] != run["output_digest"]:
+            print(f"{label:<26} результат ИЗМЕНИЛСЯ")
+            regressions += 1
+        for metric in LOWER_IS_BETTER + HIGHER_IS_BETTER:
+            old, new = base_run.get(metric), run.get(metric)
+            if not old or new is None:
+                continue
+            change = (new - old) / old
+            worse = change > threshold if metric in LOWER_IS_BETTER else change < -threshold
+            status = "РЕГРЕССИЯ" if worse else "ok"
+            regressions += worse
+            print(f"{label:<26} {metric:<17} {old:12.3f} -> {new:12.3f} ({change:+.1%}) {status}")
+
+    print(f"\nРегрессий: {regressions}")
+    return regressions
+
+def parse_args(argv=None):
+    """
+    Разбирает аргументы командной строки.
+    """
+    parser = argparse.ArgumentParser(description="Бенчмарк обработки текстов на синтетических корпусах.")
+    parser.add_argument(
+        "--sizes", default="small,medium",
+        help=f"Размеры корпуса через запятую: {', '.join(SIZES)} (по умолчанию small,medium).",
+    )
+    parser.add_argument("--tools", default=",".join(TOOLS), help="Инструменты через запятую (по умолчанию все).")
+    parser.add_argument("--repeat", type=int, default=3, help="Прогонов для замера времени, берётся лучший.")
+    parser.add_argument(
+        "--methods", action="store_true",
+        help="Также сравнить способы конвертации .vtt: один процесс, пул процессов, ffmpeg.",
+    )
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="Процессов для пула в --methods.")
+    parser.add_argument("--corpus-dir", default=None, help="Папка для синтетических файлов (по умолчанию временная).")
+    parser.add_argument("--output", default=None, help="Файл для результатов в JSON (по умолчанию — вывод на экран).")
+    parser.add_argument(
+        "--compare", nargs=2, metavar=("BASELINE", "CANDIDATE"),
+        help="Сравнить два файла результатов вместо запуска бенчмарка.",
+    )
+    parser.add_argument("--threshold", type=float, default=0.10, help="Допустимое ухудшение при сравнении (0.10 = 10%%).")
+    return parser.parse_args(argv)
+
+def main():
+    args = parse_args()
+
+    if args.compare:
+        sys.exit(1 if compare_results(*args.compare, args.threshold) else 0)
+
+    sizes = [size.strip() for size in args.sizes.split(",") if size.strip()]
+    tools = [tool.strip() for tool in args.tools.split(",") if tool.strip()]
+    unknown = [size for size in sizes if size not in SIZES] + [tool for tool in tools if tool not in TOOLS]
+    if unknown:
+        print(f"Неизвестные размеры или инструменты: {', '.join(unknown)}")
+        sys.exit(2)
+
+    runs = []
+    corpora = {}
+    methods = None
+    with tempfile.TemporaryDirectory() as temp_dir:
+        corpus_root = args.corpus_dir or os.path.join(temp_dir, "corpus")
+        for size in sizes:
+            files, units = SIZES[size]
+            corpus = generate_corpus(os.path.join(corpus_root, size), files, units)
+            corpora[size] = {"files": files, "units_per_file": units}
+            corpora[size].update({kind: {"bytes": total, "digest": digest} for kind, (_, total, digest) in corpus.items()})
+            megabytes = sum(total for _, total, _ in corpus.values()) / (1024 * 1024)
+            print(f"\nКорпус {size}: {files} файлов каждого вида по {units} единиц, всего {megabytes:.1f} МБ")
+            for tool in tools:
+                runs.append(benchmark_tool(tool, size, corpus, os.path.join(temp_dir, "work", size, tool), args.repeat))
+
+        if args.methods:
+            print(f"\nСпособы конвертации .vtt → .srt (корпус {sizes[-1]}):")
+            methods = benchmark_vtt(
+                os.path.join(corpus_root, sizes[-1], "vtt"), os.path.join(temp_dir, "methods"), args.workers
+            )
+
+    results = {
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "machine": {"platform": platform.platform(), "python": platform.python_version(), "cpus": os.cpu_count()},
+        "repeat": args.repeat,
+        "corpora": corpora,
+        "runs": runs,
+    }
+    if methods is not None:
+        results["vtt_methods"] = methods
+
+    output = json.dumps(results, ensure_ascii=False, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as output_file:
+            output_file.write(output)
+        print(f"\nРезультаты сохранены: {args.output}")
+    else:
+        print(output)
+
+if __name__ == "__main__":
+    main()
@@ -1,108 +1,262 @@
+"""
+Конвертация субтитров .srt в чистый текст .txt: без номеров, временных меток
+и текста в квадратных скобках; каждая реплика — одна строка.
+
+Файл читается один раз, потоково, строка за строкой, и текст сразу пишется в .txt,
+поэтому память на файл не зависит от его размера. Кодировка определяется
+по BOM (UTF-8, UTF-16, UTF-32), а без BOM — по началу файла: если оно не в UTF-8,
+файл читается как ISO-8859-1. Отдельные байты не в UTF-8 дальше по файлу
+читаются как символы ISO-8859-1. Папка обрабатывается пулом процессов,
+с --recursive — вместе с подпапками; .txt, которые новее своих .srt,
+пропускаются (--force — конвертировать всё заново).
+
+Примеры:
+    python convert_srt_to_txt.py
+    python convert_srt_to_txt.py archive --recursive --workers 8
+"""
 import os
+import io
 import re
+import codecs
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+
+# Папка для .txt внутри каждой папки с .srt
+TXT_DIR_NAME = 'TXT'
+# Кодировка, если файл не в UTF-8 (как и раньше)
+FALLBACK_ENCODING = 'iso-8859-1'
+# Сколько байт начала файла проверяется на UTF-8; столько же — буфер чтения
+SNIFF_BYTES = 64 * 1024
+# Обработчик ошибок декодирования: байт не в UTF-8 читается как символ ISO-8859-1
+FALLBACK_ERRORS = 'srt-iso-8859-1-fallback'
+codecs.register_error(
+    FALLBACK_ERRORS, lambda error: (error.object[error.start:error.end].decode(FALLBACK_ENCODING), error.end)
+)
+# Длинные BOM проверяются раньше коротких: UTF-32 LE начинается с BOM UTF-16 LE
+BOMS = (
+    (codecs.BOM_UTF32_LE, 'utf-32'),
+    (codecs.BOM_UTF32_BE, 'utf-32'),
+    (codecs.BOM_UTF8, 'utf-8-sig'),
+    (codecs.BOM_UTF16_LE, 'utf-16'),
+    (codecs.BOM_UTF16_BE, 'utf-16'),
+)
+
+TIMESTAMP_RE = re.compile(r'\d{2}:\d{2}:\d{2}[.,]\d{3} -->')
+BRACKETED_RE = re.compile(r'\[.*?\]')
+WHITESPACE_RE = re.compile(r'\s+')
 
 def remove_bracketed_text(text):
     """
     Удаляет текст, заключённый в квадратные скобки, например, [музыка].
     """
-    return re.sub(r'\[.*?\]', '', text)
+    return BRACKETED_RE.sub('', text)
 
-def srt_to_txt(srt_file_path, txt_file_path):
+def sniff_encoding(srt_file):
     """
-    Конвертирует .srt файл в .txt, удаляя временные метки, номера строк и текст в квадратных скобках.
-    
-    :param srt_file_path: Путь к исходному .srt файлу
-    :param txt_file_path: Путь к результирующему .txt файлу
+    Определяет кодировку по началу файла, не сдвигая позицию чтения: по BOM,
+    а без него — строгой проверкой первых SNIFF_BYTES байт на UTF-8.
+
+    :param srt_file: Файл, открытый в двоичном режиме с буфером не меньше SNIFF_BYTES
+    :return: Имя кодировки для чтения
     """
+    head = srt_file.peek(SNIFF_BYTES)[:SNIFF_BYTES]
+    for bom, encoding in BOMS:
+        if head.startswith(bom):
+            return encoding
     try:
-        with open(srt_file_path, 'r', encoding='utf-8') as srt_file:
-            lines = srt_file.readlines()
+        # final=False: многобайтный символ, обрезанный концом проверяемого куска, ошибкой не считается
+        codecs.getincrementaldecoder('utf-8')().decode(head, final=False)
     except UnicodeDecodeError:
-        # Если не удалось открыть с кодировкой utf-8, пробуем iso-8859-1
-        with open(srt_file_path, 'r', encoding='iso-8859-1') as srt_file:
-            lines = srt_file.readlines()
+        return FALLBACK_ENCODING
+    return 'utf-8'
+
+def block_text(subtitle_block):
+    """
+    Собирает строки реплики в одну строку текста без скобок и лишних пробелов.
+    """
+    return WHITESPACE_RE.sub(' ', remove_bracketed_text(' '.join(subtitle_block))).strip()
 
-    txt_lines = []
+def srt_text_lines(lines):
+    """
+    Возвращает строки текста реплик по строкам .srt файла, пропуская номера и временные метки.
+    """
     subtitle_block = []
-    
     for line in lines:
         line = line.strip()
-        
-        if line.isdigit():
-            # Пропускаем номера субтитров
-            continue
-        elif re.match(r'\d{2}:\d{2}:\d{2}[.,]\d{3} -->', line):
-            # Пропускаем временные метки
+
+        if line.isdigit() or TIMESTAMP_RE.match(line):
+            # Пропускаем номера субтитров и временные метки
             continue
-        elif line == '':
-            # Конец блока субтитров
-            if subtitle_block:
-                # Объединяем строки внутри блока
-                subtitle_text = ' '.join(subtitle_block)
-                # Удаляем текст в квадратных скобках
-                subtitle_text = remove_bracketed_text(subtitle_text)
-                # Удаляем лишние пробелы
-                subtitle_text = re.sub(r'\s+', ' ', subtitle_text).strip()
-                if subtitle_text:
-                    txt_lines.append(subtitle_text)
-                # Сбрасываем блок
-                subtitle_block = []
-        else:
+        if line:
             # Добавляем строку в текущий блок субтитров
             subtitle_block.append(line)
-    
-    # Обработка последнего блока, если файл не заканчивается пустой строкой
+            continue
+        # Конец блока субтитров
+        if subtitle_block:
+            subtitle_text = block_text(subtitle_block)
+            if subtitle_text:
+                yield subtitle_text
+            subtitle_block = []
+
+    # Последний блок, если файл не заканчивается пустой строкой
     if subtitle_block:
-        subtitle_text = ' '.join(subtitle_block)
-        subtitle_text = remove_bracketed_text(subtitle_text)
-        subtitle_text = re.sub(r'\s+', ' ', subtitle_text).strip()
+        subtitle_text = block_text(subtitle_block)
         if subtitle_text:
-            txt_lines.append(subtitle_text)
-    
+            yield subtitle_text
+
+def convert_file(srt_file_path, txt_file_path):
+    """
+    Конвертирует .srt файл в .txt потоково, за одно чтение: строки читаются и пишутся по одной.
+    .txt пишется через временный файл, чтобы прерванная конвертация не выглядела готовой.
+
+    :param srt_file_path: Путь к исходному .srt файлу
+    :param txt_file_path: Путь к результирующему .txt файлу
+    :return: Количество записанных строк
+    """
+    temp_path = txt_file_path + '.tmp'
+    try:
+        with open(srt_file_path, 'rb', buffering=SNIFF_BYTES) as srt_file:
+            # Начало файла проверено, но дальше может встретиться байт в другой кодировке
+            with io.TextIOWrapper(srt_file, encoding=sniff_encoding(srt_file), errors=FALLBACK_ERRORS) as lines:
+                written = write_text_lines(lines, temp_path)
+        os.replace(temp_path, txt_file_path)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+    return written
+
+def write_text_lines(lines, txt_file_path):
+    written = 0
+    with open(txt_file_path, 'w', encoding='utf-8') as txt_file:
+        for subtitle_text in srt_text_lines(lines):
+            txt_file.write(subtitle_text + '\n')
+            written += 1
+    return written
+
+def srt_to_txt(srt_file_path, txt_file_path):
+    """
+    Конвертирует .srt файл в .txt, удаляя временные метки, номера строк и текст в квадратных скобках.
+    .txt сохраняется в папку TXT рядом с txt_file_path.
+
+    :param srt_file_path: Путь к исходному .srt файлу
+    :param txt_file_path: Путь к результирующему .txt файлу
+    """
     # Создаём директорию TXT внутри output_dir, если она не существует
-    txt_dir = os.path.join(os.path.dirname(txt_file_path), 'TXT')
-    if not os.path.exists(txt_dir):
-        os.makedirs(txt_dir)
-    
+    txt_dir = os.path.join(os.path.dirname(txt_file_path), TXT_DIR_NAME)
+    os.makedirs(txt_dir, exist_ok=True)
+
     # Определяем путь для сохранения .txt файла
     final_txt_path = os.path.join(txt_dir, os.path.basename(txt_file_path))
-    
-    # Записываем текст в .txt файл
-    with open(final_txt_path, 'w', encoding='utf-8') as txt_file:
-        for line in txt_lines:
-            txt_file.write(line + '\n')
-    
+    convert_file(srt_file_path, final_txt_path)
     print(f"Сохранено: {final_txt_path}")
 
-def convert_all_srt_to_txt(subtitles_dir='subtitles'):
+def find_srt_files(subtitles_dir, recursive=False, force=False):
+    """
+    Находит .srt файлы и пути их .txt (в папке TXT рядом с каждым .srt).
+    Папки TXT не просматриваются.
+
+    :param recursive: Искать и в подпапках
+    :param force: Включать и файлы, у которых .txt новее .srt
+    :return: Кортеж (список пар (.srt, .txt) для конвертации, количество пропущенных актуальных)
+    """
+    jobs = []
+    skipped = 0
+    for folder, subfolders, filenames in os.walk(subtitles_dir):
+        subfolders[:] = sorted(name for name in subfolders if recursive and name != TXT_DIR_NAME)
+        txt_dir = os.path.join(folder, TXT_DIR_NAME)
+        for filename in sorted(filenames):
+            if not filename.lower().endswith('.srt'):
+                continue
+            srt_path = os.path.join(folder, filename)
+            txt_path = os.path.join(txt_dir, os.path.splitext(filename)[0] + '.txt')
+            if not force:
+                try:
+                    if os.path.getmtime(txt_path) >= os.path.getmtime(srt_path):
+                        skipped += 1
+                        continue
+                except OSError:
+                    pass
+            jobs.append((srt_path, txt_path))
+    return jobs, skipped
+
+def convert_job(paths):
+    srt_file_path, txt_file_path = paths
+    try:
+        convert_file(srt_file_path, txt_file_path)
+        return srt_file_path, None
+    except Exception as e:
+        return srt_file_path, str(e)
+
+def convert_all_srt_to_txt(subtitles_dir='subtitles', recursive=False, workers=None, force=False):
     """
-    Находит все .srt файлы в указанной директории и конвертирует их в .txt.
-    
+    Находит все .srt файлы в указанной директории и конвертирует их в .txt
+    (в папку TXT рядом с каждым .srt) пулом процессов.
+
     :param subtitles_dir: Директория с .srt файлами
+    :param recursive: Обрабатывать и подпапки
+    :param workers: Количество процессов (по умолчанию — по числу ядер)
+    :param force: Конвертировать и файлы, у которых .txt уже новее .srt
+    :return: Кортеж (количество сконвертированных файлов, словарь {.srt: текст ошибки})
     """
     if not os.path.exists(subtitles_dir):
         print(f"Директория '{subtitles_dir}' не найдена.")
-        return
-
-    # Создаём папку TXT внутри subtitles_dir, если она не существует
-    txt_dir = os.path.join(subtitles_dir, 'TXT')
-    if not os.path.exists(txt_dir):
-        os.makedirs(txt_dir)
-    
-    for filename in os.listdir(subtitles_dir):
-        if filename.lower().endswith('.srt'):
-            srt_path = os.path.join(subtitles_dir, filename)
-            txt_filename = os.path.splitext(filename)[0] + '.txt'
-            txt_path = os.path.join(subtitles_dir, txt_filename)
-            srt_to_txt(srt_path, txt_path)
+        return 0, {}
+
+    jobs, skipped = find_srt_files(subtitles_dir, recursive, force)
+    if skipped:
+        print(f"Пропущено актуальных .txt: {skipped}")
+    for txt_dir in sorted({os.path.dirname(txt_path) for _, txt_path in jobs}):
+        os.makedirs(txt_dir, exist_ok=True)
+
+    workers = workers or os.cpu_count() or 1
+    # На маленьких папках запуск пула дороже самой работы
+    if workers == 1 or len(jobs) < 8:
+        return collect_results(map(convert_job, jobs), len(jobs))
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        chunksize = max(1, min(64, len(jobs) // (workers * 4)))
+        return collect_results(executor.map(convert_job, jobs, chunksize=chunksize), len(jobs))
+
+def collect_results(results, total):
+    """
+    Собирает результаты convert_job по мере готовности и выводит прогресс каждые 1000 файлов.
+    """
+    converted, errors = 0, {}
+    for srt_file_path, error in results:
+        if error is None:
+            converted += 1
+        else:
+            errors[srt_file_path] = error
+        done = converted + len(errors)
+        if done % 1000 == 0:
+            print(f"Обработано {done}/{total}")
+    return converted, errors
+
+def parse_args(argv=None):
+    """
+    Разбирает аргументы командной строки.
+    """
+    parser = argparse.ArgumentParser(description="Конвертирует .srt субтитры в чистый текст .txt.")
+    parser.add_argument(
+        "folder", nargs="?", default="subtitles", help="Папка с .srt файлами (по умолчанию subtitles).",
+    )
+    parser.add_argument("--recursive", action="store_true", help="Обрабатывать и подпапки.")
+    parser.add_argument("--workers", type=int, default=None, help="Количество процессов (по умолчанию — по числу ядер).")
+    parser.add_argument("--force", action="store_true", help="Конвертировать и файлы с актуальным .txt.")
+    return parser.parse_args(argv)
 
 def main():
     """
     Основная функция скрипта.
     """
-    subtitles_dir = 'subtitles'  # Папка с .srt файлами
-    convert_all_srt_to_txt(subtitles_dir)
-    print("\nВсе файлы .srt были успешно конвертированы в .txt и сохранены в папке 'subtitles\\TXT'.")
+    args = parse_args()
+    converted, errors = convert_all_srt_to_txt(args.folder, args.recursive, args.workers, args.force)
+    for srt_file_path, error in errors.items():
+        print(f"Ошибка конвертации {srt_file_path}: {error}")
+    print(
+        f"\nКонвертировано файлов .srt: {converted}; .txt сохранены в папке "
+        f"'{os.path.join(args.folder, TXT_DIR_NAME)}'{' и в папках TXT подпапок' if args.recursive else ''}."
+    )
 
 if __name__ == "__main__":
     main()
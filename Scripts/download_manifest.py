@@ -0,0 +1,247 @@
+"""
+Журнал скачивания плейлиста (манифест) для download_videos.py и download_subtitles.
+
+Манифест — база SQLite в папке загрузки (.manifest.sqlite). Для каждого видео
+плейлиста (по его ID) в ней хранятся номер в плейлисте, состояние (downloading,
+done, failed), итоговый файл, объём скачанного, время загрузки, число попыток
+и текст ошибки, а для субтитров — языки, запрошенные при успешной загрузке.
+Объём и время заполняются хуками прогресса yt-dlp, итоговый файл — хуком после
+постобработки.
+
+Повторный запуск одним запросом к манифесту определяет, какие видео уже скачаны:
+видео сопоставляются по ID, а не по номеру (номера сдвигаются, когда в начало
+плейлиста добавляют или из него удаляют видео), и итоговый файл должен по-прежнему
+лежать в папке. Скачиваются только остальные; неудачные повторяются
+с экспоненциальной паузой между попытками.
+"""
+import os
+import time
+import sqlite3
+import threading
+
+MANIFEST_NAME = ".manifest.sqlite"
+DEFAULT_RETRIES = 3
+DEFAULT_BACKOFF = 5.0
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS entries (
+    playlist TEXT NOT NULL,
+    number INTEGER NOT NULL,
+    video_id TEXT NOT NULL,
+    title TEXT,
+    state TEXT NOT NULL,
+    filename TEXT,
+    bytes INTEGER NOT NULL DEFAULT 0,
+    duration REAL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    error TEXT,
+    languages TEXT,
+    started REAL,
+    updated REAL,
+    PRIMARY KEY (playlist, video_id)
+)
+"""
+COLUMNS = (
+    "playlist, number, video_id, title, state, filename, bytes, duration, "
+    "attempts, error, languages, started, updated"
+)
+# Ключ строк без ID видео в манифестах с ключом по номеру — как в DownloadManifest.entry_key
+LEGACY_KEY = "COALESCE(video_id, '#' || number)"
+INDEX = "CREATE INDEX IF NOT EXISTS entries_state ON entries (playlist, state)"
+
+class DownloadManifest:
+    """
+    Манифест одного плейлиста в папке загрузки. Потоки download_entries пишут
+    в него через одно подключение под блокировкой.
+
+    :param save_dir: Папка загрузки; база лежит в ней
+    :param playlist: Ключ плейлиста (ID или ссылка)
+    """
+
+    def __init__(self, save_dir, playlist):
+        self.save_dir = save_dir
+        self.playlist = playlist
+        self.lock = threading.Lock()
+        self.connection = sqlite3.connect(
+            os.path.join(save_dir, MANIFEST_NAME), timeout=60.0, check_same_thread=False
+        )
+        self.connection.execute(SCHEMA)
+        self._migrate()
+        self.connection.execute(INDEX)
+        self.connection.commit()
+        # Байты по файлам текущей загрузки (видео и аудио скачиваются отдельными файлами)
+        self.file_bytes = {}
+        # Номер в плейлисте -> ключ строки (ID видео) для загрузок этого запуска
+        self.keys = {}
+
+    def _migrate(self):
+        """
+        Переводит манифест прежних версий на текущую схему: добавляет столбец languages
+        и перестраивает таблицу с ключом по номеру в таблицу с ключом по ID видео.
+        """
+        table_info = self.connection.execute("PRAGMA table_info(entries)").fetchall()
+        columns = {row[1] for row in table_info}
+        if "languages" not in columns:
+            self.connection.execute("ALTER TABLE entries ADD COLUMN languages TEXT")
+        if any(row[1] == "number" and row[5] for row in table_info):
+            self.connection.execute("ALTER TABLE entries RENAME TO entries_by_number")
+            self.connection.execute(SCHEMA)
+            # Строки без ID получают ключ по номеру, как и в start; при повторе ID остаётся последняя
+            self.connection.execute(
+                f"INSERT OR REPLACE INTO entries ({COLUMNS}) "
+                f"SELECT {COLUMNS.replace('video_id', LEGACY_KEY)} FROM entries_by_number ORDER BY updated"
+            )
+            self.connection.execute("DROP TABLE entries_by_number")
+
+    @staticmethod
+    def entry_key(number, entry):
+        """
+        Возвращает ключ строки манифеста для видео: его ID, а без ID — номер.
+        """
+        return entry.get('id') or f"#{number}"
+
+    def _key(self, number):
+        with self.lock:
+            return self.keys[number]
+
+    def _execute(self, query, parameters=()):
+        with self.lock:
+            rows = self.connection.execute(query, parameters).fetchall()
+            self.connection.commit()
+        return rows
+
+    def file_exists(self, filename):
+        """
+        Проверяет, что итоговый файл загрузки есть в папке. Субтитры после
+        конвертации лежат как .srt вместо скачанного .vtt.
+        """
+        path = os.path.join(self.save_dir, filename)
+        return os.path.exists(path) or os.path.exists(os.path.splitext(path)[0] + ".srt")
+
+    def completed(self, entries, languages=None):
+        """
+        Возвращает множество номеров из entries, которые уже скачаны, — одним запросом
+        к манифесту. Видео сопоставляются по ID, поэтому сдвиг номеров в плейлисте
+        не мешает; видео, итоговый файл которого удалён, скачанным не считается.
+
+        :param entries: Список пар (номер в плейлисте, информация yt-dlp о видео)
+        :param languages: Для субтитров — запрошенные языки: видео считается скачанным,
+                          только если при его загрузке были запрошены все эти языки
+        """
+        rows = self._execute(
+            "SELECT video_id, filename, languages FROM entries WHERE playlist = ? AND state = 'done'",
+            (self.playlist,),
+        )
+        done = {video_id: (filename, fetched) for video_id, filename, fetched in rows}
+        requested = set(languages) if languages is not None else None
+        completed = set()
+        for number, entry in entries:
+            row = done.get(self.entry_key(number, entry))
+            if row is None:
+                continue
+            filename, fetched = row
+            if requested is not None and (fetched is None or not requested <= set(fetched.split(","))):
+                continue
+            if filename and self.file_exists(filename):
+                completed.add(number)
+        return completed
+
+    def failed(self):
+        """
+        Возвращает словарь {номер: текст ошибки} для неудачных номеров.
+        """
+        rows = self._execute(
+            "SELECT number, error FROM entries WHERE playlist = ? AND state = 'failed' ORDER BY number",
+            (self.playlist,),
+        )
+        return dict(rows)
+
+    def start(self, number, entry):
+        """
+        Отмечает начало загрузки номера и увеличивает число попыток.
+        """
+        now = time.time()
+        key = self.entry_key(number, entry)
+        self._execute(
+            "INSERT INTO entries (playlist, number, video_id, title, state, attempts, started, updated) "
+            "VALUES (?, ?, ?, ?, 'downloading', 1, ?, ?) "
+            "ON CONFLICT (playlist, video_id) DO UPDATE SET number = excluded.number, "
+            "title = excluded.title, state = 'downloading', bytes = 0, error = NULL, "
+            "attempts = attempts + 1, started = excluded.started, updated = excluded.updated",
+            (self.playlist, number, key, entry.get('title'), now, now),
+        )
+        with self.lock:
+            self.keys[number] = key
+            self.file_bytes[number] = {}
+
+    def progress_hook(self, number):
+        """
+        Возвращает хук прогресса yt-dlp для номера: по завершении каждого файла
+        записывает в манифест суммарный объём скачанного.
+        """
+        def hook(status):
+            if status['status'] not in ('downloading', 'finished'):
+                return
+            downloaded = status.get('downloaded_bytes') or status.get('total_bytes') or 0
+            with self.lock:
+                files = self.file_bytes.setdefault(number, {})
+                files[status.get('filename')] = downloaded
+                total = sum(files.values())
+            # Во время загрузки хук вызывается много раз в секунду — в базу пишется только итог файла
+            if status['status'] == 'finished':
+                self._execute(
+                    "UPDATE entries SET bytes = ?, updated = ? WHERE playlist = ? AND video_id = ?",
+                    (total, time.time(), self.playlist, self._key(number)),
+                )
+        return hook
+
+    def finish(self, number, filename, languages=None):
+        """
+        Отмечает номер скачанным; filename — итоговый файл после постобработки,
+        languages — для субтитров запрошенные языки.
+        """
+        now = time.time()
+        with self.lock:
+            total = sum(self.file_bytes.pop(number, {}).values())
+        self._execute(
+            "UPDATE entries SET state = 'done', filename = ?, bytes = MAX(bytes, ?), languages = ?, "
+            "duration = ? - started, error = NULL, updated = ? WHERE playlist = ? AND video_id = ?",
+            (
+                os.path.basename(filename) if filename else None, total,
+                ",".join(sorted(languages)) if languages is not None else None,
+                now, now, self.playlist, self._key(number),
+            ),
+        )
+
+    def fail(self, number, error):
+        """
+        Отмечает номер неудачным и сохраняет текст ошибки.
+        """
+        now = time.time()
+        with self.lock:
+            self.file_bytes.pop(number, None)
+        self._execute(
+            "UPDATE entries SET state = 'failed', error = ?, duration = ? - started, updated = ? "
+            "WHERE playlist = ? AND video_id = ?",
+            (str(error), now, now, self.playlist, self._key(number)),
+        )
+
+    def summary(self):
+        """
+        Возвращает (скачано номеров, всего байт, суммарное время загрузки) по плейлисту.
+        """
+        rows = self._execute(
+            "SELECT COUNT(*), COALESCE(SUM(bytes), 0), COALESCE(SUM(duration), 0) FROM entries "
+            "WHERE playlist = ? AND state = 'done'",
+            (self.playlist,),
+        )
+        return rows[0]
+
+    def close(self):
+        self.connection.close()
+
+def backoff_delays(retries=DEFAULT_RETRIES, backoff=DEFAULT_BACKOFF):
+    """
+    Возвращает паузы перед повторными попытками: backoff, 2·backoff, 4·backoff, ...
+    """
+    return [backoff * 2 ** attempt for attempt in range(retries)]
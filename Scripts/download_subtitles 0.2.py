@@ -1,23 +1,23 @@
-import yt_dlp
 import os
-import re
-import subprocess
+
+from playlist_info_cache import load_playlist_info, playlist_entries
+from download_manifest import DownloadManifest
+from subtitle_fetcher import DEFAULT_WORKERS, fetch_playlist_subtitles
+from vtt_to_srt import convert_folder
+from subtitle_sync import STATE_NAME, sync_subtitles
+
+# Максимальное количество видео в плейлисте
+PLAYLIST_END = 1000
 
 def get_playlist_info(playlist_url):
     """
     Извлекает информацию о плейлисте, включая общее количество видео.
+    Информация кэшируется (playlist_info_cache) и затем используется для скачивания субтитров.
     
     :param playlist_url: URL плейлиста YouTube
     :return: Общее количество видео в плейлисте
     """
-    ydl_opts = {
-        'quiet': True,
-        'skip_download': True,
-        'extract_flat': True,  # Не извлекает подробности каждого видео
-    }
-    
-    with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-        info_dict = ydl.extract_info(playlist_url, download=False)
+    info_dict, _ = load_playlist_info(playlist_url)
     
     if 'entries' not in info_dict:
         print("Не удалось извлечь информацию о плейлисте.")
@@ -27,13 +27,18 @@ def get_playlist_info(playlist_url):
     print(f"Общее количество видео в плейлисте: {total_videos}")
     return total_videos
 
-def download_subtitles(playlist_url, output_dir='subtitles', languages=['en']):
+def download_subtitles(playlist_url, output_dir='subtitles', languages=['en'], workers=DEFAULT_WORKERS):
     """
     Скачивает субтитры с YouTube-плейлиста и сохраняет их с номерами.
+    Все дорожки всех видео скачиваются параллельно (subtitle_fetcher) с ограничением
+    частоты запросов и повторами после ответа 429.
+    Состояние каждого видео ведётся в манифесте папки (download_manifest): повторный
+    запуск скачивает только недостающие субтитры.
     
     :param playlist_url: URL плейлиста YouTube
     :param output_dir: Директория для сохранения субтитров
     :param languages: Список языковых кодов для субтитров (например, ['en', 'ru'])
+    :param workers: Количество одновременных скачиваний
     :return: Список номеров видео, для которых не удалось скачать субтитры
     """
     # Создаём директорию для субтитров, если её нет
@@ -43,122 +48,52 @@ def download_subtitles(playlist_url, output_dir='subtitles', languages=['en']):
     # Список для хранения номеров видео, у которых не удалось скачать субтитры
     failed_numbers = []
     
-    ydl_opts = {
-        'ignoreerrors': True,
-        'skip_download': True,  # Не загружать видео
-        'writesubtitles': True,
-        'writeautomaticsub': True,  # Загрузить автоматические субтитры, если ручные недоступны
-        'subtitleslangs': languages,  # Языки субтитров, например ['en', 'ru']
-        'subtitlesformat': 'vtt',  # Скачивать в формате .vtt для последующей конвертации
-        'outtmpl': os.path.join(output_dir, '%(playlist_index)03d.%(title)s.%(ext)s'),  # Нумерация с ведущими нулями
-        'playlistend': 1000,  # Максимальное количество видео в плейлисте
-    }
-    
-    with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-        # Получаем информацию о плейлисте для определения общего количества видео
-        playlist_info = ydl.extract_info(playlist_url, download=False)
-        if 'entries' not in playlist_info:
-            print("Не удалось извлечь информацию о плейлисте.")
-            return []
-        total_videos = len(playlist_info['entries'])
-        print(f"Общее количество видео в плейлисте: {total_videos}")
-        
-        # Скачиваем субтитры
-        ydl.download([playlist_url])
-    
-    # Проверяем, какие номера не имеют соответствующих файлов
+    # Список видео плейлиста берётся из кэша; списки субтитров запрашиваются только для нескачанных видео
+    playlist_info, _ = load_playlist_info(playlist_url)
+    if 'entries' not in playlist_info:
+        print("Не удалось извлечь информацию о плейлисте.")
+        return []
+    total_videos = min(len(playlist_info['entries']), PLAYLIST_END)
+    print(f"Общее количество видео в плейлисте: {total_videos}")
+
+    manifest = DownloadManifest(output_dir, playlist_info.get('id') or playlist_url)
+    entries = [(index, entry) for index, entry in playlist_entries(playlist_info) if index <= total_videos]
+    # Видео считается скачанным, только если при загрузке были запрошены все нужные сейчас языки
+    completed = manifest.completed(entries, languages)
+    if completed:
+        print(f"Субтитры уже скачаны ранее для {len(completed)} видео, пропускаем.")
+    pending = [(index, entry) for index, entry in entries if index not in completed]
+    fetch_playlist_subtitles(pending, output_dir, languages, manifest=manifest, workers=workers)
+
+    # Скачанные номера — одним запросом к манифесту, без просмотра папки для каждого номера
+    completed = manifest.completed(entries, languages)
+    manifest.close()
     for i in range(1, total_videos + 1):
-        number_str = f"{i:03d}"
-        # Ожидается, что файл субтитров будет иметь формат '001.НазваниеВидео.vtt'
-        vtt_filename = f"{number_str}."
-        found = False
-        for file in os.listdir(output_dir):
-            if file.startswith(vtt_filename) and file.lower().endswith('.vtt'):
-                found = True
-                break
-        if not found:
+        if i not in completed:
+            number_str = f"{i:03d}"
             failed_numbers.append(number_str)
             print(f"Субтитры не найдены для видео номер: {number_str}")
     
     return failed_numbers
 
-def convert_vtt_to_srt(vtt_file_path, srt_file_path):
+def convert_all_vtt_to_srt_and_cleanup(subtitles_dir='subtitles', workers=None):
     """
-    Конвертирует .vtt файл в .srt с помощью ffmpeg.
-    
-    :param vtt_file_path: Путь к исходному .vtt файлу
-    :param srt_file_path: Путь к результирующему .srt файлу
-    """
-    command = [
-        'ffmpeg',
-        '-i', vtt_file_path,
-        srt_file_path
-    ]
-    try:
-        # Запуск команды ffmpeg без вывода в консоль
-        subprocess.run(command, check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
-        print(f"Конвертировано: {vtt_file_path} -> {srt_file_path}")
-        # Удаляем оригинальный .vtt файл после успешной конвертации
-        os.remove(vtt_file_path)
-        print(f"Удалён оригинальный файл: {vtt_file_path}")
-    except subprocess.CalledProcessError as e:
-        print(f"Ошибка конвертации {vtt_file_path}: {e}")
-
-def remove_duplicate_lines(srt_file_path):
-    """
-    Удаляет дублирующиеся строки и текст в квадратных скобках в .srt файле.
-    
-    :param srt_file_path: Путь к .srt файлу
-    """
-    try:
-        with open(srt_file_path, 'r', encoding='utf-8') as file:
-            lines = file.readlines()
-    except UnicodeDecodeError:
-        with open(srt_file_path, 'r', encoding='iso-8859-1') as file:
-            lines = file.readlines()
-
-    unique_subtitles = []
-    previous_text = ""
-
-    for line in lines:
-        stripped_line = line.strip()
-
-        if stripped_line.isdigit() or re.match(r'\d{2}:\d{2}:\d{2}[.,]\d{3} -->', stripped_line) or stripped_line == '':
-            # Пропускаем номера субтитров, временные метки и пустые строки
-            unique_subtitles.append(line)
-            continue
-
-        # Удаляем текст в квадратных скобках
-        cleaned_line = re.sub(r'\[.*?\]', '', stripped_line)
-
-        if cleaned_line == previous_text:
-            # Пропускаем дублирующуюся строку
-            continue
-        else:
-            unique_subtitles.append(line)
-            previous_text = cleaned_line
-
-    # Записываем уникальные субтитры обратно в файл
-    with open(srt_file_path, 'w', encoding='utf-8') as file:
-        for line in unique_subtitles:
-            file.write(line)
-
-    print(f"Удалены дубликаты и лишние элементы в файле: {srt_file_path}")
-
-def convert_all_vtt_to_srt_and_cleanup(subtitles_dir='subtitles'):
-    """
-    Находит все .vtt файлы в указанной директории и конвертирует их в .srt,
-    затем удаляет дубликаты строк и текст в квадратных скобках в полученных .srt файлах.
+    Находит все .vtt файлы в указанной директории и за одно чтение каждого пишет
+    очищенный .srt (без дубликатов строк, повторов бегущих субтитров и текста
+    в квадратных скобках) и .txt в папку TXT внутри subtitles_dir.
+    Файлы обрабатываются пулом процессов (vtt_to_srt.convert_folder).
     
     :param subtitles_dir: Директория с субтитрами
+    :param workers: Количество процессов конвертации (по умолчанию — по числу ядер)
     """
-    for filename in os.listdir(subtitles_dir):
-        if filename.lower().endswith('.vtt'):
-            vtt_path = os.path.join(subtitles_dir, filename)
-            srt_filename = os.path.splitext(filename)[0] + '.srt'
-            srt_path = os.path.join(subtitles_dir, srt_filename)
-            convert_vtt_to_srt(vtt_path, srt_path)
-            remove_duplicate_lines(srt_path)
+    converted, errors = convert_folder(subtitles_dir, workers, txt_dir=os.path.join(subtitles_dir, 'TXT'))
+    for vtt_path, error in errors.items():
+        print(f"Ошибка конвертации {vtt_path}: {error}")
+    for vtt_path in converted:
+        srt_path = os.path.splitext(vtt_path)[0] + '.srt'
+        print(f"Конвертировано: {vtt_path} -> {srt_path} (+ .txt)")
+        # Удаляем оригинальный .vtt файл после успешной конвертации
+        os.remove(vtt_path)
 
 def write_error_log(missing_numbers, error_file_path='errors.txt'):
     """
@@ -197,6 +132,22 @@ def main():
         print("Необходимо указать хотя бы один язык субтитров.")
         return
 
+    # Плейлист уже скачивался в эту папку — можно обновить только новое и изменившееся
+    if os.path.exists(os.path.join('subtitles', STATE_NAME)):
+        sync_answer = input("Найдено состояние прошлой синхронизации. Обновить только новые и изменённые видео? (y/n): ")
+    else:
+        sync_answer = input("Синхронизировать плейлист (повторные запуски будут скачивать только новое)? (y/n): ")
+    if sync_answer.strip().lower() == 'y':
+        recheck_input = input("Через сколько дней перепроверять уже скачанные субтитры? (Enter — не перепроверять): ").strip()
+        recheck_days = float(recheck_input) if recheck_input.replace('.', '', 1).isdigit() else None
+        print("\nНачинаем синхронизацию субтитров...")
+        failed_numbers = sync_subtitles(playlist_link, languages=desired_languages, recheck_days=recheck_days)
+        print("Синхронизация завершена.\n")
+        print("Создаём файл с ошибками...")
+        write_error_log(failed_numbers)
+        print("Процесс завершён.\n")
+        return
+
     print("\nНачинаем определение общего количества видео в плейлисте...")
     total_videos = get_playlist_info(playlist_link)
     if total_videos == 0:
@@ -207,9 +158,9 @@ def main():
     failed_numbers = download_subtitles(playlist_link, languages=desired_languages)
     print("Загрузка субтитров завершена.\n")
 
-    print("Начинаем конвертацию .vtt файлов в .srt и удаление дубликатов...")
+    print("Начинаем конвертацию .vtt файлов в .srt и .txt и удаление дубликатов...")
     convert_all_vtt_to_srt_and_cleanup()
-    print("Конвертация и очистка завершены. Все `.srt` файлы сохранены в папке 'subtitles'.\n")
+    print("Конвертация и очистка завершены. Все `.srt` файлы сохранены в папке 'subtitles', `.txt` — в 'subtitles\\TXT'.\n")
 
     print("Создаём файл с ошибками...")
     write_error_log(failed_numbers)
@@ -1,8 +1,19 @@
 import yt_dlp
 import os
-import re
 import subprocess
 import sys
+import time
+import threading
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlparse
+
+from playlist_info_cache import load_playlist_info, playlist_entries, unavailable_numbers, resolve_entries
+from format_selector import CostAwareFormatSelector
+from download_manifest import DEFAULT_BACKOFF, DEFAULT_RETRIES, DownloadManifest, backoff_delays
+
+# Формат, который распознаватель (transcribe_folder) читает без повторного декодирования
+RECOGNIZER_SAMPLE_RATE = 16000
 
 def check_ffmpeg_installed():
     """
@@ -31,111 +42,318 @@ def check_ffmpeg_installed():
 
 def get_playlist_info(playlist_url):
     """
-    Возвращает кортеж (total_videos, first_video_url) для заданного плейлиста.
+    Возвращает кортеж (total_videos, first_video) для заданного плейлиста, где
+    first_video — информация yt-dlp о первом доступном видео.
+    Список плейлиста кэшируется (playlist_info_cache), а полная информация
+    (форматы) запрашивается только для первого видео.
     Если не удалось извлечь информацию — возвращает (0, None).
     """
-    ydl_opts = {
-        'quiet': True,
-        'skip_download': True,
-        'extract_flat': True,  # Получаем базовую информацию о списке
-    }
-
     try:
-        with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-            info_dict = ydl.extract_info(playlist_url, download=False)
-        if 'entries' not in info_dict or not info_dict['entries']:
-            print("Не удалось извлечь информацию о плейлисте (он пуст или недоступен).")
-            return (0, None)
+        info_dict, _ = load_playlist_info(playlist_url)
     except Exception as e:
         print(f"Ошибка при извлечении информации о плейлисте: {e}")
         return (0, None)
 
-    total_videos = len(info_dict['entries'])
-    first_video = info_dict['entries'][0]
-    # 'url' может меняться в зависимости от структуры,
-    # но в extract_flat обычно это поле называется 'url'
-    first_video_url = first_video['url']
+    entries = playlist_entries(info_dict)
+    if not entries:
+        print("Не удалось извлечь информацию о плейлисте (он пуст или недоступен).")
+        return (0, None)
 
-    return (total_videos, first_video_url)
+    total_videos = info_dict.get('playlist_count') or len(info_dict['entries'])
+    resolved, errors = resolve_entries(entries[:1])
+    if not resolved:
+        print(f"Ошибка при извлечении информации о первом видео: {errors[entries[0][0]]}")
+        return (total_videos, None)
+    return (total_videos, resolved[0][1])
 
-def list_available_formats(video_url):
+def list_available_formats(video_info):
     """
     Выводит на экран список форматов/качеств для примера видео (обычно первое из плейлиста).
+    Форматы берутся из уже полученной информации о видео, без нового запроса.
     """
-    ydl_opts = {
-        'quiet': True,
-        'skip_download': True,
-        'listformats': True,
-    }
     print("Список доступных форматов (кодек + разрешение):\n")
     try:
-        with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-            ydl.extract_info(video_url, download=False)
+        with yt_dlp.YoutubeDL({'quiet': True}) as ydl:
+            ydl.list_formats(video_info)
     except Exception as e:
         print(f"Не удалось получить список форматов: {e}")
 
-def download_video(playlist_url, desired_resolution='720p'):
+class HostLimiter:
     """
-    Скачивает все видео из плейлиста в лучшем доступном формате, 
-    но с ограничением по разрешению (bestvideo[height<=...]) + bestaudio.
-    Файлы нумеруются (001, 002, ...) и сохраняются в папку "Video".
+    Ограничивает количество одновременных скачиваний с одного хоста.
     """
-    save_dir = 'Video'
-    if not os.path.exists(save_dir):
-        os.makedirs(save_dir)
 
+    def __init__(self, per_host):
+        self.per_host = per_host
+        self.semaphores = {}
+        self.lock = threading.Lock()
+
+    def slot(self, url):
+        """
+        Возвращает семафор хоста ссылки; использовать как `with limiter.slot(url):`.
+        """
+        host = urlparse(url).hostname or ''
+        with self.lock:
+            if host not in self.semaphores:
+                self.semaphores[host] = threading.BoundedSemaphore(self.per_host)
+            return self.semaphores[host]
+
+def media_url(entry):
+    """
+    Возвращает ссылку на поток видео из сохранённой информации: с этого хоста идёт
+    скачивание. У YouTube страницы всех видео на www.youtube.com, а потоки — на разных
+    серверах *.googlevideo.com. Если потоков в информации нет — ссылку на страницу.
+    """
+    streams = [entry] + list(entry.get('requested_formats') or []) + list(reversed(entry.get('formats') or []))
+    for stream in streams:
+        url = stream.get('url')
+        if url and urlparse(url).hostname and url != entry.get('webpage_url'):
+            return url
+    return entry.get('webpage_url') or entry.get('url') or ''
+
+class ThroughputMeter:
+    """
+    Считает суммарный объём скачанного всеми потоками и выводит общую скорость.
+    """
+
+    def __init__(self, total_files):
+        self.total_files = total_files
+        self.done_files = 0
+        self.file_bytes = {}
+        self.started = time.perf_counter()
+        self.lock = threading.Lock()
+
+    def hook(self, status):
+        """
+        Хук прогресса yt-dlp: запоминает, сколько байт скачано каждого файла.
+        """
+        if status['status'] in ('downloading', 'finished'):
+            downloaded = status.get('downloaded_bytes') or status.get('total_bytes') or 0
+            with self.lock:
+                self.file_bytes[status.get('filename')] = downloaded
+
+    def file_done(self):
+        with self.lock:
+            self.done_files += 1
+
+    def report(self):
+        with self.lock:
+            total_bytes = sum(self.file_bytes.values())
+            done_files = self.done_files
+        elapsed = time.perf_counter() - self.started
+        speed = total_bytes / elapsed / (1024 * 1024) if elapsed > 0 else 0.0
+        print(
+            f"Готово файлов: {done_files}/{self.total_files}, скачано {total_bytes / (1024 * 1024):.1f} МБ "
+            f"за {elapsed:.0f} с, общая скорость {speed:.2f} МБ/с"
+        )
+
+def download_entries(entries, ydl_opts, save_dir, workers=4, per_host=2, report_interval=10.0,
+                     manifest=None, retries=DEFAULT_RETRIES, backoff=DEFAULT_BACKOFF, name_template=None):
+    """
+    Скачивает видео плейлиста параллельно, по workers штук одновременно (не больше
+    per_host с одного хоста потоков, см. media_url). Имена файлов — как при последовательной загрузке:
+    NNN.название.расширение, где NNN — номер в плейлисте. Каждые report_interval
+    секунд выводится общая скорость. При workers=1 видео скачиваются по очереди
+    с обычным выводом yt-dlp.
+
+    Если передан manifest (DownloadManifest), видео, уже скачанные в прошлые запуски
+    (по ID, файл на месте), пропускаются, а состояние, объём и время загрузки каждого номера записываются в него.
+    Полная информация (форматы) запрашивается только для оставшихся видео (resolve_entries).
+    Неудачные номера повторяются до retries раз с паузами backoff, 2·backoff, 4·backoff секунд.
+
+    :param entries: Список пар (номер в плейлисте, информация yt-dlp о видео или запись плоского списка)
+                    из playlist_entries
+    :param ydl_opts: Опции yt-dlp (формат, постобработка); шаблон имени задаётся здесь
+    :param name_template: Шаблон имени файла yt-dlp вместо NNN.название.расширение
+    :return: Список номеров (строки 'NNN'), которые скачать не удалось
+    """
+    if manifest is not None:
+        completed = manifest.completed(entries)
+        if completed:
+            print(f"Уже скачано ранее: {len(completed)}, пропускаем.")
+        entries = [(index, entry) for index, entry in entries if index not in completed]
+
+    # Видео, которые разобрать не удалось, остаются записями плоского списка: yt-dlp разберёт
+    # их сам при скачивании, и ошибка попадёт в манифест и повторы как обычно
+    resolved, _ = resolve_entries(entries, workers=workers)
+    resolved = dict(resolved)
+    entries = [(index, resolved.get(index, entry)) for index, entry in entries]
+
+    limiter = HostLimiter(per_host)
+    # Ограничение — по хостам потоков, а не страниц; если хостов мало, реальная параллельность ниже workers
+    hosts = Counter(urlparse(media_url(entry)).hostname or '' for _, entry in entries)
+    effective = min(workers, sum(min(count, per_host) for count in hosts.values()))
+    if entries and effective < workers:
+        print(
+            f"Одновременно будет скачиваться не больше {effective} (не больше {per_host} с одного хоста, "
+            f"хостов: {len(hosts)}), а не {workers}"
+        )
+    meter = ThroughputMeter(len(entries))
+    # Вывод нескольких потоков одновременно перемешивается, поэтому он скрывается
+    quiet = workers > 1
+    finished = threading.Event()
+
+    def download_one(index, entry):
+        url = entry.get('webpage_url') or entry.get('url') or ''
+        stream_url = media_url(entry)
+        final_files = []
+        hooks = [meter.hook]
+        if manifest is not None:
+            manifest.start(index, entry)
+            hooks.append(manifest.progress_hook(index))
+        entry_opts = dict(
+            ydl_opts,
+            outtmpl=os.path.join(save_dir, name_template or f'{index:03d}.%(title)s.%(ext)s'),
+            ignoreerrors=False,
+            quiet=quiet,
+            noprogress=quiet,
+            progress_hooks=hooks,
+            post_hooks=[final_files.append],
+        )
+        entry_opts.pop('playlistend', None)
+        error = None
+        try:
+            with limiter.slot(stream_url):
+                with yt_dlp.YoutubeDL(entry_opts) as ydl:
+                    try:
+                        # Видео уже разобрано (resolve_entries): скачиваем по готовой информации
+                        ydl.process_ie_result(dict(entry), download=True)
+                    except yt_dlp.utils.DownloadError:
+                        # Ссылки на потоки могли истечь — перезапрашиваем видео по его странице
+                        ydl.download([url])
+        except Exception as e:
+            print(f"Ошибка при загрузке {index:03d} ({url}): {e}")
+            error = e
+        if manifest is not None:
+            if error is None:
+                manifest.finish(index, final_files[-1] if final_files else None)
+            else:
+                manifest.fail(index, error)
+        if error is None:
+            meter.file_done()
+        return error is not None
+
+    def download_round(round_entries):
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            results = list(executor.map(lambda entry: download_one(*entry), round_entries))
+        return [entry for entry, failed in zip(round_entries, results) if failed]
+
+    def report_periodically():
+        while not finished.wait(report_interval):
+            meter.report()
+
+    reporter = threading.Thread(target=report_periodically, daemon=True)
+    reporter.start()
+    try:
+        failed_entries = download_round(entries)
+        # Повторяются только неудачные номера, с растущей паузой между попытками
+        for delay in backoff_delays(retries, backoff):
+            if not failed_entries:
+                break
+            numbers = ', '.join(f'{index:03d}' for index, _ in failed_entries)
+            print(f"Повторная попытка через {delay:.0f} с для номеров: {numbers}")
+            time.sleep(delay)
+            failed_entries = download_round(failed_entries)
+    finally:
+        finished.set()
+    meter.report()
+    return [f'{index:03d}' for index, _ in failed_entries]
+
+def download_playlist(playlist_url, ydl_opts, save_dir, concurrency, label):
+    """
+    Скачивает плейлист по сохранённой информации (playlist_info_cache) через download_entries.
+    Состояние каждого номера ведётся в манифесте папки save_dir (download_manifest),
+    поэтому повторный запуск докачивает только то, что не скачалось.
+
+    :param label: Подпись для вывода, например "видео... Всего видео"
+    :return: Отсортированный список номеров (строки 'NNN'), которые скачать не удалось
+    """
+    try:
+        playlist_info, _ = load_playlist_info(playlist_url)
+    except Exception as e:
+        print(f"Ошибка при извлечении информации о плейлисте: {e}")
+        return []
+    if 'entries' not in playlist_info:
+        print("Не удалось извлечь информацию о плейлисте.")
+        return []
+
+    # Список видео — из кэша; полную информацию download_entries запросит только для нескачанных
+    entries = playlist_entries(playlist_info)
+    print(f"\nНачинаем загрузку {label}: {len(entries)}, одновременно: {concurrency}\n")
+    failed_numbers = unavailable_numbers(playlist_info)
+    for number in failed_numbers:
+        print(f"Видео недоступно: {number}")
+
+    manifest = DownloadManifest(save_dir, playlist_info.get('id') or playlist_url)
+    try:
+        failed_numbers += download_entries(entries, ydl_opts, save_dir, workers=concurrency, manifest=manifest)
+        done, total_bytes, total_seconds = manifest.summary()
+        print(f"В манифесте скачанных: {done}, {total_bytes / (1024 * 1024):.1f} МБ, "
+              f"время загрузки {total_seconds:.0f} с")
+    finally:
+        manifest.close()
+    return sorted(failed_numbers)
+
+def resolution_height(desired_resolution='720p'):
+    """
+    Возвращает высоту кадра из строки разрешения, например 720 из '720p' (по умолчанию 720).
+    """
     # Числовое значение разрешения, чтобы получить, например, 720 из '720p'
     resolution_number = ''.join(filter(str.isdigit, desired_resolution))
 
     # Если разрешение не получилось извлечь, по умолчанию 720
     if not resolution_number.isdigit():
         resolution_number = "720"
+    return int(resolution_number)
 
-    # Формат с fallback:
-    # 1) bestvideo высотой <= resolution_number + bestaudio
-    # 2) если не получилось, best
-    ydl_format = (
-        f"bestvideo[height<={resolution_number}]+bestaudio/best"
-    )
+def download_video(playlist_url, desired_resolution='720p', concurrency=1):
+    """
+    Скачивает все видео из плейлиста в наибольшем разрешении не выше заданного,
+    выбирая самый дешёвый формат этого разрешения (см. format_selector).
+    Файлы нумеруются (001, 002, ...) и сохраняются в папку "Video".
+    Если concurrency больше 1, видео скачиваются параллельно (см. download_entries).
+    """
+    save_dir = 'Video'
+    if not os.path.exists(save_dir):
+        os.makedirs(save_dir)
 
+    format_selector = CostAwareFormatSelector(resolution_height(desired_resolution))
     ydl_opts = {
         'ignoreerrors': True,  # Не прерывать скачивание при ошибке в одном видео
         'outtmpl': os.path.join(save_dir, '%(playlist_index)03d.%(title)s.%(ext)s'),
-        'format': ydl_format,
+        # Самый дешёвый формат нужного разрешения: готовый поток, если он есть, иначе видео + звук
+        'format': format_selector,
         'playlistend': 5000,   # Чтобы скачивались все видео плейлиста до 5000
     }
 
-    failed_numbers = []
-
-    try:
-        with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-            playlist_info = ydl.extract_info(playlist_url, download=False)
-            if 'entries' not in playlist_info:
-                print("Не удалось извлечь информацию о плейлисте.")
-                return []
-            total_videos = len(playlist_info['entries'])
-            print(f"\nНачинаем загрузку видео... Всего видео: {total_videos}\n")
-            ydl.download([playlist_url])
-
-        # Проверяем, какие видео не скачались
-        for i in range(1, total_videos + 1):
-            number_str = f"{i:03d}"
-            # Файлы могут иметь разные расширения (mp4, mkv, webm...)
-            pattern = re.compile(rf'^{number_str}\..*\.(mp4|mkv|webm|flv|mov|avi)$', re.IGNORECASE)
-            found = [f for f in os.listdir(save_dir) if pattern.match(f)]
-            if not found:
-                failed_numbers.append(number_str)
-                print(f"Видео не найдено для номера: {number_str}")
+    failed_numbers = download_playlist(playlist_url, ydl_opts, save_dir, concurrency, "видео... Всего видео")
+    format_selector.report()
+    return failed_numbers
 
-    except Exception as e:
-        print(f"Ошибка при загрузке видео: {e}")
+def recognizer_audio_options(codec='wav', keep_original=False):
+    """
+    Возвращает опции yt-dlp, которые сразу после скачивания переводят аудио
+    в 16 кГц моно 16 бит — формат распознавателя. Тяжёлое декодирование
+    выполняется один раз, пока следующие файлы ещё скачиваются.
 
-    return failed_numbers
+    :param codec: 'wav' (PCM, распознаватель читает файл напрямую) или 'flac' (без потерь, вдвое компактнее)
+    :param keep_original: Сохранить ли исходный файл (m4a/webm/opus) рядом с преобразованным
+    """
+    return {
+        'postprocessors': [{'key': 'FFmpegExtractAudio', 'preferredcodec': codec}],
+        'postprocessor_args': {
+            'extractaudio': ['-ar', str(RECOGNIZER_SAMPLE_RATE), '-ac', '1', '-sample_fmt', 's16'],
+        },
+        'keepvideo': keep_original,
+    }
 
-def download_audio(playlist_url):
+def download_audio(playlist_url, recognizer_codec=None, keep_original=False, concurrency=1):
     """
     Скачивает лучшие аудио-дорожки (bestaudio) из плейлиста.
     Файлы нумеруются и сохраняются в папку "Audio".
+    Если задан recognizer_codec ('wav' или 'flac'), аудио сразу переводится
+    в формат распознавателя; исходный файл сохраняется, только если keep_original.
+    Если concurrency больше 1, треки скачиваются параллельно (см. download_entries).
     """
     save_dir = 'Audio'
     if not os.path.exists(save_dir):
@@ -148,33 +366,10 @@ def download_audio(playlist_url):
         'format': 'bestaudio/best',
         'playlistend': 5000,
     }
+    if recognizer_codec is not None:
+        ydl_opts.update(recognizer_audio_options(recognizer_codec, keep_original))
 
-    failed_numbers = []
-
-    try:
-        with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-            playlist_info = ydl.extract_info(playlist_url, download=False)
-            if 'entries' not in playlist_info:
-                print("Не удалось извлечь информацию о плейлисте.")
-                return []
-            total_videos = len(playlist_info['entries'])
-            print(f"\nНачинаем загрузку аудио... Всего треков: {total_videos}\n")
-            ydl.download([playlist_url])
-
-        # Проверяем, какие аудио не скачались
-        for i in range(1, total_videos + 1):
-            number_str = f"{i:03d}"
-            # Наиболее распространённые расширения аудио
-            pattern = re.compile(rf'^{number_str}\..*\.(m4a|webm|mp3|opus|aac|wav|flac)$', re.IGNORECASE)
-            found = [f for f in os.listdir(save_dir) if pattern.match(f)]
-            if not found:
-                failed_numbers.append(number_str)
-                print(f"Аудио не найдено для номера: {number_str}")
-
-    except Exception as e:
-        print(f"Ошибка при загрузке аудио: {e}")
-
-    return failed_numbers
+    return download_playlist(playlist_url, ydl_opts, save_dir, concurrency, "аудио... Всего треков")
 
 def write_error_log(missing_numbers, error_file_path='errors.txt'):
     """
@@ -203,7 +398,7 @@ def main():
         input("Нажмите Enter, чтобы выйти...")
         return
 
-    total_videos, first_video_url = get_playlist_info(playlist_link)
+    total_videos, first_video = get_playlist_info(playlist_link)
     if total_videos == 0:
         print("Не удалось определить количество видео в плейлисте. Завершение работы.")
         input("Нажмите Enter, чтобы выйти...")
@@ -213,7 +408,7 @@ def main():
 
     # Показываем форматы для примера (первого видео)
     print("Доступные форматы и разрешения для первого видео:\n")
-    list_available_formats(first_video_url)
+    list_available_formats(first_video)
 
     # Спрашиваем, что качать: аудио или видео
     print("\nЧто вы хотите скачать?")
@@ -223,16 +418,32 @@ def main():
 
     failed_numbers = []
 
+    # Сколько файлов скачивать одновременно
+    concurrency = 1
+    if choice in ('1', '2'):
+        concurrency_input = input("Сколько файлов скачивать одновременно? (Enter — 1): ").strip()
+        if concurrency_input.isdigit() and int(concurrency_input) > 0:
+            concurrency = int(concurrency_input)
+
     if choice == '1':
         # Если видео — спрашиваем желаемое разрешение
         print("\nВведите желаемое разрешение (например: 1080p, 720p, 480p, 360p).")
         desired_resolution = input("Укажите разрешение: ").strip()
         if not desired_resolution:
             desired_resolution = "720p"  # По умолчанию
-        failed_numbers = download_video(playlist_link, desired_resolution)
+        failed_numbers = download_video(playlist_link, desired_resolution, concurrency)
     elif choice == '2':
-        # Скачиваем аудио
-        failed_numbers = download_audio(playlist_link)
+        # Скачиваем аудио; по желанию — сразу в формате для распознавания
+        print("\nПодготовить аудио для распознавания (16 кГц, моно)?")
+        print("1. Да, WAV")
+        print("2. Да, FLAC (без потерь, меньше места)")
+        print("Enter — нет, сохранить как есть")
+        codec_choice = input("Введите номер: ").strip()
+        recognizer_codec = {'1': 'wav', '2': 'flac'}.get(codec_choice)
+        keep_original = False
+        if recognizer_codec is not None:
+            keep_original = input("Сохранить и исходный файл? (y/n): ").strip().lower() == 'y'
+        failed_numbers = download_audio(playlist_link, recognizer_codec, keep_original, concurrency)
     else:
         print("Неверный выбор. Завершение работы.")
         input("Нажмите Enter, чтобы выйти...")
@@ -0,0 +1,208 @@
+"""
+Выбор формата видео с учётом стоимости загрузки для download_videos.py.
+
+Строка "bestvideo[height<=N]+bestaudio/best" всегда берёт два потока и склеивает
+их ffmpeg, даже если у видео есть готовый поток (видео и звук вместе) нужного
+разрешения. CostAwareFormatSelector — формат-функция yt-dlp: среди форматов видео
+(они уже есть в кэше информации о плейлисте) выбирается наибольшее разрешение
+не выше заданного, а среди вариантов этого разрешения — самый дешёвый по оценке
+времени: скачивание байтов плюс склейка (запуск ffmpeg и копирование потоков).
+Решение и экономия относительно строки по умолчанию выводятся для каждого видео
+и в сумме по плейлисту.
+"""
+import threading
+from statistics import median
+
+from yt_dlp.utils import determine_protocol, get_compatible_ext
+
+# Оценочная скорость скачивания, байт/с: переводит размер в секунды
+DEFAULT_BANDWIDTH = 5 * 1024 * 1024
+# Склейка — копирование потоков без перекодирования: запуск ffmpeg и чтение/запись файла
+MERGE_OVERHEAD_SECONDS = 1.0
+MERGE_THROUGHPUT = 200 * 1024 * 1024
+
+def is_video(fmt):
+    return fmt.get('vcodec') not in (None, 'none') or (fmt.get('height') and fmt.get('vcodec') is None)
+
+def has_audio(fmt):
+    return fmt.get('acodec') not in (None, 'none') or fmt.get('acodec') is None and fmt.get('vcodec') is None
+
+def implied_duration(formats):
+    """
+    Оценивает длительность видео в секундах по форматам, у которых известны и размер, и битрейт.
+    """
+    durations = [
+        fmt['filesize'] * 8 / (fmt['tbr'] * 1000)
+        for fmt in formats if fmt.get('filesize') and fmt.get('tbr')
+    ]
+    return median(durations) if durations else None
+
+def estimate_bytes(fmt, duration):
+    """
+    Возвращает оценку размера формата в байтах: точный или приблизительный размер,
+    иначе битрейт × длительность. None, если оценить нельзя.
+    """
+    size = fmt.get('filesize') or fmt.get('filesize_approx')
+    if size:
+        return size
+    if fmt.get('tbr') and duration:
+        return fmt['tbr'] * 1000 / 8 * duration
+    return None
+
+def merge_formats(video, audio):
+    """
+    Возвращает описание склеенного формата для yt-dlp (как у video+audio в строке формата).
+    """
+    return {
+        'requested_formats': [video, audio],
+        'format_id': f"{video['format_id']}+{audio['format_id']}",
+        'ext': get_compatible_ext(
+            vcodecs=[video.get('vcodec')], acodecs=[audio.get('acodec')],
+            vexts=[video['ext']], aexts=[audio['ext']],
+        ),
+        'protocol': f"{determine_protocol(video)}+{determine_protocol(audio)}",
+        'width': video.get('width'),
+        'height': video.get('height'),
+        'fps': video.get('fps'),
+        'vcodec': video.get('vcodec'),
+        'acodec': audio.get('acodec'),
+        'tbr': (video.get('tbr') or 0) + (audio.get('tbr') or audio.get('abr') or 0),
+    }
+
+class CostAwareFormatSelector:
+    """
+    Формат-функция yt-dlp (значение опции 'format'), выбирающая самый дешёвый формат
+    нужного качества. Один объект можно передавать в опции нескольких потоков
+    загрузки: итоговая статистика копится под блокировкой.
+
+    :param max_height: Максимальная высота кадра, например 720
+    :param bandwidth: Оценка скорости скачивания, байт/с
+    :param verbose: Выводить ли решение для каждого видео
+    """
+
+    def __init__(self, max_height=720, bandwidth=DEFAULT_BANDWIDTH, verbose=True):
+        self.max_height = max_height
+        self.bandwidth = bandwidth
+        self.verbose = verbose
+        self.lock = threading.Lock()
+        self.videos = 0
+        self.merges_avoided = 0
+        self.chosen_bytes = 0
+        self.baseline_bytes = 0
+        self.chosen_seconds = 0.0
+        self.baseline_seconds = 0.0
+
+    def cost(self, size, merged):
+        """
+        Оценивает стоимость варианта в секундах: скачивание плюс склейка, если она нужна.
+        """
+        seconds = size / self.bandwidth
+        if merged:
+            seconds += MERGE_OVERHEAD_SECONDS + size / MERGE_THROUGHPUT
+        return seconds
+
+    def candidates(self, formats, duration):
+        """
+        Возвращает варианты загрузки не выше max_height: готовые потоки и пары
+        видео + лучший звук. Каждый вариант — (высота, размер, нужна ли склейка, формат).
+        """
+        audio_only = [fmt for fmt in formats if has_audio(fmt) and not is_video(fmt)]
+        options = []
+        for fmt in formats:
+            height = fmt.get('height') or 0
+            size = estimate_bytes(fmt, duration)
+            if not is_video(fmt) or height > self.max_height or size is None:
+                continue
+            if has_audio(fmt):
+                options.append((height, size, False, fmt))
+                continue
+            # К видео берётся лучший звук того же контейнера (склейка без смены контейнера), иначе просто лучший
+            audio_ext = {'mp4': 'm4a', 'webm': 'webm'}.get(fmt.get('ext'))
+            matching = [audio for audio in audio_only if audio.get('ext') == audio_ext] or audio_only
+            if not matching:
+                continue
+            audio = max(matching, key=lambda audio: audio.get('abr') or audio.get('tbr') or 0)
+            audio_size = estimate_bytes(audio, duration)
+            if audio_size is None:
+                continue
+            options.append((height, size + audio_size, True, merge_formats(fmt, audio)))
+        return options
+
+    def baseline(self, formats, duration):
+        """
+        Возвращает (размер, описание) того, что выбрала бы строка bestvideo[height<=N]+bestaudio:
+        форматы у yt-dlp отсортированы от худшего к лучшему.
+        """
+        videos = [
+            fmt for fmt in formats
+            if is_video(fmt) and not has_audio(fmt) and (fmt.get('height') or 0) <= self.max_height
+        ]
+        audios = [fmt for fmt in formats if has_audio(fmt) and not is_video(fmt)]
+        if not videos or not audios:
+            return None, None
+        sizes = [estimate_bytes(videos[-1], duration), estimate_bytes(audios[-1], duration)]
+        if None in sizes:
+            return None, None
+        return sum(sizes), f"{videos[-1]['format_id']}+{audios[-1]['format_id']}"
+
+    def __call__(self, ctx):
+        formats = ctx['formats']
+        duration = implied_duration(formats)
+        options = self.candidates(formats, duration)
+        if not options:
+            # Оценить нечего (нет размеров или только звук) — как "best" в строке формата
+            if formats:
+                yield formats[-1]
+            return
+
+        # Качество: наибольшая доступная высота не выше max_height; среди вариантов этой высоты — самый дешёвый
+        target_height = max(height for height, _, _, _ in options)
+        height, size, merged, chosen = min(
+            (option for option in options if option[0] == target_height),
+            key=lambda option: self.cost(option[1], option[2]),
+        )
+        baseline_size, baseline_id = self.baseline(formats, duration)
+        chosen_cost = self.cost(size, merged)
+        if baseline_size is None:
+            baseline_size, baseline_cost = size, chosen_cost
+        else:
+            baseline_cost = self.cost(baseline_size, True)
+
+        with self.lock:
+            self.videos += 1
+            self.chosen_bytes += size
+            self.baseline_bytes += baseline_size
+            self.chosen_seconds += chosen_cost
+            self.baseline_seconds += baseline_cost
+            if not merged and baseline_id is not None:
+                self.merges_avoided += 1
+
+        if self.verbose:
+            megabyte = 1024 * 1024
+            kind = "склейка" if merged else "готовый поток"
+            message = f"Формат {chosen['format_id']} ({height}p, {kind}, ~{size / megabyte:.1f} МБ)"
+            if baseline_id is not None and baseline_id != chosen['format_id']:
+                message += (
+                    f" вместо {baseline_id} (~{baseline_size / megabyte:.1f} МБ, склейка): "
+                    f"оценка времени {chosen_cost:.0f} с вместо {baseline_cost:.0f} с"
+                )
+            print(message)
+        yield chosen
+
+    def report(self):
+        """
+        Выводит итог подбора форматов по всем видео.
+        """
+        with self.lock:
+            videos, avoided = self.videos, self.merges_avoided
+            chosen, baseline = self.chosen_bytes, self.baseline_bytes
+            chosen_seconds, baseline_seconds = self.chosen_seconds, self.baseline_seconds
+        if not videos:
+            return
+        megabyte = 1024 * 1024
+        print(
+            f"Подбор форматов: видео {videos}, без склейки ffmpeg {avoided}; "
+            f"по оценке скачано {chosen / megabyte:.1f} МБ вместо {baseline / megabyte:.1f} МБ "
+            f"(экономия {(baseline - chosen) / megabyte:.1f} МБ), время {chosen_seconds:.0f} с "
+            f"вместо {baseline_seconds:.0f} с при bestvideo+bestaudio"
+        )
@@ -0,0 +1,201 @@
+"""
+Зеркалирование нескольких плейлистов с общим хранилищем видео.
+
+Плейлисты часто пересекаются: одно и то же видео входит в несколько из них.
+Скрипт собирает ID всех видео всех плейлистов, скачивает каждое уникальное видео
+один раз в хранилище (Store/<ID>.<расширение>), а в папке каждого плейлиста
+создаёт на него жёсткую или символическую ссылку с обычным именем
+NNN.название.расширение. В конце выводится, сколько трафика сэкономил этот запуск
+(ссылки, созданные вместо повторных загрузок) и сколько места на диске занимает
+зеркало по сравнению с отдельным хранением каждого плейлиста.
+
+Пример:
+    python mirror_playlists.py URL1 URL2 --urls-file more_playlists.txt --concurrency 4
+"""
+import os
+import argparse
+from collections import Counter
+
+from yt_dlp.utils import sanitize_filename
+
+from playlist_info_cache import load_playlist_info, playlist_entries
+from download_videos import download_entries, recognizer_audio_options, resolution_height
+from format_selector import CostAwareFormatSelector
+
+# Недокачанные файлы yt-dlp не считаются содержимым хранилища
+PARTIAL_SUFFIXES = ('.part', '.ytdl', '.temp')
+
+def scan_store(store_dir):
+    """
+    Возвращает словарь {ID видео: имя файла} по содержимому хранилища — один просмотр папки.
+    """
+    stored = {}
+    for name in os.listdir(store_dir):
+        if name.startswith('.') or name.endswith(PARTIAL_SUFFIXES):
+            continue
+        video_id, ext = os.path.splitext(name)
+        if ext:
+            stored[video_id] = name
+    return stored
+
+def collect_playlists(playlist_urls):
+    """
+    Получает информацию о плейлистах (через кэш) и сопоставляет их видео по ID.
+
+    :return: Кортеж (список (название папки, [(номер, информация о видео)]),
+             словарь {ID видео: информация о видео} по всем плейлистам)
+    """
+    playlists = []
+    unique = {}
+    for playlist_url in playlist_urls:
+        try:
+            info, _ = load_playlist_info(playlist_url)
+        except Exception as e:
+            print(f"Ошибка при извлечении информации о плейлисте {playlist_url}: {e}")
+            continue
+        entries = [(index, entry) for index, entry in playlist_entries(info) if entry.get('id')]
+        folder = sanitize_filename(info.get('title') or info.get('id') or playlist_url)
+        playlists.append((folder, entries))
+        for _, entry in entries:
+            unique.setdefault(entry['id'], entry)
+        print(f"{folder}: видео {len(entries)}")
+    return playlists, unique
+
+def link_file(source, target, mode='hard'):
+    """
+    Создаёт ссылку target на файл хранилища source. Жёсткая ссылка возможна только
+    в пределах одного диска — иначе создаётся символическая.
+
+    :return: True, если ссылка создана; False, если она уже была
+    """
+    if os.path.lexists(target):
+        if os.path.exists(target) and os.path.samefile(source, target):
+            return False
+        os.remove(target)
+    if mode == 'hard':
+        try:
+            os.link(source, target)
+            return True
+        except OSError:
+            pass
+    os.symlink(os.path.relpath(source, os.path.dirname(target)), target)
+    return True
+
+def mirror_playlists(playlist_urls, output_dir, store_dir, ydl_opts, concurrency=2, link_mode='hard'):
+    """
+    Скачивает видео плейлистов в общее хранилище без повторов и раскладывает ссылки по папкам плейлистов.
+
+    :param ydl_opts: Опции yt-dlp (формат, постобработка) без шаблона имени
+    :param link_mode: 'hard' — жёсткие ссылки (с переходом на символические между дисками), 'symlink' — символические
+    :return: Список строк 'папка/NNN' для видео, которые скачать не удалось
+    """
+    os.makedirs(store_dir, exist_ok=True)
+    playlists, unique = collect_playlists(playlist_urls)
+    references = sum(len(entries) for _, entries in playlists)
+
+    stored = scan_store(store_dir)
+    missing = [entry for video_id, entry in unique.items() if video_id not in stored]
+    print(
+        f"\nВсего ссылок на видео: {references}, уникальных видео: {len(unique)}, "
+        f"уже в хранилище: {len(unique) - len(missing)}, скачать: {len(missing)}\n"
+    )
+    if missing:
+        download_entries(
+            list(enumerate(missing, start=1)), ydl_opts, store_dir,
+            workers=concurrency, name_template='%(id)s.%(ext)s',
+        )
+        stored_before = stored
+        stored = scan_store(store_dir)
+        downloaded = [stored[video_id] for video_id in stored.keys() - stored_before.keys()]
+    else:
+        downloaded = []
+
+    failed = []
+    new_links = Counter()
+    references_bytes = 0
+    for folder, entries in playlists:
+        playlist_dir = os.path.join(output_dir, folder)
+        os.makedirs(playlist_dir, exist_ok=True)
+        for index, entry in entries:
+            stored_name = stored.get(entry['id'])
+            if stored_name is None:
+                failed.append(f"{folder}/{index:03d}")
+                continue
+            source = os.path.join(store_dir, stored_name)
+            ext = os.path.splitext(stored_name)[1]
+            title = sanitize_filename(entry.get('title') or entry['id'])
+            size = os.path.getsize(source)
+            if link_file(source, os.path.join(playlist_dir, f"{index:03d}.{title}{ext}"), link_mode):
+                new_links[entry['id']] += 1
+            references_bytes += size
+
+    unique_bytes = sum(
+        os.path.getsize(os.path.join(store_dir, stored[video_id])) for video_id in unique if video_id in stored
+    )
+    downloaded_bytes = sum(os.path.getsize(os.path.join(store_dir, name)) for name in downloaded)
+    megabyte = 1024 * 1024
+    # Без хранилища видео, на которое этот запуск создал несколько ссылок, скачивалось бы
+    # столько же раз; сэкономлены все загрузки, кроме одной. Ссылки прошлых запусков не в счёт.
+    saved_bytes = sum(
+        (count - 1) * os.path.getsize(os.path.join(store_dir, stored[video_id]))
+        for video_id, count in new_links.items()
+    )
+    print(f"\nСоздано новых ссылок: {sum(new_links.values())}")
+    print(f"Скачано сейчас: {len(downloaded)} видео, {downloaded_bytes / megabyte:.1f} МБ")
+    print(f"Сэкономлено трафика этим запуском: {saved_bytes / megabyte:.1f} МБ")
+    print(
+        f"Диск: зеркало занимает {unique_bytes / megabyte:.1f} МБ вместо "
+        f"{references_bytes / megabyte:.1f} МБ при отдельном хранении каждого плейлиста"
+    )
+    return failed
+
+def parse_args(argv=None):
+    """
+    Разбирает аргументы командной строки.
+    """
+    parser = argparse.ArgumentParser(description="Скачивает несколько плейлистов, храня общие видео один раз.")
+    parser.add_argument("playlists", nargs="*", help="Ссылки на плейлисты.")
+    parser.add_argument("--urls-file", default=None, help="Файл со ссылками на плейлисты, по одной на строку.")
+    parser.add_argument("--output", default="Mirror", help="Папка с папками плейлистов (по умолчанию Mirror).")
+    parser.add_argument("--store", default=None, help="Папка хранилища (по умолчанию <output>/Store).")
+    parser.add_argument("--audio", action="store_true", help="Скачивать только аудио (bestaudio).")
+    parser.add_argument(
+        "--recognizer-codec", choices=("wav", "flac"), default=None,
+        help="С --audio: сразу перевести аудио в 16 кГц моно для распознавания.",
+    )
+    parser.add_argument("--resolution", default="720p", help="Максимальное разрешение видео (по умолчанию 720p).")
+    parser.add_argument("--concurrency", type=int, default=2, help="Одновременных скачиваний (по умолчанию 2).")
+    parser.add_argument(
+        "--link", choices=("hard", "symlink"), default="hard",
+        help="Тип ссылок в папках плейлистов (по умолчанию hard: жёсткие, между дисками — символические).",
+    )
+    return parser.parse_args(argv)
+
+def main():
+    args = parse_args()
+    playlist_urls = list(args.playlists)
+    if args.urls_file:
+        with open(args.urls_file, 'r', encoding='utf-8') as urls_file:
+            playlist_urls += [line.strip() for line in urls_file if line.strip() and not line.startswith('#')]
+    if not playlist_urls:
+        print("Не указано ни одного плейлиста.")
+        return
+
+    if args.audio:
+        ydl_opts = {'format': 'bestaudio/best'}
+        if args.recognizer_codec:
+            ydl_opts.update(recognizer_audio_options(args.recognizer_codec))
+    else:
+        ydl_opts = {'format': CostAwareFormatSelector(resolution_height(args.resolution))}
+
+    store_dir = args.store or os.path.join(args.output, 'Store')
+    failed = mirror_playlists(playlist_urls, args.output, store_dir, ydl_opts, args.concurrency, args.link)
+    if not args.audio:
+        ydl_opts['format'].report()
+    if failed:
+        print(f"\nНе удалось скачать: {len(failed)}")
+        for item in failed:
+            print(f"  {item}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,171 @@
+"""
+Кэш информации о плейлистах для download_videos.py и download_subtitles.
+
+Список плейлиста получается быстрым плоским разбором (ID, названия и ссылки
+видео, один запрос на страницу списка) и сохраняется в info-JSON: по нему
+считаются и нумеруются видео. Полная информация (форматы, субтитры) запрашивается
+только для тех видео, которые действительно нужны (resolve_entries), — например,
+ещё не скачанных, — параллельно, и кэшируется для каждого видео отдельно.
+Ссылки на потоки у YouTube живут несколько часов, поэтому записи кэша
+устаревают через ttl секунд; если ссылка всё же истекла, yt-dlp сам
+перезапрашивает видео по его странице.
+"""
+import os
+import json
+import time
+import hashlib
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import yt_dlp
+
+DEFAULT_CACHE_DIR = os.path.join(os.path.expanduser("~"), ".cache", "playlist_info")
+DEFAULT_TTL = 3 * 3600
+# Сколько видео разбирать одновременно
+DEFAULT_RESOLVE_WORKERS = 8
+
+def info_file_path(playlist_url, cache_dir=DEFAULT_CACHE_DIR):
+    """
+    Возвращает путь к info-JSON плейлиста в кэше.
+    """
+    key = hashlib.sha256(playlist_url.strip().encode("utf-8")).hexdigest()[:32]
+    return os.path.join(cache_dir, key + ".info.json")
+
+def read_cached(path, ttl):
+    """
+    Возвращает (информация, возраст в секундах) из info-JSON, если он моложе ttl секунд, иначе None.
+    """
+    try:
+        age = time.time() - os.path.getmtime(path)
+        if age < ttl:
+            with open(path, "r", encoding="utf-8") as info_file:
+                return json.load(info_file), age
+    except (OSError, json.JSONDecodeError):
+        pass
+    return None
+
+def write_cached(path, info):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    temp_path = f"{path}.{threading.get_ident()}.tmp"
+    with open(temp_path, "w", encoding="utf-8") as info_file:
+        json.dump(info, info_file, ensure_ascii=False)
+    os.replace(temp_path, path)
+
+def load_playlist_info(playlist_url, ttl=DEFAULT_TTL, cache_dir=DEFAULT_CACHE_DIR, refresh=False):
+    """
+    Возвращает список плейлиста (плоский разбор: ID, названия и ссылки видео):
+    из кэша, если запись моложе ttl секунд, иначе разбирает плейлист заново
+    и сохраняет результат. Полную информацию о видео даёт resolve_entries.
+
+    :param refresh: Не брать информацию из кэша
+    :return: Кортеж (словарь информации yt-dlp, путь к info-JSON)
+    """
+    path = info_file_path(playlist_url, cache_dir)
+    cached = None if refresh else read_cached(path, ttl)
+    if cached is not None:
+        info, age = cached
+        print(f"Информация о плейлисте взята из кэша (получена {age / 60:.0f} мин назад).")
+        return info, path
+
+    ydl_opts = {
+        'quiet': True,
+        'skip_download': True,
+        'extract_flat': 'in_playlist',
+        'ignoreerrors': True,  # Недоступные видео остаются пустыми записями, нумерация не сдвигается
+        'playlistend': 5000,
+    }
+    with yt_dlp.YoutubeDL(ydl_opts) as ydl:
+        info = ydl.sanitize_info(ydl.extract_info(playlist_url, download=False))
+    if info is None:
+        raise RuntimeError("не удалось получить информацию о плейлисте")
+    write_cached(path, info)
+    return info, path
+
+def video_info_path(video_id, cache_dir=DEFAULT_CACHE_DIR):
+    """
+    Возвращает путь к info-JSON одного видео в кэше.
+    """
+    key = hashlib.sha256(video_id.encode("utf-8")).hexdigest()[:32]
+    return os.path.join(cache_dir, "videos", key + ".info.json")
+
+def is_resolved(entry):
+    """
+    Проверяет, что у записи видео есть полная информация, а не только ссылка из плоского списка.
+    """
+    return entry.get('_type') not in ('url', 'url_transparent')
+
+def resolve_entries(entries, ttl=DEFAULT_TTL, cache_dir=DEFAULT_CACHE_DIR, workers=DEFAULT_RESOLVE_WORKERS,
+                    acquire=None):
+    """
+    Получает полную информацию (форматы, субтитры) только для переданных видео
+    плейлиста — параллельно, с кэшем для каждого видео на ttl секунд. Записи,
+    у которых полная информация уже есть, возвращаются как есть.
+
+    :param entries: Список пар (номер в плейлисте, информация о видео) из playlist_entries
+    :param acquire: Вызывается перед каждым запросом к сайту (например, TokenBucket.acquire)
+    :return: Кортеж (список пар (номер, полная информация) в исходном порядке,
+             словарь {номер: текст ошибки} для видео, которые разобрать не удалось)
+    """
+    local = threading.local()
+    stats = {'fetched': 0, 'cached': 0}
+    lock = threading.Lock()
+
+    def resolve(index, entry):
+        if is_resolved(entry):
+            return entry
+        path = video_info_path(entry.get('id') or entry['url'], cache_dir)
+        cached = read_cached(path, ttl)
+        if cached is not None:
+            info, _ = cached
+            counter = 'cached'
+        else:
+            if acquire is not None:
+                acquire()
+            # Один объект yt-dlp на поток; ошибки не подавляются, чтобы их можно было вывести
+            if not hasattr(local, 'ydl'):
+                local.ydl = yt_dlp.YoutubeDL({'quiet': True, 'skip_download': True})
+            info = local.ydl.sanitize_info(local.ydl.extract_info(entry.get('url') or entry['id'], download=False))
+            write_cached(path, info)
+            counter = 'fetched'
+        with lock:
+            stats[counter] += 1
+        # Номер в плейлисте нужен шаблонам имён (%(playlist_index)s)
+        info['playlist_index'] = index
+        return info
+
+    def resolve_safely(item):
+        index, entry = item
+        try:
+            return index, resolve(index, entry), None
+        except Exception as e:
+            return index, None, str(e)
+
+    if all(is_resolved(entry) for _, entry in entries):
+        return list(entries), {}
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+        results = list(executor.map(resolve_safely, entries))
+    resolved = [(index, info) for index, info, error in results if error is None]
+    errors = {index: error for index, _, error in results if error is not None}
+    print(
+        f"Получена информация о видео: {stats['fetched']}, из кэша: {stats['cached']}"
+        + (f", не удалось: {len(errors)}" if errors else "")
+    )
+    return resolved, errors
+
+def playlist_entries(info):
+    """
+    Возвращает список пар (номер в плейлисте, информация о видео), пропуская недоступные видео.
+    """
+    return [
+        (entry.get('playlist_index') or position, entry)
+        for position, entry in enumerate(info.get('entries') or [], start=1) if entry
+    ]
+
+def unavailable_numbers(info):
+    """
+    Возвращает номера (строки 'NNN') недоступных видео плейлиста: для них yt-dlp оставил пустые записи.
+    """
+    return [
+        f"{position:03d}"
+        for position, entry in enumerate(info.get('entries') or [], start=1) if not entry
+    ]
@@ -0,0 +1,333 @@
+"""
+Плейлист → аудио → текст одной командой.
+
+Скачивание, декодирование и распознавание идут параллельно, как конвейер:
+первый ролик уже распознаётся, пока скачивается второй. Между стадиями стоят
+очереди ограниченного размера, поэтому быстрая стадия ждёт медленную, а на диске
+одновременно лежит не больше нескольких необработанных файлов. По ходу работы и
+в конце выводится загрузка каждой стадии — по ней видно, что тормозит конвейер.
+
+Вместо плейлиста можно передать файл со ссылками (--urls-file), по ссылке на
+строку: yt-dlp скачивает и прямые ссылки на файлы, так что для проверки хватает
+локального HTTP-сервера (python -m http.server) с аудиофайлами.
+"""
+import os
+import sys
+import time
+import queue
+import argparse
+import threading
+import subprocess
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+import yt_dlp
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "transcribe_folder"))
+from transcribe_folder import DEFAULT_MODEL_PATH, init_worker, process_video_in_worker
+from audio_source import SAMPLE_RATE, ffmpeg_available, find_wav_pcm_data
+
+# Признак конца данных в очереди между стадиями
+END = None
+
+class StageStats:
+    """
+    Статистика стадии конвейера: сколько времени её обработчики работали,
+    простаивали без входных данных и ждали места в следующей очереди.
+
+    :param name: Название стадии для вывода
+    :param slots: Количество параллельных обработчиков стадии
+    """
+
+    def __init__(self, name, slots):
+        self.name = name
+        self.slots = slots
+        self.items = 0
+        self.failed = 0
+        self.busy = 0.0
+        self.starved = 0.0
+        self.blocked = 0.0
+        self.lock = threading.Lock()
+
+    def add(self, **seconds):
+        with self.lock:
+            for field, value in seconds.items():
+                setattr(self, field, getattr(self, field) + value)
+
+    def utilization(self, elapsed):
+        """
+        Доля времени, которую обработчики стадии были заняты работой.
+        """
+        return self.busy / (elapsed * self.slots) if elapsed > 0 else 0.0
+
+def timed_get(source, stats):
+    """
+    Берёт элемент из очереди и учитывает время ожидания как простой стадии.
+    """
+    start = time.perf_counter()
+    item = source.get()
+    stats.add(starved=time.perf_counter() - start)
+    return item
+
+def timed_put(target, item, stats):
+    """
+    Кладёт элемент в очередь и учитывает время ожидания места как блокировку стадии.
+    """
+    start = time.perf_counter()
+    target.put(item)
+    stats.add(blocked=time.perf_counter() - start)
+
+def list_entries(playlist_url=None, urls_file=None):
+    """
+    Возвращает список пар (номер, ссылка) из плейлиста или файла со ссылками.
+    """
+    if urls_file is not None:
+        with open(urls_file, "r", encoding="utf-8") as links:
+            urls = [line.strip() for line in links if line.strip() and not line.startswith("#")]
+        return list(enumerate(urls, start=1))
+
+    ydl_opts = {"quiet": True, "skip_download": True, "extract_flat": True}
+    with yt_dlp.YoutubeDL(ydl_opts) as ydl:
+        info_dict = ydl.extract_info(playlist_url, download=False)
+    entries = info_dict.get("entries") or []
+    return [(index, entry["url"]) for index, entry in enumerate(entries, start=1) if entry]
+
+def download_entry(index, url, save_dir):
+    """
+    Скачивает аудиодорожку одного ролика как NNN.название.расширение и возвращает путь к файлу.
+    """
+    ydl_opts = {
+        "quiet": True,
+        "noprogress": True,
+        "outtmpl": os.path.join(save_dir, f"{index:03d}.%(title)s.%(ext)s"),
+        "format": "bestaudio/best",
+    }
+    with yt_dlp.YoutubeDL(ydl_opts) as ydl:
+        info = ydl.extract_info(url, download=True)
+    downloads = info.get("requested_downloads") or []
+    return downloads[0]["filepath"] if downloads else ydl.prepare_filename(info)
+
+def decode_to_wav(audio_path, work_dir):
+    """
+    Декодирует файл в WAV 16 кГц моно: такой файл распознаватель читает напрямую, без ffmpeg.
+    Возвращает кортеж (путь к WAV, временный ли это файл). Файл, который уже в нужном формате, не декодируется.
+    """
+    if find_wav_pcm_data(audio_path) is not None:
+        return audio_path, False
+    wav_path = os.path.join(work_dir, os.path.splitext(os.path.basename(audio_path))[0] + ".wav")
+    subprocess.run(
+        ["ffmpeg", "-nostdin", "-loglevel", "error", "-y", "-i", audio_path,
+         "-ac", "1", "-ar", str(SAMPLE_RATE), "-acodec", "pcm_s16le", wav_path],
+        check=True,
+    )
+    return wav_path, True
+
+def download_stage(entries, downloaded, save_dir, stats, errors):
+    """
+    Обработчик стадии скачивания: берёт ролики из entries, пока они не кончатся.
+    """
+    while True:
+        try:
+            index, url = entries.get_nowait()
+        except queue.Empty:
+            return
+        start = time.perf_counter()
+        try:
+            audio_path = download_entry(index, url, save_dir)
+        except Exception as e:
+            stats.add(busy=time.perf_counter() - start, failed=1)
+            errors.append(f"{index:03d}: ошибка скачивания {url}: {e}")
+            continue
+        stats.add(busy=time.perf_counter() - start, items=1)
+        timed_put(downloaded, audio_path, stats)
+
+def decode_stage(downloaded, decoded, work_dir, stats, errors):
+    """
+    Обработчик стадии декодирования: переводит скачанные файлы в WAV до признака конца.
+    """
+    while True:
+        audio_path = timed_get(downloaded, stats)
+        if audio_path is END:
+            return
+        start = time.perf_counter()
+        try:
+            decoded_file = decode_to_wav(audio_path, work_dir)
+        except Exception as e:
+            stats.add(busy=time.perf_counter() - start, failed=1)
+            errors.append(f"{os.path.basename(audio_path)}: ошибка декодирования: {e}")
+            continue
+        stats.add(busy=time.perf_counter() - start, items=1)
+        timed_put(decoded, decoded_file, stats)
+
+def print_stage_stats(stages, elapsed, final=False):
+    """
+    Выводит загрузку стадий. В конце работы называет самую загруженную стадию.
+    """
+    print(f"[{time.strftime('%H:%M:%S')}] прошло {elapsed:.0f} с")
+    for stats in stages:
+        print(
+            f"  {stats.name:<14} обработчиков {stats.slots}, готово {stats.items}, ошибок {stats.failed}, "
+            f"загрузка {stats.utilization(elapsed):.0%}, простой без данных {stats.starved:.0f} с, "
+            f"ожидание следующей стадии {stats.blocked:.0f} с"
+        )
+    if final:
+        bottleneck = max(stages, key=lambda stats: stats.utilization(elapsed))
+        print(f"Узкое место: {bottleneck.name}")
+
+def run_pipeline(entries, save_dir, model_path, workers=1, download_threads=2, decode_threads=1,
+                 buffer_size=2, stats_interval=30.0):
+    """
+    Скачивает, декодирует и распознаёт ролики конвейером.
+
+    :param entries: Список пар (номер, ссылка)
+    :param save_dir: Папка для аудио; тексты сохраняются в её подпапку transcriptions
+    :param buffer_size: Сколько файлов может ждать следующей стадии между каждой парой стадий
+    :return: Список сообщений об ошибках
+    """
+    output_dir = os.path.join(save_dir, "transcriptions")
+    work_dir = os.path.join(save_dir, ".decoded")
+    for path in (save_dir, output_dir, work_dir):
+        os.makedirs(path, exist_ok=True)
+
+    pending_entries = queue.Queue()
+    for entry in entries:
+        pending_entries.put(entry)
+    downloaded = queue.Queue(maxsize=buffer_size)
+    decoded = queue.Queue(maxsize=buffer_size)
+
+    download_stats = StageStats("скачивание", download_threads)
+    decode_stats = StageStats("декодирование", decode_threads)
+    transcribe_stats = StageStats("распознавание", workers)
+    stages = [download_stats, decode_stats, transcribe_stats]
+    errors = []
+
+    downloaders = [
+        threading.Thread(target=download_stage, args=(pending_entries, downloaded, save_dir, download_stats, errors),
+                         daemon=True)
+        for _ in range(download_threads)
+    ]
+    decoders = [
+        threading.Thread(target=decode_stage, args=(downloaded, decoded, work_dir, decode_stats, errors), daemon=True)
+        for _ in range(decode_threads)
+    ]
+
+    def finish_downloads():
+        for thread in downloaders:
+            thread.join()
+        for _ in decoders:
+            downloaded.put(END)
+        for thread in decoders:
+            thread.join()
+        decoded.put(END)
+
+    started = time.perf_counter()
+    for thread in downloaders + decoders:
+        thread.start()
+    threading.Thread(target=finish_downloads, daemon=True).start()
+
+    last_report = started
+    with ProcessPoolExecutor(max_workers=workers, initializer=init_worker, initargs=(model_path,)) as executor:
+        in_flight = {}
+        inputs_done = False
+        while in_flight or not inputs_done:
+            # Новые файлы берутся, только когда есть свободный процесс: иначе они ждут в очереди decoded
+            while not inputs_done and len(in_flight) < workers:
+                try:
+                    decoded_file = decoded.get(timeout=0 if in_flight else 1.0)
+                except queue.Empty:
+                    break
+                if decoded_file is END:
+                    inputs_done = True
+                    break
+                wav_path, is_temporary = decoded_file
+                future = executor.submit(process_video_in_worker, wav_path, output_dir)
+                in_flight[future] = (wav_path, is_temporary, time.perf_counter())
+
+            if in_flight:
+                done, _ = wait(in_flight, timeout=1.0, return_when=FIRST_COMPLETED)
+                for future in done:
+                    wav_path, is_temporary, submitted = in_flight.pop(future)
+                    try:
+                        message, text_file_path, _ = future.result()
+                    except Exception as e:
+                        message, text_file_path = f"Ошибка при обработке файла {wav_path}: {e}", None
+                    transcribe_stats.add(busy=time.perf_counter() - submitted)
+                    if text_file_path is None:
+                        transcribe_stats.add(failed=1)
+                        errors.append(message)
+                    else:
+                        transcribe_stats.add(items=1)
+                        print(message)
+                    if is_temporary:
+                        os.remove(wav_path)
+
+            if time.perf_counter() - last_report >= stats_interval:
+                print_stage_stats(stages, time.perf_counter() - started)
+                last_report = time.perf_counter()
+
+    # Простой распознавания — время, когда процессы были свободны
+    elapsed = time.perf_counter() - started
+    transcribe_stats.starved = max(0.0, elapsed * workers - transcribe_stats.busy)
+    print("\nИтоги конвейера:")
+    print_stage_stats(stages, elapsed, final=True)
+    try:
+        os.rmdir(work_dir)
+    except OSError:
+        pass
+    return errors
+
+def parse_args(argv=None):
+    """
+    Разбирает аргументы командной строки.
+    """
+    parser = argparse.ArgumentParser(description="Скачивает аудио из плейлиста и распознаёт его конвейером.")
+    parser.add_argument("playlist", nargs="?", help="Ссылка на плейлист (если не указана, будет запрошена).")
+    parser.add_argument("--urls-file", default=None, help="Файл со ссылками на ролики или аудиофайлы, по одной на строку.")
+    parser.add_argument("--output", default="Audio", help="Папка для аудио (по умолчанию Audio); тексты — в её transcriptions/.")
+    parser.add_argument("--model", default=DEFAULT_MODEL_PATH, help="Путь к модели Vosk.")
+    parser.add_argument("--workers", type=int, default=1, help="Процессов распознавания (по умолчанию 1).")
+    parser.add_argument("--download-threads", type=int, default=2, help="Одновременных скачиваний (по умолчанию 2).")
+    parser.add_argument("--decode-threads", type=int, default=1, help="Одновременных декодирований (по умолчанию 1).")
+    parser.add_argument(
+        "--buffer", type=int, default=2,
+        help="Сколько файлов может ждать следующей стадии (по умолчанию 2): ограничивает место на диске.",
+    )
+    parser.add_argument("--stats-interval", type=float, default=30.0, help="Как часто выводить загрузку стадий, в секундах.")
+    return parser.parse_args(argv)
+
+def main():
+    args = parse_args()
+    if not ffmpeg_available():
+        print("ffmpeg не найден. Установите ffmpeg и добавьте его в PATH.")
+        return
+    if not os.path.exists(args.model):
+        print("Модель не найдена. Проверьте путь.")
+        return
+
+    playlist_url = args.playlist
+    if args.urls_file is None and not playlist_url:
+        playlist_url = input("Введите ссылку на плейлист YouTube: ").strip()
+        if not playlist_url:
+            print("Ссылка не может быть пустой. Завершение работы.")
+            return
+
+    try:
+        entries = list_entries(playlist_url, args.urls_file)
+    except Exception as e:
+        print(f"Ошибка при извлечении информации о плейлисте: {e}")
+        return
+    if not entries:
+        print("Не удалось извлечь информацию о плейлисте (он пуст или недоступен).")
+        return
+    print(f"Роликов: {len(entries)}")
+
+    errors = run_pipeline(
+        entries, args.output, args.model, workers=args.workers, download_threads=args.download_threads,
+        decode_threads=args.decode_threads, buffer_size=args.buffer, stats_interval=args.stats_interval,
+    )
+    if errors:
+        print(f"\nОшибок: {len(errors)}")
+        for error in errors:
+            print(f"  {error}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,333 @@
+"""
+Параллельное скачивание субтитров плейлиста для download_subtitles.
+
+Файлы субтитров маленькие, и при скачивании по одному видео почти всё время
+уходит на ожидание ответа сервера. Здесь ссылки на дорожки субтитров берутся
+из информации о видео (playlist_info_cache.resolve_entries, с кэшем) — языки
+и формат выбираются так же, как это делает yt-dlp, — и все дорожки всех видео
+скачиваются пулом потоков.
+
+Частота запросов ограничивается «ведром токенов» (TokenBucket): не больше
+rate запросов в секунду в среднем и не больше burst подряд. На ответ 429
+(слишком много запросов) всё ведро ставится на паузу — на время из заголовка
+Retry-After или на растущую паузу, — и дорожка запрашивается снова. Если
+ссылка истекла (403, 404, 410), видео один раз перезапрашивается по его странице.
+Итог — по каждому видео и каждому языку.
+"""
+import os
+import time
+import threading
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+import yt_dlp
+from yt_dlp.utils import subtitles_filename
+from yt_dlp.utils.networking import std_headers
+
+from download_manifest import DEFAULT_BACKOFF, DEFAULT_RETRIES
+from playlist_info_cache import resolve_entries
+
+DEFAULT_WORKERS = 8
+# Запросов в секунду в среднем и подряд без паузы
+DEFAULT_RATE = 5.0
+DEFAULT_BURST = 10
+REQUEST_TIMEOUT = 30
+# Ответы, после которых повтор имеет смысл
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+# Ответы, означающие, что ссылка на дорожку истекла
+EXPIRED_STATUSES = (403, 404, 410)
+
+class TokenBucket:
+    """
+    Ограничитель частоты запросов для нескольких потоков: в ведре до burst
+    токенов, они пополняются со скоростью rate в секунду, запрос забирает один.
+
+    :param rate: Запросов в секунду в среднем
+    :param burst: Запросов подряд без ожидания
+    """
+
+    def __init__(self, rate=DEFAULT_RATE, burst=DEFAULT_BURST):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+        self.paused_until = 0.0
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        """
+        Ждёт, пока в ведре появится токен (и закончится пауза), и забирает его.
+        """
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if now >= self.paused_until and self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = max(self.paused_until - now, (1 - self.tokens) / self.rate)
+            time.sleep(wait)
+
+    def pause(self, seconds):
+        """
+        Останавливает выдачу токенов всем потокам на seconds секунд (после ответа 429).
+        """
+        with self.lock:
+            self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+            self.tokens = 0.0
+
+def retry_after(error, default):
+    """
+    Возвращает паузу из заголовка Retry-After ответа (в секундах), иначе default.
+    """
+    value = error.headers.get('Retry-After') if error.headers else None
+    try:
+        return max(float(value), 0.0)
+    except (TypeError, ValueError):
+        return default
+
+def subtitle_options(output_dir, languages):
+    """
+    Возвращает опции yt-dlp для выбора субтитров и имён файлов, как при обычном скачивании.
+    """
+    return {
+        'quiet': True,
+        'skip_download': True,
+        'writesubtitles': True,
+        'writeautomaticsub': True,
+        'subtitleslangs': languages,
+        'subtitlesformat': 'vtt',
+        'outtmpl': os.path.join(output_dir, '%(playlist_index)03d.%(title)s.%(ext)s'),
+    }
+
+def resolve_tracks(ydl, index, entry):
+    """
+    Выбирает дорожки субтитров видео по опциям ydl (языки, формат) и имена их файлов.
+
+    :return: Словарь {язык: (информация о дорожке, путь к файлу)}
+    """
+    info = dict(entry, playlist_index=index)
+    requested = ydl.process_subtitles(
+        info.get('id'), info.get('subtitles'), info.get('automatic_captions')
+    ) or {}
+    filename = ydl.prepare_filename(info, 'subtitle')
+    return {
+        language: (track, subtitles_filename(filename, language, track['ext'], info.get('ext')))
+        for language, track in requested.items()
+    }
+
+def download_track(track, path, headers):
+    """
+    Скачивает одну дорожку в path (через временный файл).
+
+    :return: Размер файла в байтах
+    """
+    temp_path = path + '.part'
+    if track.get('data') is not None:
+        with open(temp_path, 'w', encoding='utf-8', newline='') as subtitle_file:
+            subtitle_file.write(track['data'])
+    else:
+        request = urllib.request.Request(track['url'], headers=headers)
+        with urllib.request.urlopen(request, timeout=REQUEST_TIMEOUT) as response:
+            content = response.read()
+        with open(temp_path, 'wb') as subtitle_file:
+            subtitle_file.write(content)
+    os.replace(temp_path, path)
+    return os.path.getsize(path)
+
+def fetch_playlist_subtitles(entries, output_dir, languages, manifest=None, workers=DEFAULT_WORKERS,
+                             rate=DEFAULT_RATE, burst=DEFAULT_BURST, retries=DEFAULT_RETRIES,
+                             backoff=DEFAULT_BACKOFF):
+    """
+    Скачивает субтитры видео плейлиста пулом из workers потоков с ограничением частоты запросов.
+    Файлы называются как при скачивании через yt-dlp: NNN.название.язык.vtt.
+
+    Видео считается скачанным, если скачаны все найденные для него дорожки нужных
+    языков; если ни одной дорожки нет, видео отмечается неудачным без повторов.
+    Дорожки, файлы которых уже есть, не скачиваются заново.
+    Если передан manifest (DownloadManifest), состояние, объём и запрошенные языки
+    каждого видео записываются в него.
+
+    :param entries: Список пар (номер в плейлисте, информация yt-dlp о видео) из playlist_entries
+    :param languages: Список языковых кодов (как subtitleslangs у yt-dlp)
+    :param rate: Запросов в секунду в среднем
+    :param burst: Запросов подряд без ожидания
+    :param retries: Повторов одной дорожки после ответа 429, ошибки сервера или сети
+    :param backoff: Первая пауза перед повтором, секунды; дальше она удваивается
+    :return: Словарь {номер: {язык: (путь к файлу или None, текст ошибки или None)}}
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    ydl_opts = subtitle_options(output_dir, languages)
+    bucket = TokenBucket(rate, burst)
+    lock = threading.Lock()
+    local = threading.local()
+    stats = {'tracks': 0, 'present': 0, 'bytes': 0, 'requests': 0, 'throttled': 0, 'retries': 0, 'refreshed': 0}
+    results = {}
+    refreshed = {}
+    refresh_locks = {}
+
+    def downloader():
+        # Один объект yt-dlp на поток: он нужен только для выбора дорожек и имён файлов
+        if not hasattr(local, 'ydl'):
+            local.ydl = yt_dlp.YoutubeDL(ydl_opts)
+        return local.ydl
+
+    def refresh(index, entry):
+        """
+        Перезапрашивает видео по его странице (один раз на видео) и возвращает свежие дорожки.
+        """
+        with lock:
+            entry_lock = refresh_locks.setdefault(index, threading.Lock())
+        with entry_lock:
+            if index not in refreshed:
+                bucket.acquire()
+                fresh_info = downloader().extract_info(entry['webpage_url'], download=False, process=False)
+                refreshed[index] = resolve_tracks(downloader(), index, fresh_info)
+                with lock:
+                    stats['refreshed'] += 1
+            return refreshed[index]
+
+    def fetch_one(index, entry, language, track, path):
+        """
+        Скачивает одну дорожку с повторами; возвращает (путь или None, текст ошибки или None).
+        """
+        headers = dict(std_headers, **(track.get('http_headers') or entry.get('http_headers') or {}))
+        attempt = 0
+        renewed = False
+        while True:
+            bucket.acquire()
+            with lock:
+                stats['requests'] += 1
+            try:
+                size = download_track(track, path, headers)
+            except urllib.error.HTTPError as e:
+                if e.code in EXPIRED_STATUSES and entry.get('webpage_url') and not renewed:
+                    # Ссылка из кэша истекла — берём свежую со страницы видео
+                    try:
+                        fresh = refresh(index, entry)
+                    except Exception as refresh_error:
+                        return None, f"ссылка истекла, перезапрос не удался: {refresh_error}"
+                    if language not in fresh:
+                        return None, f"HTTP {e.code}, после перезапроса дорожки нет"
+                    # Имя файла остаётся прежним — меняется только ссылка
+                    track, renewed = fresh[language][0], True
+                    continue
+                if e.code not in RETRY_STATUSES or attempt >= retries:
+                    return None, f"HTTP {e.code}"
+                delay = backoff * 2 ** attempt
+                if e.code == 429:
+                    # Сервер просит сбавить темп — пауза для всех потоков, а не только для этого
+                    delay = retry_after(e, delay)
+                    bucket.pause(delay)
+                    with lock:
+                        stats['throttled'] += 1
+            except (urllib.error.URLError, TimeoutError, ConnectionError) as e:
+                if attempt >= retries:
+                    return None, str(getattr(e, 'reason', e))
+                delay = backoff * 2 ** attempt
+            except Exception as e:
+                return None, str(e)
+            else:
+                with lock:
+                    stats['tracks'] += 1
+                    stats['bytes'] += size
+                if manifest is not None:
+                    manifest.progress_hook(index)({'status': 'finished', 'filename': path, 'downloaded_bytes': size})
+                return path, None
+            attempt += 1
+            with lock:
+                stats['retries'] += 1
+            time.sleep(delay)
+
+    def finish_entry(index, outcome, reason=None):
+        """
+        Записывает итог видео в манифест и выводит его: по каждому языку — OK или ошибка.
+        """
+        errors = {language: error for language, (_, error) in outcome.items() if error}
+        if manifest is not None:
+            if not outcome:
+                manifest.fail(index, reason)
+            elif errors:
+                manifest.fail(index, "; ".join(f"{language}: {error}" for language, error in errors.items()))
+            else:
+                # Одно имя файла на видео — дорожка первого по алфавиту языка; запрошенные языки
+                # запоминаются, чтобы запуск с новым языком не считал видео уже скачанным
+                manifest.finish(index, outcome[min(outcome)][0], languages)
+        with lock:
+            results[index] = outcome
+            done = len(results)
+        details = ", ".join(
+            f"{language} {'ошибка: ' + error if error else 'OK'}" for language, (_, error) in sorted(outcome.items())
+        ) or reason
+        print(f"[{done}/{len(entries)}] {index:03d}: {details}")
+
+    # Полная информация (списки субтитров) запрашивается только для переданных видео, с тем же
+    # ограничением частоты; дорожки выбираются по ней без сети, затем каждая дорожка — отдельная задача пула
+    resolved, unresolved = resolve_entries(entries, workers=workers, acquire=bucket.acquire)
+    resolved = dict(resolved)
+    tasks = []
+    pending = {}
+    for index, entry in entries:
+        if manifest is not None:
+            manifest.start(index, entry)
+        if index in unresolved:
+            finish_entry(index, {}, unresolved[index])
+            continue
+        entry = resolved[index]
+        try:
+            tracks = resolve_tracks(downloader(), index, entry)
+        except Exception as e:
+            finish_entry(index, {}, str(e))
+            continue
+        if not tracks:
+            finish_entry(index, {}, "нет субтитров на выбранных языках")
+            continue
+        # Дорожки, скачанные прошлыми запусками (.vtt или уже сконвертированный .srt),
+        # не запрашиваются снова — как и у yt-dlp
+        present = {
+            language: (path, None) for language, (_, path) in tracks.items()
+            if os.path.exists(path) or os.path.exists(os.path.splitext(path)[0] + '.srt')
+        }
+        stats['present'] += len(present)
+        if len(present) == len(tracks):
+            finish_entry(index, present)
+            continue
+        pending[index] = present
+        tasks += [
+            (index, entry, language, track, path)
+            for language, (track, path) in tracks.items() if language not in present
+        ]
+    expected = {index: len(present) for index, present in pending.items()}
+    for index, _, language, _, _ in tasks:
+        expected[index] += 1
+
+    def fetch_task(index, entry, language, track, path):
+        outcome = fetch_one(index, entry, language, track, path)
+        with lock:
+            pending[index][language] = outcome
+            complete = len(pending[index]) == expected[index]
+        if complete:
+            finish_entry(index, pending.pop(index))
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        list(executor.map(lambda task: fetch_task(*task), tasks))
+    elapsed = time.perf_counter() - started
+
+    print(
+        f"Скачано дорожек субтитров: {stats['tracks']} из {len(tasks)} (уже были: {stats['present']}), "
+        f"{stats['bytes'] / 1024:.1f} КБ "
+        f"за {elapsed:.1f} с ({stats['tracks'] / elapsed if elapsed > 0 else 0.0:.1f} дорожек/с); "
+        f"запросов {stats['requests']}, ответов 429: {stats['throttled']}, повторов: {stats['retries']}, "
+        f"перезапрошено видео: {stats['refreshed']}"
+    )
+    by_language = {}
+    for outcome in results.values():
+        for language, (path, _) in outcome.items():
+            counts = by_language.setdefault(language, [0, 0])
+            counts[path is None] += 1
+    for language, (downloaded, failed) in sorted(by_language.items()):
+        print(f"  {language}: скачано {downloaded}, ошибок {failed}")
+    return results
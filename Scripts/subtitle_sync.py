@@ -0,0 +1,261 @@
+"""
+Инкрементальная синхронизация субтитров плейлиста для download_subtitles.
+
+Состояние хранится в subtitles/.sync_state.json: для каждого видео (по его ID) —
+номер в плейлисте, название и для каждого языка отпечаток (SHA-256) скачанного
+.vtt и имя полученного .srt. Повторный запуск получает только список видео
+плейлиста (быстрый плоский разбор, без разбора каждого видео) и сравнивает его
+с состоянием:
+
+- новые видео и новые языки скачиваются и обрабатываются;
+- языки, на которых у видео субтитров не было, перепроверяются раз в сутки
+  (время проверки хранится для каждого языка);
+- если видео сдвинулось в плейлисте, его файлы переименовываются, без скачивания;
+- с recheck_days уже скачанные субтитры старше этого срока скачиваются заново,
+  но обрабатываются, только если отпечаток изменился;
+- видео, пропавшие из плейлиста, перечисляются, их файлы не трогаются.
+"""
+import os
+import json
+import time
+import hashlib
+
+import yt_dlp
+
+from vtt_to_srt import convert_files
+
+STATE_NAME = ".sync_state.json"
+# Как часто перепроверять языки, на которых у видео субтитров не было
+MISSING_RECHECK_SECONDS = 24 * 3600
+# Временное окончание имени файла на время перенумерации
+RENUMBER_SUFFIX = ".renumbering"
+
+def load_state(state_path):
+    """
+    Загружает состояние синхронизации; если файла нет или он повреждён — пустое состояние.
+    """
+    try:
+        with open(state_path, "r", encoding="utf-8") as state_file:
+            state = json.load(state_file)
+        if isinstance(state.get("entries"), dict):
+            return state
+    except (OSError, json.JSONDecodeError):
+        pass
+    return {"entries": {}}
+
+def save_state(state_path, state):
+    temp_path = state_path + ".tmp"
+    with open(temp_path, "w", encoding="utf-8") as state_file:
+        json.dump(state, state_file, ensure_ascii=False, indent=1)
+    os.replace(temp_path, state_path)
+
+def fingerprint(path):
+    """
+    Возвращает отпечаток содержимого файла (SHA-256).
+    """
+    digest = hashlib.sha256()
+    with open(path, "rb") as source:
+        for chunk in iter(lambda: source.read(1024 * 1024), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def list_playlist(playlist_url):
+    """
+    Быстро получает список видео плейлиста без разбора каждого видео.
+
+    :return: Список кортежей (номер в плейлисте, ID видео, ссылка)
+    """
+    ydl_opts = {'quiet': True, 'extract_flat': 'in_playlist', 'ignoreerrors': True}
+    with yt_dlp.YoutubeDL(ydl_opts) as ydl:
+        info = ydl.extract_info(playlist_url, download=False)
+    entries = []
+    for position, entry in enumerate((info or {}).get('entries') or [], start=1):
+        if entry and entry.get('id'):
+            url = entry.get('url') or entry.get('webpage_url') or entry['id']
+            entries.append((position, entry['id'], url))
+    return entries
+
+def free_srt_name(output_dir, txt_dir, srt_name, language):
+    """
+    Возвращает имя .srt, которое не занято ни в output_dir, ни (как .txt) в txt_dir:
+    srt_name или, если оно занято, имя с " (2)", " (3)" и т.д. перед кодом языка.
+    """
+    if srt_name.endswith(f".{language}.srt"):
+        stem, suffix = srt_name[:-len(f".{language}.srt")], f".{language}.srt"
+    else:
+        stem, suffix = os.path.splitext(srt_name)
+    candidate, copy = srt_name, 1
+    while (os.path.exists(os.path.join(output_dir, candidate))
+           or os.path.exists(os.path.join(txt_dir, os.path.splitext(candidate)[0] + ".txt"))):
+        copy += 1
+        candidate = f"{stem} ({copy}){suffix}"
+    return candidate
+
+def renumber_files(renumbered, output_dir, txt_dir):
+    """
+    Переименовывает файлы видео под новые номера в плейлисте (префикс NNN).
+    Сначала все переименовываемые файлы получают временные имена, поэтому видео
+    с одинаковыми названиями могут меняться номерами. Файл, который уже лежит под
+    нужным именем (например, от видео, пропавшего из плейлиста), не перезаписывается:
+    к новому имени добавляется " (2)", " (3)" и т.д.
+
+    :param renumbered: Список пар (запись видео из состояния, новый номер)
+    """
+    moves = []
+    for record, number in renumbered:
+        prefix = f"{number:03d}"
+        for language, item in record.get("languages", {}).items():
+            srt_name = item.get("srt")
+            if not srt_name or srt_name.startswith(prefix + "."):
+                continue
+            staged = []
+            for folder, old_name in ((output_dir, srt_name), (txt_dir, os.path.splitext(srt_name)[0] + ".txt")):
+                old_path = os.path.join(folder, old_name)
+                if os.path.exists(old_path):
+                    # Старые имена различны, значит и временные тоже
+                    temp_path = old_path + RENUMBER_SUFFIX
+                    os.replace(old_path, temp_path)
+                    staged.append((folder, temp_path, os.path.splitext(old_name)[1]))
+            moves.append((item, language, prefix + srt_name[srt_name.index("."):], staged))
+        record["number"] = number
+
+    for item, language, new_srt_name, staged in moves:
+        new_srt_name = free_srt_name(output_dir, txt_dir, new_srt_name, language)
+        for folder, temp_path, ext in staged:
+            os.replace(temp_path, os.path.join(folder, os.path.splitext(new_srt_name)[0] + ext))
+        item["srt"] = new_srt_name
+
+def fetch_subtitles(number, url, output_dir, languages):
+    """
+    Скачивает .vtt субтитры одного видео в output_dir с именем NNN.название.язык.vtt.
+
+    :return: Кортеж (название видео, словарь {язык: путь к .vtt})
+    """
+    ydl_opts = {
+        'quiet': True,
+        'skip_download': True,
+        'writesubtitles': True,
+        'writeautomaticsub': True,
+        'subtitleslangs': languages,
+        'subtitlesformat': 'vtt',
+        'outtmpl': os.path.join(output_dir, f'{number:03d}.%(title)s.%(ext)s'),
+    }
+    with yt_dlp.YoutubeDL(ydl_opts) as ydl:
+        info = ydl.extract_info(url, download=True)
+    written = {
+        language: subtitle['filepath']
+        for language, subtitle in (info.get('requested_subtitles') or {}).items()
+        if subtitle.get('filepath') and os.path.exists(subtitle['filepath'])
+    }
+    return info.get('title'), written
+
+def plan_sync(entries, state, languages, recheck_days, now):
+    """
+    Сравнивает список видео плейлиста с состоянием.
+
+    :return: Кортеж (список (номер, ID, ссылка, причина) для скачивания,
+             список (номер, ID) для переименования, множество ID, пропавших из плейлиста)
+    """
+    to_fetch, to_renumber = [], []
+    recheck_seconds = recheck_days * 24 * 3600 if recheck_days is not None else None
+    for number, video_id, url in entries:
+        record = state["entries"].get(video_id)
+        if record is None:
+            to_fetch.append((number, video_id, url, "новое"))
+            continue
+        if record.get("number") != number:
+            to_renumber.append((number, video_id))
+        age = now - record.get("checked", 0)
+        missing = [language for language in languages if language not in record.get("languages", {})]
+        # В состояниях прежних версий время проверки общее: у видео без субтитров — "checked"
+        missing_checked = record.get("missing") or (
+            {} if record.get("languages") else dict.fromkeys(missing, record.get("checked", 0))
+        )
+        if any(now - missing_checked.get(language, 0) >= MISSING_RECHECK_SECONDS for language in missing):
+            to_fetch.append((number, video_id, url, "нет субтитров" if not record.get("languages") else "новый язык"))
+        elif recheck_seconds is not None and age >= recheck_seconds:
+            to_fetch.append((number, video_id, url, "перепроверка"))
+    removed = set(state["entries"]) - {video_id for _, video_id, _ in entries}
+    return to_fetch, to_renumber, removed
+
+def sync_subtitles(playlist_url, output_dir='subtitles', languages=['en'], recheck_days=None, workers=None):
+    """
+    Синхронизирует субтитры плейлиста с папкой: скачивает и обрабатывает (.srt и .txt)
+    только новые или изменившиеся субтитры.
+
+    :param recheck_days: Через сколько дней заново проверять уже скачанные субтитры (None — не проверять)
+    :param workers: Количество процессов конвертации
+    :return: Список номеров видео (строки 'NNN'), для которых субтитров нет или их не удалось скачать
+    """
+    started = time.perf_counter()
+    os.makedirs(output_dir, exist_ok=True)
+    txt_dir = os.path.join(output_dir, 'TXT')
+    state_path = os.path.join(output_dir, STATE_NAME)
+    state = load_state(state_path)
+    now = time.time()
+
+    entries = list_playlist(playlist_url)
+    to_fetch, to_renumber, removed = plan_sync(entries, state, languages, recheck_days, now)
+    print(
+        f"Видео в плейлисте: {len(entries)}, известно по прошлым запускам: {len(state['entries'])}; "
+        f"скачать: {len(to_fetch)}, перенумеровать: {len(to_renumber)}, пропало из плейлиста: {len(removed)}"
+    )
+
+    renumber_files([(state["entries"][video_id], number) for number, video_id in to_renumber], output_dir, txt_dir)
+
+    changed_vtt = []
+    pending_records = {}
+    failed_numbers = []
+    unchanged = 0
+    for number, video_id, url, reason in to_fetch:
+        record = state["entries"].setdefault(video_id, {"languages": {}})
+        record["number"] = number
+        try:
+            title, written = fetch_subtitles(number, url, output_dir, languages)
+        except Exception as e:
+            print(f"Ошибка при загрузке субтитров {number:03d} ({reason}): {e}")
+            failed_numbers.append(f"{number:03d}")
+            continue
+        record["title"] = title
+        record["checked"] = now
+        missing_checked = record.setdefault("missing", {})
+        for language in languages:
+            if language in written:
+                missing_checked.pop(language, None)
+            else:
+                missing_checked[language] = now
+        if not written:
+            failed_numbers.append(f"{number:03d}")
+            continue
+        for language, vtt_path in written.items():
+            digest = fingerprint(vtt_path)
+            known = record["languages"].get(language)
+            srt_name = os.path.splitext(os.path.basename(vtt_path))[0] + ".srt"
+            if known and known.get("fingerprint") == digest and os.path.exists(os.path.join(output_dir, srt_name)):
+                # Субтитры не изменились — прежние .srt и .txt остаются
+                os.remove(vtt_path)
+                unchanged += 1
+                continue
+            changed_vtt.append(vtt_path)
+            pending_records[vtt_path] = (record, language, digest, srt_name)
+
+    converted, errors = convert_files(changed_vtt, workers, txt_dir)
+    for vtt_path in converted:
+        record, language, digest, srt_name = pending_records[vtt_path]
+        record["languages"][language] = {"fingerprint": digest, "srt": srt_name}
+        os.remove(vtt_path)
+    for vtt_path, error in errors.items():
+        print(f"Ошибка конвертации {vtt_path}: {error}")
+        failed_numbers.append(os.path.basename(vtt_path)[:3])
+
+    state["playlist"] = playlist_url
+    state["synced"] = now
+    save_state(state_path, state)
+
+    print(
+        f"Обработано новых или изменённых субтитров: {len(converted)}, без изменений: {unchanged}, "
+        f"перенумеровано видео: {len(to_renumber)}, за {time.perf_counter() - started:.1f} с"
+    )
+    if removed:
+        print(f"Пропали из плейлиста (файлы оставлены): {', '.join(sorted(removed))}")
+    return sorted(set(failed_numbers))
@@ -0,0 +1,171 @@
+"""
+Источник аудио для распознавания: поток PCM 16 кГц, моно, 16 бит (s16le).
+
+Видео и сжатое аудио декодируются процессом ffmpeg прямо в канал (pipe) без
+временных файлов. WAV-файлы, уже записанные в нужном формате, читаются
+через mmap и вообще не декодируются. В обоих случаях данные отдаются блоками
+фиксированного размера, поэтому потребление памяти не зависит от длины записи.
+"""
+import os
+import mmap
+import struct
+import subprocess
+
+SAMPLE_RATE = 16000
+SAMPLE_WIDTH = 2
+BYTES_PER_SECOND = SAMPLE_RATE * SAMPLE_WIDTH
+
+# 4000 фреймов — тот же размер блока, что подавался в распознаватель раньше
+CHUNK_FRAMES = 4000
+CHUNK_BYTES = CHUNK_FRAMES * SAMPLE_WIDTH
+
+VIDEO_EXTENSIONS = (".mp4", ".avi", ".mov", ".mkv", ".webm", ".flv")
+AUDIO_EXTENSIONS = (".m4a", ".mp3", ".opus", ".aac", ".wav", ".flac", ".ogg")
+MEDIA_EXTENSIONS = VIDEO_EXTENSIONS + AUDIO_EXTENSIONS
+
+def ffmpeg_available():
+    """
+    Проверяет, установлен ли ffmpeg и доступен ли он в PATH.
+    """
+    try:
+        subprocess.run(
+            ["ffmpeg", "-version"],
+            check=True,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL
+        )
+    except (FileNotFoundError, subprocess.CalledProcessError):
+        return False
+    return True
+
+def find_wav_pcm_data(path):
+    """
+    Ищет в WAV-файле блок данных, если файл уже в формате распознавателя
+    (PCM 16 кГц, моно, 16 бит).
+
+    :param path: Путь к файлу
+    :return: Кортеж (смещение, размер) блока данных или None, если файл нужно декодировать
+    """
+    file_size = os.path.getsize(path)
+    with open(path, "rb") as wav_file:
+        header = wav_file.read(12)
+        if len(header) < 12 or header[:4] != b"RIFF" or header[8:12] != b"WAVE":
+            return None
+
+        pcm_format_ok = False
+        while True:
+            chunk_header = wav_file.read(8)
+            if len(chunk_header) < 8:
+                return None
+            chunk_id, chunk_size = struct.unpack("<4sI", chunk_header)
+
+            if chunk_id == b"fmt ":
+                fmt = wav_file.read(chunk_size)
+                if len(fmt) < 16:
+                    return None
+                audio_format, channels, sample_rate, _, _, bits = struct.unpack("<HHIIHH", fmt[:16])
+                pcm_format_ok = (
+                    audio_format == 1 and channels == 1
+                    and sample_rate == SAMPLE_RATE and bits == SAMPLE_WIDTH * 8
+                )
+                if chunk_size % 2:
+                    wav_file.seek(1, os.SEEK_CUR)
+            elif chunk_id == b"data":
+                if not pcm_format_ok:
+                    return None
+                offset = wav_file.tell()
+                # ffmpeg при записи в поток оставляет размер пустым или максимальным
+                if chunk_size == 0 or offset + chunk_size > file_size:
+                    chunk_size = file_size - offset
+                return offset, chunk_size - chunk_size % SAMPLE_WIDTH
+            else:
+                wav_file.seek(chunk_size + chunk_size % 2, os.SEEK_CUR)
+
+def probe_duration(path):
+    """
+    Возвращает длительность медиафайла в секундах или None, если её не удалось определить.
+    """
+    wav_data = find_wav_pcm_data(path) if path.lower().endswith(".wav") else None
+    if wav_data is not None:
+        return wav_data[1] / BYTES_PER_SECOND
+
+    command = [
+        "ffprobe", "-v", "error",
+        "-show_entries", "format=duration",
+        "-of", "default=noprint_wrappers=1:nokey=1",
+        path,
+    ]
+    try:
+        output = subprocess.run(command, check=True, capture_output=True, text=True).stdout.strip()
+        return float(output)
+    except (FileNotFoundError, subprocess.CalledProcessError, ValueError):
+        return None
+
+def seconds_to_bytes(seconds):
+    """
+    Переводит время в секундах в смещение в потоке PCM (с выравниванием по сэмплу).
+    """
+    return int(seconds * SAMPLE_RATE) * SAMPLE_WIDTH
+
+def iter_wav_chunks(path, data_offset, data_size, chunk_bytes=CHUNK_BYTES, start=0.0, duration=None):
+    """
+    Отдаёт блоки PCM из WAV-файла через mmap, не загружая файл в память целиком.
+    """
+    skip = min(seconds_to_bytes(start), data_size)
+    data_offset += skip
+    data_size -= skip
+    if duration is not None:
+        data_size = min(data_size, seconds_to_bytes(duration))
+    if data_size <= 0:
+        return
+
+    with open(path, "rb") as wav_file:
+        with mmap.mmap(wav_file.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            end = data_offset + data_size
+            for position in range(data_offset, end, chunk_bytes):
+                yield mapped[position:min(position + chunk_bytes, end)]
+
+def iter_ffmpeg_chunks(path, chunk_bytes=CHUNK_BYTES, start=0.0, duration=None):
+    """
+    Декодирует файл процессом ffmpeg в PCM 16 кГц моно и отдаёт блоки по мере готовности.
+    """
+    command = ["ffmpeg", "-nostdin", "-loglevel", "error"]
+    if start > 0:
+        command += ["-ss", f"{start:.3f}"]
+    command += ["-i", path]
+    if duration is not None:
+        command += ["-t", f"{duration:.3f}"]
+    command += ["-vn", "-ac", "1", "-ar", str(SAMPLE_RATE), "-f", "s16le", "-"]
+    process = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    try:
+        while True:
+            data = process.stdout.read(chunk_bytes)
+            if not data:
+                break
+            yield data
+
+        error_output = process.stderr.read().decode("utf-8", errors="replace").strip()
+        if process.wait() != 0:
+            raise RuntimeError(f"ffmpeg не смог декодировать {path}: {error_output}")
+    finally:
+        # Генератор могли закрыть досрочно — не оставляем висящий процесс
+        if process.poll() is None:
+            process.kill()
+            process.wait()
+        process.stdout.close()
+        process.stderr.close()
+
+def iter_pcm_chunks(path, chunk_bytes=CHUNK_BYTES, start=0.0, duration=None):
+    """
+    Отдаёт аудио из видео- или аудиофайла блоками PCM 16 кГц моно s16le.
+    WAV в нужном формате читается напрямую, всё остальное декодируется через ffmpeg.
+
+    :param path: Путь к медиафайлу
+    :param chunk_bytes: Размер блока в байтах (чётный)
+    :param start: С какой секунды начинать
+    :param duration: Сколько секунд отдать (None — до конца файла)
+    """
+    wav_data = find_wav_pcm_data(path) if path.lower().endswith(".wav") else None
+    if wav_data is not None:
+        return iter_wav_chunks(path, *wav_data, chunk_bytes=chunk_bytes, start=start, duration=duration)
+    return iter_ffmpeg_chunks(path, chunk_bytes=chunk_bytes, start=start, duration=duration)
@@ -0,0 +1,314 @@
+"""
+Бенчмарк скорости распознавания transcribe_folder.
+
+Генерирует синтетические записи нескольких длительностей (тон с паузами, как у речи),
+прогоняет их через конвейер transcribe_folder с разным количеством процессов и
+сохраняет результаты в JSON: коэффициент реального времени (RTF), время стадий,
+пиковый RSS и файлов в час. Без --model вместо Vosk используется заглушка
+распознавателя, поэтому бенчмарк работает без модели и без сети.
+
+Примеры:
+    python benchmark_transcribe.py --output results.json
+    python benchmark_transcribe.py --lengths 60,600 --workers 1,2,4 --output new.json
+    python benchmark_transcribe.py --compare results.json new.json
+"""
+import os
+import sys
+import json
+import time
+import wave
+import argparse
+import platform
+import tempfile
+import subprocess
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+import transcribe_folder
+from audio_source import SAMPLE_RATE
+
+# Частота и число каналов исходника: ffmpeg должен и декодировать, и пересэмплировать
+SOURCE_SAMPLE_RATE = 44100
+SOURCE_CHANNELS = 2
+
+# Метрики, для которых рост означает ухудшение, и наоборот
+LOWER_IS_BETTER = ("rtf", "wall_seconds", "peak_rss_mb")
+HIGHER_IS_BETTER = ("files_per_hour",)
+
+class StubModel:
+    """
+    Заглушка модели Vosk: ничего не загружает.
+    """
+
+    def __init__(self, model_path):
+        self.model_path = model_path
+
+class StubRecognizer:
+    """
+    Заглушка KaldiRecognizer. Тратит процессорное время пропорционально объёму аудио
+    (несколько БПФ на блок) и завершает фразу на каждой паузе, как настоящий распознаватель.
+    """
+
+    # Сколько БПФ делать на каждые 4000 сэмплов — задаёт «стоимость» распознавания
+    FFT_ROUNDS = 20
+
+    def __init__(self, model, sample_rate, grammar=None):
+        self.Reset()
+
+    def SetWords(self, enable_words):
+        pass
+
+    def Reset(self):
+        self.position = 0
+        self.words = []
+        self.speech_start = None
+
+    def AcceptWaveform(self, data):
+        samples = np.frombuffer(data, dtype=np.int16).astype(np.float32)
+        for _ in range(self.FFT_ROUNDS * max(1, len(samples) // 4000)):
+            np.fft.rfft(samples)
+
+        chunk_start = self.position / SAMPLE_RATE
+        self.position += len(samples)
+        loud = len(samples) > 0 and np.abs(samples).max() > 1000
+        if loud and self.speech_start is None:
+            self.speech_start = chunk_start
+        if not loud and self.speech_start is not None:
+            self._finish_word(chunk_start)
+            return True
+        return False
+
+    def _finish_word(self, end):
+        self.words.append({"word": "слово", "start": self.speech_start, "end": end, "conf": 1.0})
+        self.speech_start = None
+
+    def Result(self):
+        words, self.words = self.words, []
+        return json.dumps({"text": " ".join(w["word"] for w in words), "result": words}, ensure_ascii=False)
+
+    def FinalResult(self):
+        if self.speech_start is not None:
+            self._finish_word(self.position / SAMPLE_RATE)
+        return self.Result()
+
+def init_benchmark_worker(model_path, use_stub):
+    """
+    Инициализирует процесс пула; с use_stub подменяет Vosk заглушкой.
+    """
+    if use_stub:
+        transcribe_folder.Model = StubModel
+        transcribe_folder.KaldiRecognizer = StubRecognizer
+    transcribe_folder.init_worker(model_path)
+
+def benchmark_job(media_path, output_dir):
+    """
+    Распознаёт один файл в процессе пула и возвращает время стадий и статистику процесса.
+    """
+    stage_times = {}
+    text_file_path = transcribe_folder.transcription_path(media_path, output_dir)
+    transcribe_folder.transcribe_audio_vosk(
+        media_path, transcribe_folder._worker_recognizer, text_file_path, stage_times=stage_times
+    )
+    return stage_times, transcribe_folder.update_worker_stats()
+
+def generate_speech_like_pcm(seconds, seed):
+    """
+    Генерирует стерео-сигнал 44.1 кГц: отрезки тона с шумом по 1–5 с, разделённые паузами по 0.3–3 с.
+    """
+    rng = np.random.default_rng(seed)
+    total = int(seconds * SOURCE_SAMPLE_RATE)
+    signal = np.zeros(total, dtype=np.float32)
+    position = 0
+    while position < total:
+        length = int(rng.uniform(1.0, 5.0) * SOURCE_SAMPLE_RATE)
+        end = min(total, position + length)
+        t = np.arange(end - position) / SOURCE_SAMPLE_RATE
+        tone = np.sin(2 * np.pi * rng.uniform(120, 300) * t) * 0.3 + rng.normal(0, 0.05, end - position)
+        signal[position:end] = tone
+        position = end + int(rng.uniform(0.3, 3.0) * SOURCE_SAMPLE_RATE)
+    pcm = (np.clip(signal, -1, 1) * 32767).astype(np.int16)
+    return np.repeat(pcm[:, None], SOURCE_CHANNELS, axis=1).tobytes()
+
+def generate_corpus(corpus_dir, lengths, files_per_length, audio_format):
+    """
+    Создаёт синтетические записи для бенчмарка и возвращает пути к ним.
+    Файлы с тем же именем повторно не создаются.
+    """
+    os.makedirs(corpus_dir, exist_ok=True)
+    paths = []
+    for length in lengths:
+        for index in range(files_per_length):
+            name = f"synthetic_{length:g}s_{index}"
+            path = os.path.join(corpus_dir, f"{name}.{audio_format}")
+            paths.append(path)
+            if os.path.exists(path):
+                continue
+
+            wav_path = os.path.join(corpus_dir, f"{name}.source.wav")
+            with wave.open(wav_path, "wb") as wav_file:
+                wav_file.setnchannels(SOURCE_CHANNELS)
+                wav_file.setsampwidth(2)
+                wav_file.setframerate(SOURCE_SAMPLE_RATE)
+                wav_file.writeframes(generate_speech_like_pcm(length, seed=index + int(length * 1000)))
+
+            if audio_format == "wav":
+                # Уже в формате распознавателя: проверяется путь чтения без декодирования
+                command = ["ffmpeg", "-loglevel", "error", "-y", "-i", wav_path, "-ac", "1", "-ar", str(SAMPLE_RATE), path]
+            else:
+                command = ["ffmpeg", "-loglevel", "error", "-y", "-i", wav_path, path]
+            subprocess.run(command, check=True)
+            os.remove(wav_path)
+    return paths
+
+def time_command(command):
+    """
+    Запускает команду и возвращает время её выполнения в секундах.
+    """
+    start = time.perf_counter()
+    subprocess.run(command, check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    return time.perf_counter() - start
+
+def measure_decode_stages(paths):
+    """
+    Отдельно измеряет декодирование и пересэмплирование ffmpeg для всего корпуса:
+    декодирование без преобразования и декодирование с приведением к 16 кГц моно.
+    """
+    decode = 0.0
+    decode_and_resample = 0.0
+    for path in paths:
+        decode += time_command(["ffmpeg", "-nostdin", "-i", path, "-vn", "-f", "null", "-"])
+        decode_and_resample += time_command(
+            ["ffmpeg", "-nostdin", "-i", path, "-vn", "-ac", "1", "-ar", str(SAMPLE_RATE), "-f", "null", "-"]
+        )
+    return {"decode": decode, "resample": max(0.0, decode_and_resample - decode)}
+
+def run_benchmark(paths, audio_seconds, workers, model_path, use_stub, output_dir):
+    """
+    Прогоняет корпус через пул из workers процессов и возвращает метрики прогона.
+    """
+    stage_times = {}
+    worker_stats = {}
+    start = time.perf_counter()
+    with ProcessPoolExecutor(
+        max_workers=workers, initializer=init_benchmark_worker, initargs=(model_path, use_stub)
+    ) as executor:
+        futures = [executor.submit(benchmark_job, path, output_dir) for path in paths]
+        for future in futures:
+            job_stages, stats = future.result()
+            for stage, seconds in job_stages.items():
+                stage_times[stage] = stage_times.get(stage, 0.0) + seconds
+            worker_stats[stats["pid"]] = stats
+    wall_seconds = time.perf_counter() - start
+
+    peak_rss = [stats["peak_rss"] for stats in worker_stats.values() if stats["peak_rss"] is not None]
+    return {
+        "workers": workers,
+        "files": len(paths),
+        "audio_seconds": audio_seconds,
+        "wall_seconds": wall_seconds,
+        "rtf": wall_seconds / audio_seconds,
+        "files_per_hour": len(paths) / wall_seconds * 3600,
+        "peak_rss_mb": max(peak_rss) if peak_rss else None,
+        "model_load_seconds": max(stats["load_time"] for stats in worker_stats.values()),
+        "stage_seconds": stage_times,
+    }
+
+def compare_results(baseline_path, candidate_path, threshold):
+    """
+    Сравнивает два файла результатов и выводит метрики, ухудшившиеся больше чем на threshold.
+
+    :return: Количество найденных регрессий
+    """
+    with open(baseline_path, "r", encoding="utf-8") as baseline_file:
+        baseline = json.load(baseline_file)
+    with open(candidate_path, "r", encoding="utf-8") as candidate_file:
+        candidate = json.load(candidate_file)
+
+    baseline_runs = {run["workers"]: run for run in baseline["runs"]}
+    regressions = 0
+    for run in candidate["runs"]:
+        base_run = baseline_runs.get(run["workers"])
+        if base_run is None:
+            print(f"workers={run['workers']}: нет в базовом файле, пропущено")
+            continue
+        for metric in LOWER_IS_BETTER + HIGHER_IS_BETTER:
+            old, new = base_run.get(metric), run.get(metric)
+            if not old or new is None:
+                continue
+            change = (new - old) / old
+            worse = change > threshold if metric in LOWER_IS_BETTER else change < -threshold
+            status = "РЕГРЕССИЯ" if worse else "ok"
+            regressions += worse
+            print(f"workers={run['workers']:<3} {metric:<16} {old:12.3f} -> {new:12.3f} ({change:+.1%}) {status}")
+
+    print(f"\nРегрессий: {regressions}")
+    return regressions
+
+def parse_args(argv=None):
+    """
+    Разбирает аргументы командной строки.
+    """
+    parser = argparse.ArgumentParser(description="Бенчмарк скорости распознавания transcribe_folder.")
+    parser.add_argument("--lengths", default="30,120,600", help="Длительности записей в секундах через запятую.")
+    parser.add_argument("--files-per-length", type=int, default=2, help="Записей каждой длительности.")
+    parser.add_argument("--workers", default="1,2,4", help="Количества процессов для перебора через запятую.")
+    parser.add_argument("--format", default="m4a", help="Формат записей: m4a, mp3, flac, wav (wav — без декодирования).")
+    parser.add_argument("--model", default=None, help="Путь к модели Vosk; без него используется заглушка.")
+    parser.add_argument("--corpus-dir", default=None, help="Папка для синтетических записей (по умолчанию временная).")
+    parser.add_argument("--output", default=None, help="Файл для результатов в JSON (по умолчанию — вывод на экран).")
+    parser.add_argument(
+        "--compare", nargs=2, metavar=("BASELINE", "CANDIDATE"),
+        help="Сравнить два файла результатов вместо запуска бенчмарка.",
+    )
+    parser.add_argument("--threshold", type=float, default=0.10, help="Допустимое ухудшение при сравнении (0.10 = 10%%).")
+    return parser.parse_args(argv)
+
+def main():
+    args = parse_args()
+
+    if args.compare:
+        sys.exit(1 if compare_results(*args.compare, args.threshold) else 0)
+
+    lengths = [float(value) for value in args.lengths.split(",")]
+    worker_counts = [int(value) for value in args.workers.split(",")]
+    use_stub = args.model is None
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        corpus_dir = args.corpus_dir or os.path.join(temp_dir, "corpus")
+        output_dir = os.path.join(temp_dir, "transcriptions")
+        os.makedirs(output_dir)
+
+        print("Генерация корпуса...")
+        paths = generate_corpus(corpus_dir, lengths, args.files_per_length, args.format)
+        audio_seconds = sum(lengths) * args.files_per_length
+
+        print("Измерение декодирования и пересэмплирования...")
+        decode_stages = measure_decode_stages(paths)
+
+        runs = []
+        for workers in worker_counts:
+            print(f"Прогон с {workers} процесс(ами)...")
+            run = run_benchmark(paths, audio_seconds, workers, args.model or "stub", use_stub, output_dir)
+            print(f"  RTF {run['rtf']:.3f}, файлов в час {run['files_per_hour']:.0f}, пиковый RSS {transcribe_folder.format_mb(run['peak_rss_mb'])}")
+            runs.append(run)
+
+    results = {
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "machine": {"platform": platform.platform(), "python": platform.python_version(), "cpus": os.cpu_count()},
+        "recognizer": "stub" if use_stub else os.path.abspath(args.model),
+        "corpus": {"format": args.format, "lengths": lengths, "files": len(paths), "audio_seconds": audio_seconds},
+        "decode_stage_seconds": decode_stages,
+        "runs": runs,
+    }
+
+    output = json.dumps(results, ensure_ascii=False, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as output_file:
+            output_file.write(output)
+        print(f"Результаты сохранены: {args.output}")
+    else:
+        print(output)
+
+if __name__ == "__main__":
+    main()
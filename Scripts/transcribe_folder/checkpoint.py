@@ -0,0 +1,79 @@
+"""
+Контрольные точки распознавания длинных файлов.
+
+Текст пишется в файл <имя>.txt.part по мере распознавания, а рядом периодически
+сохраняется <имя>.txt.checkpoint.json: до какой секунды исходной записи текст
+уже записан и какой длины был .part в этот момент. Прерванный запуск продолжается
+с последней контрольной точки: .part обрезается до сохранённой длины, а
+декодирование начинается с сохранённой секунды.
+"""
+import os
+import json
+
+def partial_path(text_file_path):
+    """
+    Путь к файлу, в который пишется текст до завершения распознавания.
+    """
+    return text_file_path + ".part"
+
+def checkpoint_path(text_file_path):
+    """
+    Путь к файлу контрольной точки.
+    """
+    return text_file_path + ".checkpoint.json"
+
+def make_fingerprint(media_path, model_path, settings):
+    """
+    Описывает файл и настройки, с которыми был начат прогон. Продолжать можно
+    только прогон с тем же отпечатком.
+    """
+    stat = os.stat(media_path)
+    return {
+        "media": os.path.abspath(media_path),
+        "size": stat.st_size,
+        "mtime_ns": stat.st_mtime_ns,
+        "model": os.path.abspath(model_path) if model_path else None,
+        "settings": settings,
+    }
+
+def load_checkpoint(text_file_path, fingerprint):
+    """
+    Загружает контрольную точку, если она относится к тому же файлу и настройкам.
+
+    :return: Словарь {"offset": секунда исходной записи, "text_bytes": длина .part} или None
+    """
+    try:
+        with open(checkpoint_path(text_file_path), "r", encoding="utf-8") as checkpoint_file:
+            checkpoint = json.load(checkpoint_file)
+        part_size = os.path.getsize(partial_path(text_file_path))
+    except (OSError, json.JSONDecodeError):
+        return None
+
+    # Настройки проходят через JSON, поэтому сравниваем их в том же виде
+    if checkpoint.get("fingerprint") != json.loads(json.dumps(fingerprint)):
+        return None
+    if part_size < checkpoint.get("text_bytes", 0):
+        return None
+    return checkpoint
+
+def save_checkpoint(text_file_path, fingerprint, offset, text_bytes):
+    """
+    Атомарно сохраняет контрольную точку.
+
+    :param offset: До какой секунды исходной записи текст уже записан
+    :param text_bytes: Длина .part-файла, соответствующая этой секунде
+    """
+    path = checkpoint_path(text_file_path)
+    temp_path = path + ".tmp"
+    with open(temp_path, "w", encoding="utf-8") as checkpoint_file:
+        json.dump({"fingerprint": fingerprint, "offset": offset, "text_bytes": text_bytes}, checkpoint_file)
+    os.replace(temp_path, path)
+
+def clear_checkpoint(text_file_path):
+    """
+    Удаляет контрольную точку после успешного завершения.
+    """
+    try:
+        os.remove(checkpoint_path(text_file_path))
+    except FileNotFoundError:
+        pass
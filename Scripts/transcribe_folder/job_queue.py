@@ -0,0 +1,246 @@
+"""
+Общая очередь заданий для нескольких запусков transcribe_folder над одной папкой.
+
+Очередь — база SQLite рядом с результатами (transcriptions/.jobs.sqlite), поэтому
+несколько процессов на одной машине или несколько машин с общей папкой делят
+файлы между собой без отдельного сервера. Запуск берёт файл в аренду на
+lease_seconds секунд и продлевает её, пока работает; если процесс умер, аренда
+истекает и файл забирает другой запуск (не больше max_attempts попыток).
+
+Текст сначала пишется во временную папку, а в transcriptions/ переносится только
+владельцем действующей аренды, внутри транзакции, которая отмечает файл
+готовым, — поэтому каждый текст фиксируется ровно один раз, а запуск, у которого
+аренду забрали, свой результат отбрасывает.
+
+На сетевых дисках SQLite надёжен настолько, насколько надёжны блокировки файлов
+у этой файловой системы (SMB и локальные диски — да, некоторые NFS — нет).
+"""
+import os
+import time
+import sqlite3
+import threading
+
+# Время аренды по умолчанию в секундах; продлевается каждую треть этого срока
+DEFAULT_LEASE_SECONDS = 120.0
+DEFAULT_MAX_ATTEMPTS = 3
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    path TEXT PRIMARY KEY,
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    state TEXT NOT NULL DEFAULT 'pending',
+    owner TEXT,
+    lease_until REAL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    error TEXT,
+    output TEXT,
+    updated REAL
+)
+"""
+
+class JobQueue:
+    """
+    Очередь файлов в базе SQLite. Состояния файла: pending (ждёт), running (в аренде),
+    done (текст зафиксирован), failed (исчерпаны попытки).
+
+    Файлы хранятся по имени относительно папки с записями, поэтому машины могут
+    подключать общую папку по разным путям.
+
+    :param db_path: Путь к базе очереди
+    :param folder: Папка с записями
+    :param lease_seconds: Через сколько секунд без продления аренда считается брошенной
+    :param max_attempts: Сколько раз файл можно брать в работу, прежде чем он считается неудачным
+    """
+
+    def __init__(self, db_path, folder, lease_seconds=DEFAULT_LEASE_SECONDS, max_attempts=DEFAULT_MAX_ATTEMPTS):
+        self.db_path = db_path
+        self.folder = folder
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        # Транзакции открываются явно (BEGIN IMMEDIATE), чтобы запись в базу была под блокировкой
+        self.connection = sqlite3.connect(db_path, timeout=60.0, isolation_level=None)
+        self.connection.execute(SCHEMA)
+
+    def _transaction(self):
+        self.connection.execute("BEGIN IMMEDIATE")
+
+    def add(self, media_names):
+        """
+        Добавляет файлы (имена относительно папки) в очередь. Файлы, уже известные
+        очереди, не дублируются; изменённые с прошлого раза файлы возвращаются в ожидание.
+
+        :return: Количество новых или возвращённых в ожидание файлов
+        """
+        added = 0
+        now = time.time()
+        self._transaction()
+        try:
+            for media_name in media_names:
+                stat = os.stat(os.path.join(self.folder, media_name))
+                row = self.connection.execute(
+                    "SELECT size, mtime_ns FROM jobs WHERE path = ?", (media_name,)
+                ).fetchone()
+                if row is None:
+                    self.connection.execute(
+                        "INSERT INTO jobs (path, size, mtime_ns, updated) VALUES (?, ?, ?, ?)",
+                        (media_name, stat.st_size, stat.st_mtime_ns, now),
+                    )
+                    added += 1
+                elif row != (stat.st_size, stat.st_mtime_ns):
+                    self.connection.execute(
+                        "UPDATE jobs SET size = ?, mtime_ns = ?, state = 'pending', owner = NULL, "
+                        "lease_until = NULL, attempts = 0, error = NULL, updated = ? WHERE path = ?",
+                        (stat.st_size, stat.st_mtime_ns, now, media_name),
+                    )
+                    added += 1
+            self.connection.execute("COMMIT")
+        except BaseException:
+            self.connection.execute("ROLLBACK")
+            raise
+        return added
+
+    def claim(self, owner):
+        """
+        Берёт в аренду следующий файл: ожидающий или с истёкшей арендой, начиная с самых больших.
+
+        :param owner: Идентификатор запуска (машина и PID)
+        :return: Имя файла или None, если брать нечего
+        """
+        now = time.time()
+        self._transaction()
+        try:
+            # Брошенные файлы, у которых кончились попытки, больше не берутся
+            self.connection.execute(
+                "UPDATE jobs SET state = 'failed', owner = NULL, updated = ?, "
+                "error = COALESCE(error, 'аренда истекла') "
+                "WHERE state = 'running' AND lease_until < ? AND attempts >= ?",
+                (now, now, self.max_attempts),
+            )
+            row = self.connection.execute(
+                "SELECT path FROM jobs WHERE (state = 'pending' OR (state = 'running' AND lease_until < ?)) "
+                "AND attempts < ? ORDER BY size DESC LIMIT 1",
+                (now, self.max_attempts),
+            ).fetchone()
+            if row is not None:
+                self.connection.execute(
+                    "UPDATE jobs SET state = 'running', owner = ?, lease_until = ?, "
+                    "attempts = attempts + 1, updated = ? WHERE path = ?",
+                    (owner, now + self.lease_seconds, now, row[0]),
+                )
+            self.connection.execute("COMMIT")
+        except BaseException:
+            self.connection.execute("ROLLBACK")
+            raise
+        return row[0] if row is not None else None
+
+    def heartbeat(self, media_names, owner):
+        """
+        Продлевает аренду файлов, которые всё ещё принадлежат owner.
+
+        :return: Множество файлов, аренду которых продлить не удалось (её забрал другой запуск)
+        """
+        lost = set()
+        until = time.time() + self.lease_seconds
+        self._transaction()
+        try:
+            for media_name in media_names:
+                cursor = self.connection.execute(
+                    "UPDATE jobs SET lease_until = ? WHERE path = ? AND owner = ? AND state = 'running'",
+                    (until, media_name, owner),
+                )
+                if cursor.rowcount == 0:
+                    lost.add(media_name)
+            self.connection.execute("COMMIT")
+        except BaseException:
+            self.connection.execute("ROLLBACK")
+            raise
+        return lost
+
+    def complete(self, media_name, owner, staged_path, output_path):
+        """
+        Фиксирует результат: переносит текст из временной папки в output_path и отмечает
+        файл готовым — одной транзакцией и только если аренда всё ещё у owner.
+
+        :return: True, если результат зафиксирован; False, если аренду забрал другой запуск
+                 (временный файл тогда удаляется)
+        """
+        self._transaction()
+        try:
+            row = self.connection.execute(
+                "SELECT owner, state FROM jobs WHERE path = ?", (media_name,)
+            ).fetchone()
+            owned = row == (owner, "running")
+            if owned:
+                os.replace(staged_path, output_path)
+                self.connection.execute(
+                    "UPDATE jobs SET state = 'done', owner = NULL, lease_until = NULL, error = NULL, "
+                    "output = ?, updated = ? WHERE path = ?",
+                    (os.path.basename(output_path), time.time(), media_name),
+                )
+            self.connection.execute("COMMIT")
+        except BaseException:
+            self.connection.execute("ROLLBACK")
+            raise
+        if not owned:
+            os.remove(staged_path)
+        return owned
+
+    def fail(self, media_name, owner, error):
+        """
+        Возвращает файл в очередь после ошибки или отмечает неудачным, если попытки исчерпаны.
+        """
+        self.connection.execute(
+            "UPDATE jobs SET state = CASE WHEN attempts >= ? THEN 'failed' ELSE 'pending' END, "
+            "owner = NULL, lease_until = NULL, error = ?, updated = ? WHERE path = ? AND owner = ?",
+            (self.max_attempts, str(error), time.time(), media_name, owner),
+        )
+
+    def counts(self):
+        """
+        Возвращает словарь {состояние: количество файлов}.
+        """
+        return dict(self.connection.execute("SELECT state, COUNT(*) FROM jobs GROUP BY state").fetchall())
+
+    def close(self):
+        self.connection.close()
+
+class LeaseKeeper(threading.Thread):
+    """
+    Фоновый поток, который продлевает аренду файлов, пока запуск их обрабатывает.
+    Работает со своим подключением к базе: подключение SQLite нельзя делить между потоками.
+    """
+
+    def __init__(self, db_path, folder, owner, lease_seconds=DEFAULT_LEASE_SECONDS):
+        super().__init__(daemon=True)
+        self.db_path = db_path
+        self.folder = folder
+        self.owner = owner
+        self.lease_seconds = lease_seconds
+        self.held = set()
+        self.lock = threading.Lock()
+        self.stopped = threading.Event()
+
+    def add(self, media_name):
+        with self.lock:
+            self.held.add(media_name)
+
+    def discard(self, media_name):
+        with self.lock:
+            self.held.discard(media_name)
+
+    def run(self):
+        queue = JobQueue(self.db_path, self.folder, self.lease_seconds)
+        try:
+            while not self.stopped.wait(self.lease_seconds / 3):
+                with self.lock:
+                    held = set(self.held)
+                if held:
+                    # Файлы, аренду которых забрали, при фиксации результата будут отброшены
+                    queue.heartbeat(held, self.owner)
+        finally:
+            queue.close()
+
+    def stop(self):
+        self.stopped.set()
+        self.join()
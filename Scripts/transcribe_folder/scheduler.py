@@ -0,0 +1,104 @@
+"""
+Планирование пакетной обработки: порядок файлов и количество процессов.
+
+Длительности всех файлов определяются заранее, и файлы запускаются от самых
+длинных к самым коротким — так длинный файл не оказывается последним и не
+растягивает общее время пакета. Количество процессов ограничивается свободной
+памятью: каждый процесс держит свою копию модели.
+"""
+import os
+import ctypes
+from concurrent.futures import ThreadPoolExecutor
+
+from audio_source import probe_duration
+
+# Во сколько раз модель в памяти больше, чем на диске, и сколько памяти нужно процессу сверх модели
+MODEL_MEMORY_FACTOR = 1.5
+WORKER_OVERHEAD_MB = 200
+
+# Сколько памяти оставлять системе и другим программам
+MEMORY_RESERVE_MB = 1024
+
+def probe_durations(paths, max_threads=8):
+    """
+    Определяет длительности файлов параллельно (ffprobe — отдельный процесс).
+
+    :return: Словарь {путь: длительность в секундах или None}
+    """
+    with ThreadPoolExecutor(max_workers=max_threads) as executor:
+        return dict(zip(paths, executor.map(probe_duration, paths)))
+
+def order_longest_first(paths, durations):
+    """
+    Сортирует файлы по убыванию длительности. Файлы с неизвестной длительностью идут последними.
+    """
+    return sorted(paths, key=lambda path: durations.get(path) or 0.0, reverse=True)
+
+def available_memory_mb():
+    """
+    Возвращает объём доступной оперативной памяти в мегабайтах или None, если его не удалось определить.
+    """
+    try:
+        import psutil
+        return psutil.virtual_memory().available / (1024 * 1024)
+    except ImportError:
+        pass
+
+    if os.name == "nt":
+        class MemoryStatus(ctypes.Structure):
+            _fields_ = [
+                ("dwLength", ctypes.c_ulong),
+                ("dwMemoryLoad", ctypes.c_ulong),
+                ("ullTotalPhys", ctypes.c_ulonglong),
+                ("ullAvailPhys", ctypes.c_ulonglong),
+                ("ullTotalPageFile", ctypes.c_ulonglong),
+                ("ullAvailPageFile", ctypes.c_ulonglong),
+                ("ullTotalVirtual", ctypes.c_ulonglong),
+                ("ullAvailVirtual", ctypes.c_ulonglong),
+                ("ullAvailExtendedVirtual", ctypes.c_ulonglong),
+            ]
+
+        status = MemoryStatus()
+        status.dwLength = ctypes.sizeof(MemoryStatus)
+        if ctypes.windll.kernel32.GlobalMemoryStatusEx(ctypes.byref(status)):
+            return status.ullAvailPhys / (1024 * 1024)
+        return None
+
+    try:
+        with open("/proc/meminfo", "r", encoding="utf-8") as meminfo:
+            for line in meminfo:
+                if line.startswith("MemAvailable:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return None
+
+def estimate_model_memory_mb(model_path):
+    """
+    Оценивает, сколько памяти займёт процесс с загруженной моделью, по размеру модели на диске.
+    """
+    total_bytes = 0
+    for root, _, files in os.walk(model_path):
+        for name in files:
+            try:
+                total_bytes += os.path.getsize(os.path.join(root, name))
+            except OSError:
+                pass
+    return total_bytes / (1024 * 1024) * MODEL_MEMORY_FACTOR + WORKER_OVERHEAD_MB
+
+def plan_workers(requested, model_path, model_memory_mb=None, reserve_mb=MEMORY_RESERVE_MB):
+    """
+    Ограничивает количество процессов числом ядер и свободной памятью.
+
+    :param requested: Запрошенное количество процессов
+    :param model_memory_mb: Память на один процесс; если не задана — оценивается по размеру модели
+    :return: Кортеж (количество процессов, память на процесс в МБ, доступная память в МБ или None)
+    """
+    if model_memory_mb is None:
+        model_memory_mb = estimate_model_memory_mb(model_path)
+    workers = max(1, min(requested, os.cpu_count() or 1))
+
+    available = available_memory_mb()
+    if available is not None and model_memory_mb > 0:
+        workers = max(1, min(workers, int((available - reserve_mb) // model_memory_mb)))
+    return workers, model_memory_mb, available
@@ -0,0 +1,112 @@
+"""
+Разбиение длинной записи на части для параллельного распознавания.
+
+Точки разреза выбираются в самых тихих местах возле равномерных отметок, поэтому
+слова почти никогда не попадают на границу. Декодируются только окна поиска вокруг
+отметок (ffmpeg переходит к ним сразу), а не вся запись, поэтому план готов быстро
+и части почти сразу уходят в пул. Каждая часть распознаётся с небольшим
+перекрытием, а при склейке слово достаётся той части, в которую попадает его
+середина — так на стыке слова не теряются и не дублируются.
+"""
+import numpy as np
+
+from audio_source import SAMPLE_RATE, SAMPLE_WIDTH, iter_pcm_chunks
+from vad import frame_levels
+
+# Перекрытие соседних частей в секундах: распознаватель видит контекст за границей разреза
+SEGMENT_OVERLAP = 2.0
+
+LEVEL_FRAME_SECONDS = 0.1
+LEVEL_FRAME_SAMPLES = int(SAMPLE_RATE * LEVEL_FRAME_SECONDS)
+LEVEL_FRAME_BYTES = LEVEL_FRAME_SAMPLES * SAMPLE_WIDTH
+
+# Окно сглаживания уровня (в кадрах): ищем тихий участок, а не одиночный провал внутри слова
+SMOOTHING_FRAMES = 5
+
+def segment_count(duration, min_segment, max_parallel):
+    """
+    Сколько частей имеет смысл сделать из записи длиной duration секунд.
+    """
+    if not duration or max_parallel < 2:
+        return 1
+    return max(1, min(max_parallel, int(duration // min_segment)))
+
+# Самое широкое окно поиска разреза в одну сторону от отметки, секунды
+MAX_SEARCH_SECONDS = 30.0
+
+def read_levels(media_path, start=0.0, duration=None):
+    """
+    Декодирует участок записи и возвращает уровень каждого 100-мс кадра в dBFS.
+
+    :param start: С какой секунды начинать
+    :param duration: Длина участка в секундах (None — до конца файла)
+    """
+    levels = []
+    pending = b""
+    for chunk in iter_pcm_chunks(media_path, chunk_bytes=LEVEL_FRAME_BYTES * 40, start=start, duration=duration):
+        pending += chunk
+        frame_count = len(pending) // LEVEL_FRAME_BYTES
+        if frame_count:
+            levels.append(frame_levels(pending[:frame_count * LEVEL_FRAME_BYTES], LEVEL_FRAME_SAMPLES))
+            pending = pending[frame_count * LEVEL_FRAME_BYTES:]
+    if not levels:
+        return np.zeros(0, dtype=np.float32)
+    return np.concatenate(levels)
+
+def quietest_point(media_path, target, search):
+    """
+    Возвращает время (в секундах) самого тихого места в пределах search секунд от отметки target.
+    Декодируется только это окно с запасом на сглаживание.
+    """
+    margin = SMOOTHING_FRAMES * LEVEL_FRAME_SECONDS
+    start = max(0.0, target - search - margin)
+    levels = read_levels(media_path, start, target + search + margin - start)
+    if len(levels) > SMOOTHING_FRAMES:
+        levels = np.convolve(levels, np.ones(SMOOTHING_FRAMES) / SMOOTHING_FRAMES, mode="same")
+    low = max(0, int((target - search - start) / LEVEL_FRAME_SECONDS))
+    high = min(len(levels), int((target + search - start) / LEVEL_FRAME_SECONDS))
+    if high <= low:
+        # Окно за концом записи (длительность определена неточно) — режем по отметке
+        return target
+    return start + (low + int(np.argmin(levels[low:high])) + 0.5) * LEVEL_FRAME_SECONDS
+
+def plan_segments(media_path, duration, min_segment, max_parallel):
+    """
+    Делит запись на части по паузам.
+
+    :param media_path: Путь к медиафайлу
+    :param duration: Длительность записи в секундах
+    :param min_segment: Минимальная длина части в секундах
+    :param max_parallel: Максимальное количество частей
+    :return: Список пар (начало, конец) в секундах; у последней части конец равен None
+    """
+    count = segment_count(duration, min_segment, max_parallel)
+    if count < 2:
+        return [(0.0, None)]
+
+    # Разрез ищется в окне вокруг равномерной отметки, не шире четверти части
+    search = max(LEVEL_FRAME_SECONDS, min(MAX_SEARCH_SECONDS, duration / count / 4))
+    cuts = [quietest_point(media_path, k * duration / count, search) for k in range(1, count)]
+
+    bounds = [0.0] + cuts + [None]
+    return list(zip(bounds[:-1], bounds[1:]))
+
+def stitch_segments(segments):
+    """
+    Склеивает результаты распознавания частей в один текст.
+
+    :param segments: Список кортежей (начало, конец, фразы) в порядке следования частей.
+                     Фраза — список слов (слово, начало, конец) с абсолютным временем.
+    :return: Текст, по фразе на строку
+    """
+    lines = []
+    for start, end, utterances in segments:
+        for words in utterances:
+            # Слово принадлежит части, в которую попадает его середина
+            kept = [
+                word for word, word_start, word_end in words
+                if start <= (word_start + word_end) / 2 and (end is None or (word_start + word_end) / 2 < end)
+            ]
+            if kept:
+                lines.append(" ".join(kept))
+    return "\n".join(lines)
@@ -1,11 +1,46 @@
 import os
-import wave
+import sys
+import time
 import json
+import shutil
+import socket
+import argparse
+from collections import deque
+from contextlib import ExitStack
 from vosk import Model, KaldiRecognizer
-from moviepy.editor import VideoFileClip
-from pydub import AudioSegment
-from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
 from tqdm import tqdm
+from audio_source import BYTES_PER_SECOND, MEDIA_EXTENSIONS, ffmpeg_available, iter_pcm_chunks, probe_duration
+from vad import SpeechFilter
+from segmenter import SEGMENT_OVERLAP, plan_segments, stitch_segments
+from checkpoint import clear_checkpoint, load_checkpoint, make_fingerprint, partial_path, save_checkpoint
+from transcription_cache import DEFAULT_CACHE_DIR, TranscriptionCache, make_cache_key
+from watch_folder import ProcessedLedger, create_watcher
+from scheduler import estimate_model_memory_mb, order_longest_first, plan_workers, probe_durations
+from two_tier import UNKNOWN_WORD, find_escalation_spans, format_two_tier_report, merge_tiers
+from vocabulary import find_vocabulary, load_vocabulary, make_grammar
+from job_queue import DEFAULT_LEASE_SECONDS, JobQueue, LeaseKeeper
+
+DEFAULT_MODEL_PATH = "C:\\models\\!vosk!\\vosk-model-ru-0.42"
+
+# Как часто (в секундах записи) сохранять контрольную точку при распознавании файла
+CHECKPOINT_INTERVAL = 60.0
+
+# Режим наблюдения: сколько раз подряд пересоздавать сломавшийся пул процессов
+MAX_POOL_RESTARTS = 3
+
+# Прогресс пакета в секундах записи: сколько обработано, сколько осталось ждать
+PROGRESS_FORMAT = "{desc}: {percentage:3.0f}%|{bar}| {n:.0f}/{total:.0f} с записи [{elapsed}, осталось ~{remaining}]"
+
+# Состояние процесса-обработчика. Модель и распознаватель создаются один раз
+# при запуске процесса (init_worker) и переиспользуются для всех его файлов.
+_worker_model = None
+_worker_model_path = None
+_worker_recognizer = None
+# Двухступенчатый режим с одной моделью: распознаватель первой ступени (с грамматикой) на той же модели
+_worker_first_recognizer = None
+_worker_stats = {}
 
 def create_directory(path):
     """
@@ -14,104 +49,1127 @@ def create_directory(path):
     if not os.path.exists(path):
         os.makedirs(path)
 
-def convert_audio(input_path, output_path):
+def get_rss_mb():
     """
-    Преобразует аудио в формат WAV 16kHz моно
+    Возвращает объём резидентной памяти (RSS) текущего процесса в мегабайтах.
+    Если определить его не удалось — возвращает None.
     """
-    audio = AudioSegment.from_file(input_path)
-    audio = audio.set_channels(1).set_frame_rate(16000)
-    audio.export(output_path, format="wav")
+    try:
+        import psutil
+        return psutil.Process().memory_info().rss / (1024 * 1024)
+    except ImportError:
+        pass
 
-def transcribe_audio_vosk(audio_path, model_path):
+    # Без psutil работает только на Linux
+    try:
+        with open("/proc/self/status", "r", encoding="utf-8") as status_file:
+            for line in status_file:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return None
+
+def init_worker(model_path, grammar=None, first_grammar=None):
     """
-    Распознаёт речь из аудиофайла с использованием Vosk.
+    Инициализирует процесс-обработчик: загружает модель Vosk и создаёт распознаватель.
+    Вызывается один раз при старте каждого процесса пула.
+
+    :param grammar: Строка грамматики Vosk (JSON-список фраз); если задана, распознаются только эти фразы
+    :param first_grammar: Грамматика первой ступени двухступенчатого режима, когда обе ступени
+                          используют одну модель: для неё создаётся второй распознаватель на той же модели
     """
-    try:
-        if not os.path.exists(model_path):
-            return "Модель не найдена. Проверьте путь."
+    global _worker_model, _worker_model_path, _worker_recognizer, _worker_first_recognizer
 
-        model = Model(model_path)
-        recognizer = KaldiRecognizer(model, 16000)
+    _worker_model_path = model_path
+    start_time = time.perf_counter()
+    _worker_model = Model(model_path)
+    if grammar is not None:
+        _worker_recognizer = KaldiRecognizer(_worker_model, 16000, grammar)
+    else:
+        _worker_recognizer = KaldiRecognizer(_worker_model, 16000)
+    # Время слов нужно для склейки частей длинных записей
+    _worker_recognizer.SetWords(True)
+    if first_grammar is not None:
+        _worker_first_recognizer = KaldiRecognizer(_worker_model, 16000, first_grammar)
+        _worker_first_recognizer.SetWords(True)
+    load_time = time.perf_counter() - start_time
 
-        with wave.open(audio_path, "rb") as wf:
-            if wf.getnchannels() != 1 or wf.getsampwidth() != 2 or wf.getframerate() != 16000:
-                return "Аудиофайл должен быть в формате WAV с частотой 16kHz и моно."
+    rss = get_rss_mb()
+    _worker_stats.update({
+        "pid": os.getpid(),
+        "load_time": load_time,
+        "rss_after_load": rss,
+        "peak_rss": rss,
+        "jobs": 0,
+    })
 
-            transcription = ""
-            while True:
-                data = wf.readframes(4000)
-                if len(data) == 0:
-                    break
-                if recognizer.AcceptWaveform(data):
-                    result = json.loads(recognizer.Result())
-                    transcription += result.get("text", "") + "\n"
+def update_worker_stats():
+    """
+    Обновляет статистику процесса после очередного задания и возвращает её копию.
+    """
+    rss = get_rss_mb()
+    if rss is not None:
+        _worker_stats["peak_rss"] = max(rss, _worker_stats.get("peak_rss") or 0)
+    _worker_stats["jobs"] += 1
+    return dict(_worker_stats)
 
-            final_result = json.loads(recognizer.FinalResult())
-            transcription += final_result.get("text", "") + "\n"
+def recognize_chunks(recognizer, chunks):
+    """
+    Подаёт блоки PCM в распознаватель и отдаёт результаты (словари Vosk) по мере готовности,
+    включая финальный.
+    """
+    for data in chunks:
+        if recognizer.AcceptWaveform(data):
+            yield json.loads(recognizer.Result())
+    yield json.loads(recognizer.FinalResult())
 
-        return transcription.strip()
-    except Exception as e:
-        return f"Ошибка при распознавании аудио: {e}"
+def transcribe_audio_vosk(media_path, recognizer, text_file_path, vad_options=None,
+                          checkpoint_interval=CHECKPOINT_INTERVAL, stage_times=None):
+    """
+    Распознаёт речь из видео- или аудиофайла с использованием Vosk и записывает текст
+    в text_file_path по мере распознавания.
+    Аудио подаётся в распознаватель блоками прямо из декодера, без временных файлов.
+    Распознаватель переиспользуется между файлами, поэтому перед началом сбрасывается.
+
+    Каждые checkpoint_interval секунд записи сохраняется контрольная точка; если прошлый
+    запуск для этого файла был прерван, распознавание продолжается с неё.
 
-def process_video(video_path, model_path, temp_dir, output_dir):
+    :param vad_options: Параметры SpeechFilter; если заданы, паузы вырезаются до распознавания
+    :param stage_times: Словарь, в который добавляется время стадий в секундах: "source"
+                        (ожидание аудио от декодера и VAD), "recognize" и "write"
+    :return: Кортеж (SpeechFilter или None, секунда, с которой продолжен прерванный запуск, или None)
     """
-    Извлекает аудио из видео, преобразует и распознаёт речь.
+    recognizer.Reset()
+
+    fingerprint = make_fingerprint(media_path, _worker_model_path, {"vad": vad_options})
+    checkpoint = load_checkpoint(text_file_path, fingerprint)
+    start = checkpoint["offset"] if checkpoint else 0.0
+
+    chunks = iter_pcm_chunks(media_path, start=start)
+    speech_filter = None
+    if vad_options is not None:
+        speech_filter = SpeechFilter(**vad_options)
+        chunks = speech_filter.filter(chunks)
+
+    # Сколько байт уже отдано распознавателю: результат Vosk относится ко всему поданному аудио
+    fed_bytes = 0
+    timings = {"source": 0.0, "recognize": 0.0, "write": 0.0}
+
+    def count_fed(chunks):
+        nonlocal fed_bytes
+        iterator = iter(chunks)
+        while True:
+            source_start = time.perf_counter()
+            data = next(iterator, None)
+            timings["source"] += time.perf_counter() - source_start
+            if data is None:
+                break
+            fed_bytes += len(data)
+            yield data
+
+    total_start = time.perf_counter()
+    part_file_path = partial_path(text_file_path)
+    with open(part_file_path, "r+b" if checkpoint else "wb") as part_file:
+        if checkpoint:
+            # Текст, записанный после контрольной точки, будет распознан заново
+            part_file.truncate(checkpoint["text_bytes"])
+            part_file.seek(checkpoint["text_bytes"])
+
+        last_checkpoint = start
+        for result in recognize_chunks(recognizer, count_fed(chunks)):
+            write_start = time.perf_counter()
+            text = result.get("text", "")
+            if text:
+                part_file.write((text + "\n").encode("utf-8"))
+
+            fed_seconds = fed_bytes / BYTES_PER_SECOND
+            offset = start + (speech_filter.map_time(fed_seconds) if speech_filter is not None else fed_seconds)
+            if offset - last_checkpoint >= checkpoint_interval:
+                part_file.flush()
+                os.fsync(part_file.fileno())
+                save_checkpoint(text_file_path, fingerprint, offset, part_file.tell())
+                last_checkpoint = offset
+            timings["write"] += time.perf_counter() - write_start
+
+    os.replace(part_file_path, text_file_path)
+    clear_checkpoint(text_file_path)
+
+    if stage_times is not None:
+        timings["recognize"] = time.perf_counter() - total_start - timings["source"] - timings["write"]
+        for stage, seconds in timings.items():
+            stage_times[stage] = stage_times.get(stage, 0.0) + seconds
+
+    return speech_filter, (start if checkpoint else None)
+
+def transcription_path(media_path, output_dir):
     """
-    try:
-        temp_audio_path = os.path.join(temp_dir, "temp_audio.wav")
-        raw_audio_path = os.path.join(temp_dir, "temp_audio_raw.wav")
+    Возвращает путь к текстовому файлу для медиафайла.
+    """
+    return os.path.join(output_dir, os.path.splitext(os.path.basename(media_path))[0] + ".txt")
 
-        video = VideoFileClip(video_path)
-        video.audio.write_audiofile(raw_audio_path, codec="pcm_s16le")
+def write_transcription(media_path, output_dir, transcription):
+    """
+    Сохраняет текст в output_dir под именем исходного файла и возвращает путь к нему.
+    """
+    text_file_path = transcription_path(media_path, output_dir)
+    with open(text_file_path, "w", encoding="utf-8") as text_file:
+        text_file.write(transcription)
+    return text_file_path
 
-        convert_audio(raw_audio_path, temp_audio_path)
+def format_vad_summary(input_seconds, output_seconds):
+    """
+    Формирует строку о доле вырезанной тишины.
+    """
+    skipped = 1.0 - output_seconds / input_seconds if input_seconds else 0.0
+    return f" (пропущено тишины: {skipped:.0%}, распознано {output_seconds:.0f} из {input_seconds:.0f} с)"
 
-        transcription = transcribe_audio_vosk(temp_audio_path, model_path)
+def format_offset(seconds):
+    """
+    Форматирует смещение в записи как ЧЧ:ММ:СС.
+    """
+    seconds = int(seconds)
+    return f"{seconds // 3600:02d}:{seconds // 60 % 60:02d}:{seconds % 60:02d}"
 
-        text_file_path = os.path.join(output_dir, os.path.splitext(os.path.basename(video_path))[0] + ".txt")
-        with open(text_file_path, "w", encoding="utf-8") as text_file:
-            text_file.write(transcription)
+def process_video(media_path, recognizer, output_dir, vad_options=None, checkpoint_interval=CHECKPOINT_INTERVAL):
+    """
+    Распознаёт речь из видео- или аудиофайла и сохраняет текст в output_dir.
+    Возвращает кортеж (сообщение о результате, путь к тексту или None при ошибке).
+    """
+    try:
+        text_file_path = transcription_path(media_path, output_dir)
+        speech_filter, resumed_from = transcribe_audio_vosk(
+            media_path, recognizer, text_file_path, vad_options, checkpoint_interval
+        )
 
-        return f"Обработка завершена: {video_path} -> {text_file_path}"
+        message = f"Обработка завершена: {media_path} -> {text_file_path}"
+        if resumed_from is not None:
+            message += f" (продолжено с {format_offset(resumed_from)})"
+        if speech_filter is not None:
+            message += format_vad_summary(speech_filter.input_seconds, speech_filter.output_seconds)
+        return message, text_file_path
 
     except Exception as e:
-        return f"Ошибка при обработке файла {video_path}: {e}"
+        return f"Ошибка при обработке файла {media_path}: {e}", None
 
-    finally:
-        if os.path.exists(raw_audio_path):
-            os.remove(raw_audio_path)
-        if os.path.exists(temp_audio_path):
-            os.remove(temp_audio_path)
+def process_video_in_worker(media_path, output_dir, vad_options=None, checkpoint_interval=CHECKPOINT_INTERVAL):
+    """
+    Обрабатывает файл в процессе пула с уже загруженной моделью.
+    Возвращает кортеж (сообщение о результате, путь к тексту или None, статистика процесса).
+    """
+    message, text_file_path = process_video(
+        media_path, _worker_recognizer, output_dir, vad_options, checkpoint_interval
+    )
+    return message, text_file_path, update_worker_stats()
+
+def plan_segments_in_worker(media_path, split_options, duration=None):
+    """
+    Делит запись на части по паузам. Если длительность не передана, она определяется здесь.
+    Возвращает кортеж (список пар (начало, конец), статистика процесса).
+    """
+    if duration is None:
+        duration = probe_duration(media_path)
+    bounds = plan_segments(media_path, duration, split_options["min_segment"], split_options["max_parallel"])
+    return bounds, update_worker_stats()
+
+def recognize_words(media_path, start=0.0, duration=None, vad_options=None, recognizer=None):
+    """
+    Распознаёт участок записи распознавателем процесса и возвращает слова с временем и уверенностью.
+
+    :param recognizer: Распознаватель (по умолчанию — основной распознаватель процесса)
+    :return: Кортеж (фразы, (секунд на входе VAD, секунд после VAD) или None).
+             Фраза — список слов (слово, начало, конец, уверенность) со временем от начала исходной записи.
+    """
+    if recognizer is None:
+        recognizer = _worker_recognizer
+    recognizer.Reset()
+
+    chunks = iter_pcm_chunks(media_path, start=start, duration=duration)
+    speech_filter = None
+    if vad_options is not None:
+        speech_filter = SpeechFilter(**vad_options)
+        chunks = speech_filter.filter(chunks)
+    map_time = speech_filter.map_time if speech_filter is not None else (lambda t: t)
+
+    utterances = []
+    for result in recognize_chunks(recognizer, chunks):
+        words = [
+            (word["word"], start + map_time(word["start"]), start + map_time(word["end"]), word.get("conf", 1.0))
+            for word in result.get("result", [])
+        ]
+        if words:
+            utterances.append(words)
+
+    vad_seconds = None
+    if speech_filter is not None:
+        vad_seconds = (speech_filter.input_seconds, speech_filter.output_seconds)
+    return utterances, vad_seconds
+
+def transcribe_segment_in_worker(media_path, start, end, vad_options=None):
+    """
+    Распознаёт часть записи [start, end) с перекрытием SEGMENT_OVERLAP секунд по краям.
+
+    :return: Кортеж (фразы, (секунд на входе VAD, секунд после VAD) или None, статистика процесса).
+             Фраза — список слов (слово, начало, конец) со временем от начала исходной записи.
+    """
+    decode_start = max(0.0, start - SEGMENT_OVERLAP)
+    duration = None if end is None else end + SEGMENT_OVERLAP - decode_start
+
+    utterances, vad_seconds = recognize_words(media_path, decode_start, duration, vad_options)
+    utterances = [[word[:3] for word in words] for words in utterances]
+    return utterances, vad_seconds, update_worker_stats()
+
+def first_pass_in_worker(media_path, vad_options=None):
+    """
+    Двухступенчатый режим: распознаёт всю запись быстрой моделью процесса.
+    Возвращает кортеж (фразы со словами (слово, начало, конец, уверенность),
+    секунды процессора, статистика процесса).
+    """
+    cpu_start = time.process_time()
+    utterances, _ = recognize_words(media_path, vad_options=vad_options, recognizer=_worker_first_recognizer)
+    return utterances, time.process_time() - cpu_start, update_worker_stats()
+
+def escalate_span_in_worker(media_path, start, end, vad_options=None):
+    """
+    Двухступенчатый режим: распознаёт участок [start, end) большой моделью процесса.
+    Возвращает кортеж (фразы, секунды VAD или None, секунды процессора, статистика процесса).
+    """
+    cpu_start = time.process_time()
+    utterances, vad_seconds, stats = transcribe_segment_in_worker(media_path, start, end, vad_options)
+    return utterances, vad_seconds, time.process_time() - cpu_start, stats
 
-def process_videos_in_folder(folder_path, model_path, temp_dir, output_dir):
+def format_mb(value):
     """
-    Обрабатывает все видеофайлы в папке параллельно.
+    Форматирует объём памяти в мегабайтах для вывода.
     """
-    create_directory(temp_dir)
+    return f"{value:.0f} МБ" if value is not None else "н/д"
+
+def print_worker_stats(worker_stats):
+    """
+    Выводит время загрузки модели и потребление памяти каждым процессом пула.
+    """
+    print("\nСтатистика процессов-обработчиков:")
+    for stats in sorted(worker_stats.values(), key=lambda s: s["pid"]):
+        print(
+            f"  PID {stats['pid']}: загрузка модели {stats['load_time']:.1f} с, "
+            f"RSS после загрузки {format_mb(stats['rss_after_load'])}, "
+            f"пиковый RSS {format_mb(stats['peak_rss'])}, заданий: {stats['jobs']}"
+        )
+
+def finish_segmented_file(media_path, output_dir, segments):
+    """
+    Склеивает распознанные части записи по порядку и сохраняет текст.
+    Возвращает кортеж (сообщение о результате, путь к тексту).
+
+    :param segments: Словарь {номер части: (начало, конец, фразы, секунды VAD)}
+    """
+    ordered = [segments[index] for index in sorted(segments)]
+    transcription = stitch_segments([(start, end, utterances) for start, end, utterances, _ in ordered])
+    text_file_path = write_transcription(media_path, output_dir, transcription)
+
+    message = f"Обработка завершена: {media_path} -> {text_file_path} (частей: {len(ordered)})"
+    vad_seconds = [seconds for *_, seconds in ordered if seconds is not None]
+    if vad_seconds:
+        message += format_vad_summary(sum(s[0] for s in vad_seconds), sum(s[1] for s in vad_seconds))
+    return message, text_file_path
+
+def finish_two_tier_file(media_path, output_dir, fast_utterances, segments):
+    """
+    Собирает текст двухступенчатого режима: слова быстрой модели, а на переданных
+    участках — слова большой модели. Возвращает кортеж (сообщение о результате, путь к тексту).
+
+    :param segments: Словарь {номер участка: (начало, конец, фразы, секунды VAD)}
+    """
+    ordered = [segments[index] for index in sorted(segments)]
+    transcription = merge_tiers(fast_utterances, [(start, end, utterances) for start, end, utterances, _ in ordered])
+    text_file_path = write_transcription(media_path, output_dir, transcription)
+    escalated_seconds = sum(end - start for start, end, _, _ in ordered)
+    message = (
+        f"Обработка завершена: {media_path} -> {text_file_path} "
+        f"(большой моделью уточнено участков: {len(ordered)}, {escalated_seconds:.0f} с)"
+    )
+    return message, text_file_path
+
+def lookup_cache(cache, video_files, output_dir, model_path, settings):
+    """
+    Отдаёт из кэша тексты для файлов, которые уже распознавались с той же моделью
+    и настройками. Одинаковые по содержимому файлы объединяются в одну группу.
+
+    :return: Кортеж (сообщения о взятых из кэша файлах,
+             словарь {ключ: [файлы]} для распознавания, словарь {файл: ключ})
+    """
+    messages = []
+    groups = {}
+    keys = {}
+    for media_path in tqdm(video_files, desc="Проверка кэша"):
+        key = make_cache_key(cache.content_hash(media_path), model_path, settings)
+        text = cache.get(key)
+        if text is not None:
+            text_file_path = write_transcription(media_path, output_dir, text)
+            messages.append(f"Взято из кэша: {media_path} -> {text_file_path}")
+            continue
+        groups.setdefault(key, []).append(media_path)
+        keys[media_path] = key
+    cache.save()
+    return messages, groups, keys
+
+def process_videos_in_folder(folder_path, model_path, output_dir, workers=1, vad_options=None, split_options=None,
+                             cache=None, checkpoint_interval=CHECKPOINT_INTERVAL, model_memory_mb=None,
+                             tier_options=None):
+    """
+    Обрабатывает все видео- и аудиофайлы в папке в пуле не более чем из `workers` процессов.
+    Каждый процесс загружает модель один раз и обрабатывает файлы до конца пакета.
+    Файлы запускаются от самых длинных к самым коротким, а число процессов
+    ограничивается свободной памятью (model_memory_mb — память на процесс,
+    по умолчанию оценивается по размеру модели). Результат каждого файла выводится
+    сразу по готовности, прогресс и оставшееся время считаются по секундам записи.
+    Если заданы vad_options, паузы вырезаются перед распознаванием.
+    Если заданы split_options, длинные записи делятся по паузам на части,
+    которые распознаются параллельно и затем склеиваются.
+    Если задан cache (TranscriptionCache), распознаются только новые и изменённые файлы.
+    Текст пишется по мере распознавания; прерванный запуск продолжается с последней
+    контрольной точки (сохраняется каждые checkpoint_interval секунд записи).
+    Если заданы tier_options ({"fast_model": путь, "threshold": порог уверенности,
+    "vocabulary": список фраз или None}), записи сначала распознаются быстрой моделью
+    (со словарём — по грамматике из его фраз), а фразы с уверенностью ниже порога или
+    со словами вне словаря — заново моделью model_path без грамматики (разбиение и
+    контрольные точки в этом режиме не используются).
+    """
+    if not os.path.exists(model_path):
+        print("Модель не найдена. Проверьте путь.")
+        return
+
+    if tier_options is not None:
+        if not os.path.exists(tier_options["fast_model"]):
+            print("Быстрая модель не найдена. Проверьте путь.")
+            return
+        if split_options is not None:
+            print("В двухступенчатом режиме записи не делятся на части, --split не используется.")
+            split_options = None
+
+    if not ffmpeg_available():
+        print("ffmpeg не найден. Установите ffmpeg и добавьте его в PATH.")
+        return
+
     create_directory(output_dir)
 
-    video_extensions = (".mp4", ".avi", ".mov", ".mkv", ".webm")
-    video_files = [os.path.join(folder_path, f) for f in os.listdir(folder_path) if f.lower().endswith(video_extensions)]
+    video_files = [os.path.join(folder_path, f) for f in os.listdir(folder_path) if f.lower().endswith(MEDIA_EXTENSIONS)]
 
     if not video_files:
-        print("В папке нет видеофайлов.")
+        print("В папке нет видео- или аудиофайлов.")
         return
 
-    results = []
-    with ThreadPoolExecutor() as executor:
-        futures = [executor.submit(process_video, video, model_path, temp_dir, output_dir) for video in video_files]
+    # Файлы с одинаковым содержимым распознаются один раз: {первый файл группы: остальные}
+    duplicates = {}
+    cache_keys = {}
+    if cache is not None:
+        settings = {"vad": vad_options, "split": split_options}
+        if tier_options is not None:
+            settings["two_tier"] = tier_options
+        cached, groups, cache_keys = lookup_cache(cache, video_files, output_dir, model_path, settings)
+        for message in cached:
+            print(message)
+        video_files = [group[0] for group in groups.values()]
+        duplicates = {group[0]: group[1:] for group in groups.values()}
+        if not video_files:
+            print("Все файлы взяты из кэша.")
+            return
+
+    durations = probe_durations(video_files)
+    video_files = order_longest_first(video_files, durations)
+    known_durations = [duration for duration in durations.values() if duration]
+    # Файлы с неизвестной длительностью учитываются в прогрессе как файлы средней длины
+    default_duration = sum(known_durations) / len(known_durations) if known_durations else 1.0
+    weights = {media_path: durations[media_path] or default_duration for media_path in video_files}
+    # Сколько секунд записи файла уже учтено в прогрессе (для файлов, разбитых на части)
+    counted = {}
+    files_done = 0
+
+    def complete_file(media_path, message, text_file_path):
+        """
+        Учитывает завершённый файл: выводит результат, сохраняет текст в кэш и раздаёт его дубликатам.
+        """
+        nonlocal files_done
+        files_done += 1
+        progress.update(weights[media_path] - counted.pop(media_path, 0.0))
+        progress.write(f"[{files_done}/{len(video_files)}] {message}")
+        same_files = duplicates.get(media_path, [])
+        if text_file_path is None:
+            for same_file in same_files:
+                progress.write(f"Ошибка при обработке файла {same_file}: {message}")
+            return
+
+        with open(text_file_path, "r", encoding="utf-8") as text_file:
+            text = text_file.read()
+        if cache is not None:
+            cache.put(cache_keys[media_path], text, media_path)
+            cache.save()
+        for same_file in same_files:
+            progress.write(f"Совпадает по содержимому с {media_path}: {write_transcription(same_file, output_dir, text)}")
+
+    def count_segment(media_path, start, end):
+        """
+        Учитывает в прогрессе готовую часть записи.
+        """
+        seconds = min((end if end is not None else weights[media_path]) - start,
+                      weights[media_path] - counted.get(media_path, 0.0))
+        counted[media_path] = counted.get(media_path, 0.0) + seconds
+        progress.update(seconds)
+
+    # Процессов больше, чем файлов, не нужно: каждый держит в памяти свою копию модели
+    requested = max(1, min(workers, len(video_files)))
+    # Двухступенчатый режим, где обе ступени — одна модель (словарь без --fast-model):
+    # один пул, каждый процесс загружает модель один раз и держит на ней оба распознавателя
+    shared_model = tier_options is not None and (
+        os.path.abspath(tier_options["fast_model"]) == os.path.abspath(model_path)
+    )
+    if tier_options is None or shared_model:
+        workers, per_worker_mb, available_mb = plan_workers(requested, model_path, model_memory_mb)
+    else:
+        # Два пула с разными моделями работают одновременно: память делится между ними,
+        # поэтому процессы планируются парами (большая модель + быстрая) под общий предел
+        if model_memory_mb is None:
+            model_memory_mb = estimate_model_memory_mb(model_path)
+        fast_worker_mb = estimate_model_memory_mb(tier_options["fast_model"])
+        workers, _, available_mb = plan_workers(requested, model_path, model_memory_mb + fast_worker_mb)
+        per_worker_mb = model_memory_mb
+    print(
+        f"Процессов-обработчиков: {workers} (запрошено {requested}, "
+        f"память на процесс ~{format_mb(per_worker_mb)}, доступно {format_mb(available_mb)})"
+    )
+    if shared_model:
+        print("Обе ступени используют одну модель: первая ступень идёт в тех же процессах")
+    elif tier_options is not None:
+        print(f"Процессов первой ступени: {workers} (память на процесс ~{format_mb(fast_worker_mb)})")
+    total_seconds = sum(weights.values())
+    print(f"Файлов: {len(video_files)}, общая длительность: {format_offset(total_seconds)}")
+
+    worker_stats = {}
+    # Для файлов, разбитых на части (или с участками для большой модели): сколько частей ещё не готово и готовые части
+    remaining_segments = {}
+    finished_segments = {}
+    # Двухступенчатый режим: фразы быстрой модели до готовности участков большой модели и итоговая статистика
+    first_results = {}
+    tier_stats = {"audio_seconds": 0.0, "escalated_seconds": 0.0, "decoded_seconds": 0.0,
+                  "fast_cpu": 0.0, "large_cpu": 0.0, "words": 0, "unknown_words": 0, "vocabulary_size": None}
+    grammar = None
+    if tier_options is not None and tier_options.get("vocabulary"):
+        grammar = make_grammar(tier_options["vocabulary"])
+        tier_stats["vocabulary_size"] = len(tier_options["vocabulary"])
+    with ExitStack() as stack:
+        executor = stack.enter_context(ProcessPoolExecutor(
+            max_workers=workers, initializer=init_worker,
+            initargs=(model_path, None, grammar if shared_model else None),
+        ))
+        if shared_model:
+            fast_executor = executor
+        elif tier_options is not None:
+            fast_executor = stack.enter_context(ProcessPoolExecutor(
+                max_workers=workers, initializer=init_worker, initargs=(tier_options["fast_model"], grammar)
+            ))
+        progress = stack.enter_context(
+            tqdm(total=total_seconds, desc="Обработка", unit="с записи", bar_format=PROGRESS_FORMAT)
+        )
+        pending = {}
+        for media_path in video_files:
+            if tier_options is not None:
+                future = fast_executor.submit(first_pass_in_worker, media_path, vad_options)
+                pending[future] = ("first", media_path, None)
+            elif split_options is None:
+                future = executor.submit(
+                    process_video_in_worker, media_path, output_dir, vad_options, checkpoint_interval
+                )
+                pending[future] = ("file", media_path, None)
+            else:
+                future = executor.submit(plan_segments_in_worker, media_path, split_options, durations[media_path])
+                pending[future] = ("plan", media_path, None)
+
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                kind, media_path, bounds = pending.pop(future)
+                if media_path in remaining_segments and remaining_segments[media_path] is None:
+                    # Другая часть этого файла уже завершилась ошибкой
+                    continue
+
+                try:
+                    if kind == "file":
+                        message, text_file_path, stats = future.result()
+                        complete_file(media_path, message, text_file_path)
+
+                    elif kind == "plan":
+                        segment_bounds, stats = future.result()
+                        if len(segment_bounds) == 1:
+                            future = executor.submit(
+                                process_video_in_worker, media_path, output_dir, vad_options, checkpoint_interval
+                            )
+                            pending[future] = ("file", media_path, None)
+                        else:
+                            remaining_segments[media_path] = len(segment_bounds)
+                            finished_segments[media_path] = {}
+                            for index, (start, end) in enumerate(segment_bounds):
+                                future = executor.submit(transcribe_segment_in_worker, media_path, start, end, vad_options)
+                                pending[future] = ("segment", media_path, (index, start, end))
+
+                    elif kind == "first":
+                        utterances, cpu_seconds, stats = future.result()
+                        tier_stats["fast_cpu"] += cpu_seconds
+                        tier_stats["audio_seconds"] += weights[media_path]
+                        for words in utterances:
+                            tier_stats["words"] += len(words)
+                            tier_stats["unknown_words"] += sum(1 for word in words if word[0] == UNKNOWN_WORD)
+                        spans = find_escalation_spans(utterances, tier_options["threshold"])
+                        if not spans:
+                            text_file_path = write_transcription(media_path, output_dir, merge_tiers(utterances, []))
+                            complete_file(media_path, f"Обработка завершена: {media_path} -> {text_file_path}",
+                                          text_file_path)
+                        else:
+                            first_results[media_path] = utterances
+                            remaining_segments[media_path] = len(spans)
+                            finished_segments[media_path] = {}
+                            for index, (start, end) in enumerate(spans):
+                                tier_stats["escalated_seconds"] += end - start
+                                tier_stats["decoded_seconds"] += end + SEGMENT_OVERLAP - max(0.0, start - SEGMENT_OVERLAP)
+                                future = executor.submit(escalate_span_in_worker, media_path, start, end, vad_options)
+                                pending[future] = ("escalate", media_path, (index, start, end))
+
+                    elif kind == "escalate":
+                        utterances, vad_seconds, cpu_seconds, stats = future.result()
+                        tier_stats["large_cpu"] += cpu_seconds
+                        index, start, end = bounds
+                        finished_segments[media_path][index] = (start, end, utterances, vad_seconds)
+                        remaining_segments[media_path] -= 1
+                        if remaining_segments[media_path] == 0:
+                            message, text_file_path = finish_two_tier_file(
+                                media_path, output_dir, first_results.pop(media_path), finished_segments.pop(media_path)
+                            )
+                            complete_file(media_path, message, text_file_path)
+
+                    else:
+                        utterances, vad_seconds, stats = future.result()
+                        index, start, end = bounds
+                        finished_segments[media_path][index] = (start, end, utterances, vad_seconds)
+                        count_segment(media_path, start, end)
+                        remaining_segments[media_path] -= 1
+                        if remaining_segments[media_path] == 0:
+                            message, text_file_path = finish_segmented_file(
+                                media_path, output_dir, finished_segments.pop(media_path)
+                            )
+                            complete_file(media_path, message, text_file_path)
+
+                    worker_stats[stats["pid"]] = stats
+
+                except Exception as e:
+                    complete_file(media_path, f"Ошибка при обработке файла {media_path}: {e}", None)
+                    if kind in ("segment", "escalate"):
+                        remaining_segments[media_path] = None
+                        finished_segments.pop(media_path, None)
+                        first_results.pop(media_path, None)
+
+    print_worker_stats(worker_stats)
+    if tier_options is not None:
+        print(format_two_tier_report(tier_stats))
+
+def process_alive(pid):
+    """
+    Проверяет, работает ли на этой машине процесс с указанным PID.
+    """
+    if os.name == "nt":
+        # На Windows os.kill(pid, 0) посылает CTRL_C_EVENT, поэтому спрашиваем ядро напрямую
+        import ctypes
+        handle = ctypes.windll.kernel32.OpenProcess(0x1000, False, pid)  # PROCESS_QUERY_LIMITED_INFORMATION
+        if not handle:
+            return False
+        ctypes.windll.kernel32.CloseHandle(handle)
+        return True
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
 
-        for future in tqdm(futures, desc="Обработка видео"):
-            results.append(future.result())
+def adopt_staging(staging_root, host, staging_dir):
+    """
+    Переносит в staging_dir черновики и контрольные точки завершившихся запусков
+    этой машины (папки <машина>-<pid> с неработающим PID и старую папку <машина>),
+    чтобы файлы, которые они не успели распознать, продолжились с контрольной точки.
+    Папки работающих запусков и других машин не трогаются.
+
+    :return: Количество перенесённых файлов
+    """
+    adopted = 0
+    prefix = f"{host}-"
+    for name in os.listdir(staging_root):
+        path = os.path.join(staging_root, name)
+        if path == staging_dir or not os.path.isdir(path):
+            continue
+        # Папка <машина> без PID осталась от прежних версий, где черновики делились по машинам
+        if name != host:
+            pid = name[len(prefix):] if name.startswith(prefix) else ""
+            if not pid.isdigit() or process_alive(int(pid)):
+                continue
+        for filename in os.listdir(path):
+            target = os.path.join(staging_dir, filename)
+            if os.path.exists(target):
+                continue
+            try:
+                os.replace(os.path.join(path, filename), target)
+                adopted += 1
+            except OSError:
+                # Ту же папку одновременно разбирает другой новый запуск
+                pass
+        shutil.rmtree(path, ignore_errors=True)
+    return adopted
+
+def process_videos_from_queue(folder_path, model_path, output_dir, workers=1, vad_options=None,
+                              checkpoint_interval=CHECKPOINT_INTERVAL, lease_seconds=DEFAULT_LEASE_SECONDS,
+                              model_memory_mb=None):
+    """
+    Обрабатывает файлы папки через общую очередь (transcriptions/.jobs.sqlite), так что
+    несколько запусков — на одной машине или на разных машинах с общей папкой —
+    делят файлы между собой, а не распознают каждый всё. Запуск берёт файлы в аренду
+    и продлевает её, пока работает; файлы упавшего запуска после истечения аренды
+    забирают другие. Текст пишется в transcriptions/.staging/<машина>-<pid>/ — свою
+    папку каждого запуска — и переносится в transcriptions/ только владельцем аренды.
+    Черновики завершившихся запусков этой машины новый запуск забирает себе, а свою
+    папку удаляет при выходе. Запуск завершается, когда в очереди не остаётся
+    ни ожидающих, ни обрабатываемых файлов.
+    """
+    if not os.path.exists(model_path):
+        print("Модель не найдена. Проверьте путь.")
+        return
+
+    if not ffmpeg_available():
+        print("ffmpeg не найден. Установите ffmpeg и добавьте его в PATH.")
+        return
+
+    create_directory(output_dir)
+    host = socket.gethostname()
+    owner = f"{host}:{os.getpid()}"
+    # Черновики каждого запуска — в своей папке: запуск, у которого забрали просроченную аренду,
+    # не пишет в тот же .part, что и новый владелец файла
+    staging_root = os.path.join(output_dir, ".staging")
+    staging_dir = os.path.join(staging_root, f"{host}-{os.getpid()}")
+    create_directory(staging_dir)
+    adopted = adopt_staging(staging_root, host, staging_dir)
+    if adopted:
+        print(f"Забрано черновиков завершившихся запусков: {adopted}")
+
+    db_path = os.path.join(output_dir, ".jobs.sqlite")
+    queue = JobQueue(db_path, folder_path, lease_seconds)
+    media_names = sorted(f for f in os.listdir(folder_path) if f.lower().endswith(MEDIA_EXTENSIONS))
+    added = queue.add(media_names)
+    workers, per_worker_mb, available_mb = plan_workers(workers, model_path, model_memory_mb)
+    print(
+        f"Очередь: {db_path}, добавлено файлов: {added}, запуск {owner}, процессов: {workers} "
+        f"(память на процесс ~{format_mb(per_worker_mb)}, доступно {format_mb(available_mb)})"
+    )
+
+    keeper = LeaseKeeper(db_path, folder_path, owner, lease_seconds)
+    keeper.start()
+    worker_stats = {}
+    done_here = 0
+    in_flight = {}
+    broken = None
+    try:
+        with ProcessPoolExecutor(max_workers=workers, initializer=init_worker, initargs=(model_path,)) as executor:
+            while True:
+                while broken is None and len(in_flight) < workers:
+                    media_name = queue.claim(owner)
+                    if media_name is None:
+                        break
+                    keeper.add(media_name)
+                    try:
+                        future = executor.submit(
+                            process_video_in_worker, os.path.join(folder_path, media_name), staging_dir,
+                            vad_options, checkpoint_interval,
+                        )
+                    except BrokenProcessPool as e:
+                        # Процесс-обработчик умер: файл сразу возвращается в очередь, а не ждёт конца аренды
+                        broken = e
+                        keeper.discard(media_name)
+                        queue.fail(media_name, owner, f"пул процессов остановлен: {e}")
+                        break
+                    in_flight[future] = media_name
+
+                if broken is not None and not in_flight:
+                    break
+                if not in_flight:
+                    counts = queue.counts()
+                    if not counts.get("pending") and not counts.get("running"):
+                        break
+                    # Остальные файлы в работе у других запусков: ждём, не освободится ли чья-то аренда
+                    time.sleep(min(lease_seconds / 3, 10.0))
+                    continue
+
+                done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                for future in done:
+                    media_name = in_flight.pop(future)
+                    keeper.discard(media_name)
+                    try:
+                        message, staged_path, stats = future.result()
+                        worker_stats[stats["pid"]] = stats
+                    except BrokenProcessPool as e:
+                        # Новые файлы в сломанный пул не берутся: они только потратили бы попытку
+                        broken = e
+                        message, staged_path = f"Ошибка при обработке файла {media_name}: {e}", None
+                    except Exception as e:
+                        message, staged_path = f"Ошибка при обработке файла {media_name}: {e}", None
+
+                    if staged_path is None:
+                        queue.fail(media_name, owner, message)
+                        print(message)
+                        continue
+
+                    output_path = transcription_path(media_name, output_dir)
+                    if queue.complete(media_name, owner, staged_path, output_path):
+                        done_here += 1
+                        print(message.replace(staged_path, output_path))
+                    else:
+                        print(f"Файл {media_name} уже обработал другой запуск, результат отброшен.")
+    finally:
+        keeper.stop()
+        # Прерванный запуск (Ctrl+C, ошибка) сразу возвращает свои файлы в очередь;
+        # их черновики остаются в staging_dir и достанутся следующему запуску этой машины
+        for media_name in in_flight.values():
+            queue.fail(media_name, owner, "запуск прерван")
 
-    for result in results:
-        print(result)
+    if broken is not None:
+        print(f"Пул процессов-обработчиков остановился ({broken}); оставшиеся файлы возвращены в очередь.")
+    else:
+        # Пул отработал до конца: черновики неудавшихся файлов этому запуску больше не нужны
+        shutil.rmtree(staging_dir, ignore_errors=True)
+    counts = queue.counts()
+    queue.close()
+    print(
+        f"\nОбработано этим запуском: {done_here}. Очередь: готово {counts.get('done', 0)}, "
+        f"с ошибкой {counts.get('failed', 0)}, всего {sum(counts.values())}"
+    )
+    print_worker_stats(worker_stats)
+
+def print_watch_stats(stats, queued, in_flight):
+    """
+    Выводит состояние режима наблюдения: глубину очереди, задержку и пропускную способность.
+    """
+    elapsed = time.monotonic() - stats["started"]
+    latencies = stats["latencies"]
+    average_latency = sum(latencies) / len(latencies) if latencies else 0.0
+    last_latency = latencies[-1] if latencies else 0.0
+    print(
+        f"[{time.strftime('%H:%M:%S')}] в очереди: {queued}, в работе: {in_flight}, "
+        f"готово: {stats['done']}, ошибок: {stats['failed']}, "
+        f"задержка: средняя {average_latency:.0f} с, последняя {last_latency:.0f} с, "
+        f"пропускная способность: {stats['done'] / elapsed * 3600:.1f} файлов/ч"
+    )
+
+def watch_and_transcribe(folder_path, model_path, output_dir, workers=1, vad_options=None, cache=None,
+                         checkpoint_interval=CHECKPOINT_INTERVAL, stable_seconds=5.0, use_polling=False,
+                         stats_interval=60.0, model_memory_mb=None):
+    """
+    Режим наблюдения: не завершается, а ждёт новые файлы в папке и распознаёт их пулом
+    процессов с загруженной моделью. Файл берётся в работу, когда он полностью записан;
+    каждый файл обрабатывается один раз (журнал transcriptions/.processed.json).
+    Состояние очереди выводится каждые stats_interval секунд. Остановка — Ctrl+C.
+    """
+    if not os.path.exists(model_path):
+        print("Модель не найдена. Проверьте путь.")
+        return
+
+    if not ffmpeg_available():
+        print("ffmpeg не найден. Установите ffmpeg и добавьте его в PATH.")
+        return
+
+    create_directory(output_dir)
+    ledger = ProcessedLedger(os.path.join(output_dir, ".processed.json"))
+    watcher = create_watcher(folder_path, MEDIA_EXTENSIONS, stable_seconds, use_polling)
+    settings = {"vad": vad_options, "split": None}
+    workers, _, _ = plan_workers(workers, model_path, model_memory_mb)
+
+    print(f"Наблюдение за папкой {folder_path} ({watcher.name}), процессов: {workers}. Остановка — Ctrl+C.")
+
+    # Очередь готовых файлов: (путь, когда файл признан записанным)
+    queue = deque()
+    in_flight = {}
+    known = set()
+    stats = {"started": time.monotonic(), "done": 0, "failed": 0, "latencies": deque(maxlen=100)}
+    last_report = time.monotonic()
+
+    def finish(media_path, detected, text_file_path, key):
+        """
+        Фиксирует обработанный файл в журнале и кэше.
+        """
+        known.discard(media_path)
+        if text_file_path is None:
+            stats["failed"] += 1
+            return
+        ledger.mark(media_path, text_file_path)
+        if cache is not None and key is not None:
+            with open(text_file_path, "r", encoding="utf-8") as text_file:
+                cache.put(key, text_file.read(), media_path)
+            cache.save()
+        stats["done"] += 1
+        stats["latencies"].append(time.monotonic() - detected)
+
+    executor = ProcessPoolExecutor(max_workers=workers, initializer=init_worker, initargs=(model_path,))
+    # Сколько раз подряд пул пришлось создавать заново без единого обработанного файла
+    restarts = 0
+    try:
+        while True:
+            for media_path in watcher.poll(timeout=1.0):
+                if media_path in known or ledger.contains(media_path):
+                    continue
+                known.add(media_path)
+                queue.append((media_path, time.monotonic()))
+
+            while queue and len(in_flight) < workers:
+                media_path, detected = queue.popleft()
+                key = None
+                if cache is not None:
+                    key = make_cache_key(cache.content_hash(media_path), model_path, settings)
+                    text = cache.get(key)
+                    if text is not None:
+                        text_file_path = write_transcription(media_path, output_dir, text)
+                        print(f"Взято из кэша: {media_path} -> {text_file_path}")
+                        finish(media_path, detected, text_file_path, None)
+                        cache.save()
+                        continue
+                try:
+                    future = executor.submit(
+                        process_video_in_worker, media_path, output_dir, vad_options, checkpoint_interval
+                    )
+                except BrokenProcessPool as e:
+                    # Процесс-обработчик умер: файл возвращается в начало очереди, пул создаётся заново.
+                    # Если пул ломается снова, не обработав ни одного файла (например, модель не
+                    # загружается), наблюдение останавливается
+                    queue.appendleft((media_path, detected))
+                    restarts += 1
+                    if restarts > MAX_POOL_RESTARTS:
+                        raise
+                    print(f"Пул процессов-обработчиков остановился ({e}), запускаем заново")
+                    executor.shutdown(wait=False, cancel_futures=True)
+                    executor = ProcessPoolExecutor(max_workers=workers, initializer=init_worker, initargs=(model_path,))
+                    continue
+                in_flight[future] = (media_path, detected, key)
+
+            for future in [future for future in in_flight if future.done()]:
+                media_path, detected, key = in_flight.pop(future)
+                try:
+                    message, text_file_path, _ = future.result()
+                    restarts = 0
+                except Exception as e:
+                    message, text_file_path = f"Ошибка при обработке файла {media_path}: {e}", None
+                print(message)
+                finish(media_path, detected, text_file_path, key)
+
+            if time.monotonic() - last_report >= stats_interval:
+                print_watch_stats(stats, len(queue), len(in_flight))
+                last_report = time.monotonic()
+
+    except KeyboardInterrupt:
+        print("\nОстановка наблюдения...")
+
+    finally:
+        watcher.close()
+        executor.shutdown(wait=False, cancel_futures=True)
+        print_watch_stats(stats, len(queue), len(in_flight))
+
+def parse_args(argv=None):
+    """
+    Разбирает аргументы командной строки.
+    """
+    parser = argparse.ArgumentParser(description="Распознаёт речь во всех видео- и аудиофайлах папки с помощью Vosk.")
+    parser.add_argument("folder", nargs="?", default=os.getcwd(), help="Папка с файлами (по умолчанию — текущая).")
+    parser.add_argument("--model", default=DEFAULT_MODEL_PATH, help="Путь к модели Vosk.")
+    parser.add_argument(
+        "--workers", type=int, default=min(2, os.cpu_count() or 1),
+        help="Количество процессов-обработчиков. Каждый процесс держит в памяти свою копию модели.",
+    )
+    parser.add_argument(
+        "--model-memory-mb", type=float, default=None,
+        help="Сколько памяти занимает один процесс с моделью, в МБ (по умолчанию — оценка по размеру модели). "
+             "Число процессов уменьшается, если им не хватит свободной памяти.",
+    )
+    parser.add_argument(
+        "--fast-model", default=None,
+        help="Двухступенчатый режим: сначала распознавать этой (маленькой) моделью, "
+             "а фразы с низкой уверенностью — заново моделью --model.",
+    )
+    parser.add_argument(
+        "--vocabulary", default=None,
+        help="Файл словаря (фраза на строку): первая ступень распознаёт только эти фразы, "
+             "остальное — модель --model. По умолчанию берётся <папка>/vocabulary.txt, если он есть.",
+    )
+    parser.add_argument("--no-vocabulary", action="store_true", help="Не использовать vocabulary.txt из папки.")
+    parser.add_argument(
+        "--escalate-confidence", type=float, default=0.8,
+        help="Фразы со средней уверенностью слов ниже этого порога передаются большой модели (по умолчанию 0.8).",
+    )
+    parser.add_argument("--vad", action="store_true", help="Вырезать паузы и тишину перед распознаванием.")
+    parser.add_argument(
+        "--vad-threshold-db", type=float, default=-40.0,
+        help="Уровень в dBFS, ниже которого звук считается тишиной (по умолчанию -40).",
+    )
+    parser.add_argument(
+        "--vad-min-silence", type=float, default=1.0,
+        help="Паузы короче этого значения в секундах не вырезаются (по умолчанию 1.0).",
+    )
+    parser.add_argument(
+        "--vad-padding", type=float, default=0.3,
+        help="Сколько секунд тишины оставлять до и после речи (по умолчанию 0.3).",
+    )
+    parser.add_argument(
+        "--split", action="store_true",
+        help="Делить длинные записи по паузам на части и распознавать их параллельно.",
+    )
+    parser.add_argument(
+        "--split-min-segment", type=float, default=300.0,
+        help="Минимальная длина части в секундах (по умолчанию 300).",
+    )
+    parser.add_argument(
+        "--split-max-parallel", type=int, default=None,
+        help="Максимальное количество частей одного файла (по умолчанию — число процессов).",
+    )
+    parser.add_argument(
+        "--checkpoint-interval", type=float, default=CHECKPOINT_INTERVAL,
+        help=f"Как часто (в секундах записи) сохранять контрольную точку (по умолчанию {CHECKPOINT_INTERVAL:.0f}).",
+    )
+    parser.add_argument(
+        "--watch", action="store_true",
+        help="Не завершаться: следить за папкой и распознавать новые файлы по мере появления.",
+    )
+    parser.add_argument("--watch-polling", action="store_true", help="Следить за папкой опросом, без inotify.")
+    parser.add_argument(
+        "--watch-stable-seconds", type=float, default=5.0,
+        help="При опросе: сколько секунд файл должен не меняться, чтобы считаться записанным (по умолчанию 5).",
+    )
+    parser.add_argument(
+        "--watch-stats-interval", type=float, default=60.0,
+        help="Как часто выводить состояние очереди в режиме наблюдения, в секундах (по умолчанию 60).",
+    )
+    parser.add_argument(
+        "--queue", action="store_true",
+        help="Делить файлы папки с другими запусками (на этой или других машинах) через общую очередь "
+             "transcriptions/.jobs.sqlite.",
+    )
+    parser.add_argument(
+        "--queue-lease", type=float, default=DEFAULT_LEASE_SECONDS,
+        help="Через сколько секунд без продления файл упавшего запуска отдаётся другим "
+             f"(по умолчанию {DEFAULT_LEASE_SECONDS:.0f}).",
+    )
+    parser.add_argument("--no-cache", action="store_true", help="Не использовать кэш распознанных текстов.")
+    parser.add_argument("--cache-dir", default=DEFAULT_CACHE_DIR, help=f"Папка кэша (по умолчанию {DEFAULT_CACHE_DIR}).")
+    parser.add_argument(
+        "--cache-max-size", type=float, default=1024,
+        help="Максимальный размер кэша в МБ; при превышении удаляются давно не использованные записи.",
+    )
+    parser.add_argument("--cache-list", action="store_true", help="Показать записи кэша и выйти.")
+    parser.add_argument(
+        "--cache-prune", type=float, metavar="DAYS", default=None,
+        help="Удалить записи кэша, не использованные дольше DAYS дней, и выйти.",
+    )
+    return parser.parse_args(argv)
+
+def get_vad_options(args):
+    """
+    Собирает параметры SpeechFilter из аргументов командной строки.
+    Возвращает None, если отбрасывание тишины выключено.
+    """
+    if not args.vad:
+        return None
+    return {
+        "threshold_db": args.vad_threshold_db,
+        "min_silence": args.vad_min_silence,
+        "padding": args.vad_padding,
+    }
+
+def get_split_options(args):
+    """
+    Собирает параметры разбиения длинных записей из аргументов командной строки.
+    Возвращает None, если разбиение выключено.
+    """
+    if not args.split:
+        return None
+    return {
+        "min_segment": args.split_min_segment,
+        "max_parallel": args.split_max_parallel or args.workers,
+    }
+
+def get_tier_options(args, folder_path):
+    """
+    Собирает параметры двухступенчатого режима из аргументов командной строки.
+    Со словарём режим включается и без --fast-model: первой ступенью становится
+    модель --model с грамматикой. Возвращает None, если режим выключен.
+    """
+    vocabulary_path = args.vocabulary
+    if vocabulary_path is None and not args.no_vocabulary:
+        vocabulary_path = find_vocabulary(folder_path)
+    if not args.fast_model and not vocabulary_path:
+        return None
+
+    vocabulary = None
+    if vocabulary_path:
+        vocabulary = load_vocabulary(vocabulary_path)
+        print(f"Словарь: {vocabulary_path} ({len(vocabulary)} фраз)")
+    return {
+        "fast_model": args.fast_model or args.model,
+        "threshold": args.escalate_confidence,
+        "vocabulary": vocabulary,
+    }
+
+def print_cache_entries(cache):
+    """
+    Выводит записи кэша, начиная с недавно использованных.
+    """
+    entries = cache.entries()
+    print(f"Кэш: {cache.cache_dir}, записей: {len(entries)}, объём: {cache.total_bytes() / 1024:.0f} КБ")
+    for key, entry in entries:
+        last_used = time.strftime("%Y-%m-%d %H:%M", time.localtime(entry["last_used"]))
+        print(f"  {key[:12]}  {entry['size'] / 1024:8.1f} КБ  {last_used}  {entry['source']}")
 
 if __name__ == "__main__":
-    current_folder = os.getcwd()
-    model_path = "C:\\models\\!vosk!\\vosk-model-ru-0.42"
-    temp_dir = os.path.join(current_folder, "temp_files")
+    args = parse_args()
+
+    cache = None
+    if not args.no_cache or args.cache_list or args.cache_prune is not None:
+        cache = TranscriptionCache(args.cache_dir, max_bytes=int(args.cache_max_size * 1024 * 1024))
+    if args.cache_list or args.cache_prune is not None:
+        if args.cache_prune is not None:
+            removed, freed = cache.prune(max_age_days=args.cache_prune)
+            cache.save()
+            print(f"Удалено записей: {removed}, освобождено {freed / 1024:.0f} КБ")
+        if args.cache_list:
+            print_cache_entries(cache)
+        sys.exit(0)
+
+    current_folder = os.path.abspath(args.folder)
     output_dir = os.path.join(current_folder, "transcriptions")
 
-    print(f"Скрипт ищет видеофайлы в папке: {current_folder}")
-    process_videos_in_folder(current_folder, model_path, temp_dir, output_dir)
+    if args.watch:
+        watch_and_transcribe(
+            current_folder, args.model, output_dir,
+            workers=args.workers, vad_options=get_vad_options(args), cache=None if args.no_cache else cache,
+            checkpoint_interval=args.checkpoint_interval, stable_seconds=args.watch_stable_seconds,
+            use_polling=args.watch_polling, stats_interval=args.watch_stats_interval,
+            model_memory_mb=args.model_memory_mb,
+        )
+        sys.exit(0)
+
+    if args.queue:
+        process_videos_from_queue(
+            current_folder, args.model, output_dir,
+            workers=args.workers, vad_options=get_vad_options(args),
+            checkpoint_interval=args.checkpoint_interval, lease_seconds=args.queue_lease,
+            model_memory_mb=args.model_memory_mb,
+        )
+        sys.exit(0)
+
+    print(f"Скрипт ищет видео- и аудиофайлы в папке: {current_folder}")
+    process_videos_in_folder(
+        current_folder, args.model, output_dir,
+        workers=args.workers, vad_options=get_vad_options(args),
+        split_options=get_split_options(args), cache=None if args.no_cache else cache,
+        checkpoint_interval=args.checkpoint_interval, model_memory_mb=args.model_memory_mb,
+        tier_options=get_tier_options(args, current_folder),
+    )
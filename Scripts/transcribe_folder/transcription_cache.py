@@ -0,0 +1,174 @@
+"""
+Кэш распознанных текстов с адресацией по содержимому.
+
+Ключ записи — хэш содержимого медиафайла вместе с путём к модели и настройками
+распознавания, поэтому неизменённые, переименованные и дублирующиеся файлы
+берутся из кэша, а изменение модели или настроек даёт новый ключ.
+Хэши файлов запоминаются по (путь, размер, время изменения), чтобы при повторном
+запуске не читать неизменённые файлы заново.
+"""
+import os
+import json
+import time
+import hashlib
+
+DEFAULT_CACHE_DIR = os.path.join(os.path.expanduser("~"), ".cache", "transcribe_folder")
+DEFAULT_MAX_BYTES = 1024 * 1024 * 1024
+
+HASH_BLOCK_SIZE = 1024 * 1024
+
+def make_cache_key(content_hash, model_path, settings):
+    """
+    Строит ключ кэша из хэша содержимого, пути к модели и настроек распознавания.
+
+    :param settings: Словарь настроек, влияющих на результат (VAD, разбиение и т. п.)
+    """
+    key_source = json.dumps({
+        "content": content_hash,
+        "model": os.path.normcase(os.path.abspath(model_path)),
+        "settings": settings,
+    }, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(key_source.encode("utf-8")).hexdigest()
+
+class TranscriptionCache:
+    """
+    Кэш текстов в директории cache_dir с ограничением размера и вытеснением
+    давно не использованных записей (LRU).
+    """
+
+    def __init__(self, cache_dir=DEFAULT_CACHE_DIR, max_bytes=DEFAULT_MAX_BYTES):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.entries_dir = os.path.join(cache_dir, "entries")
+        self.index_path = os.path.join(cache_dir, "index.json")
+        self.hashes_path = os.path.join(cache_dir, "hashes.json")
+
+        os.makedirs(self.entries_dir, exist_ok=True)
+        self.index = self._load_json(self.index_path)
+        self.hashes = self._load_json(self.hashes_path)
+
+    @staticmethod
+    def _load_json(path):
+        try:
+            with open(path, "r", encoding="utf-8") as json_file:
+                return json.load(json_file)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return {}
+
+    @staticmethod
+    def _save_json(path, data):
+        # Запись через временный файл, чтобы прерванный запуск не испортил индекс
+        temp_path = path + ".tmp"
+        with open(temp_path, "w", encoding="utf-8") as json_file:
+            json.dump(data, json_file, ensure_ascii=False, indent=1)
+        os.replace(temp_path, path)
+
+    def save(self):
+        """
+        Сохраняет индекс кэша и запомненные хэши файлов на диск.
+        """
+        self._save_json(self.index_path, self.index)
+        self._save_json(self.hashes_path, self.hashes)
+
+    def _entry_path(self, key):
+        return os.path.join(self.entries_dir, key[:2], key + ".txt")
+
+    def content_hash(self, media_path):
+        """
+        Возвращает SHA-256 содержимого файла. Для файла, не изменившегося с прошлого
+        запуска, хэш берётся из памяти без чтения файла.
+        """
+        stat = os.stat(media_path)
+        hash_key = os.path.normcase(os.path.abspath(media_path))
+        known = self.hashes.get(hash_key)
+        if known and known["size"] == stat.st_size and known["mtime_ns"] == stat.st_mtime_ns:
+            return known["sha256"]
+
+        digest = hashlib.sha256()
+        with open(media_path, "rb") as media_file:
+            for block in iter(lambda: media_file.read(HASH_BLOCK_SIZE), b""):
+                digest.update(block)
+
+        content_hash = digest.hexdigest()
+        self.hashes[hash_key] = {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns, "sha256": content_hash}
+        return content_hash
+
+    def get(self, key):
+        """
+        Возвращает текст из кэша или None, если записи нет.
+        """
+        if key not in self.index:
+            return None
+        try:
+            with open(self._entry_path(key), "r", encoding="utf-8") as entry_file:
+                text = entry_file.read()
+        except FileNotFoundError:
+            del self.index[key]
+            return None
+        self.index[key]["last_used"] = time.time()
+        return text
+
+    def put(self, key, text, source):
+        """
+        Сохраняет текст в кэш и при превышении лимита вытесняет старые записи.
+
+        :param source: Имя исходного файла (только для вывода списка записей)
+        """
+        entry_path = self._entry_path(key)
+        os.makedirs(os.path.dirname(entry_path), exist_ok=True)
+        with open(entry_path, "w", encoding="utf-8") as entry_file:
+            entry_file.write(text)
+
+        now = time.time()
+        self.index[key] = {
+            "source": os.path.basename(source),
+            "size": os.path.getsize(entry_path),
+            "created": now,
+            "last_used": now,
+        }
+        self.prune()
+
+    def remove(self, key):
+        """
+        Удаляет запись из кэша и возвращает освобождённый объём в байтах.
+        """
+        entry = self.index.pop(key, None)
+        try:
+            os.remove(self._entry_path(key))
+        except FileNotFoundError:
+            pass
+        return entry["size"] if entry else 0
+
+    def total_bytes(self):
+        return sum(entry["size"] for entry in self.index.values())
+
+    def entries(self):
+        """
+        Возвращает список записей (ключ, данные), начиная с недавно использованных.
+        """
+        return sorted(self.index.items(), key=lambda item: item[1]["last_used"], reverse=True)
+
+    def prune(self, max_age_days=None):
+        """
+        Вытесняет давно не использованные записи, пока кэш не уложится в лимит размера.
+        Если задан max_age_days, сначала удаляет записи, не использованные дольше этого срока.
+
+        :return: Кортеж (удалено записей, освобождено байт)
+        """
+        removed, freed = 0, 0
+        if max_age_days is not None:
+            deadline = time.time() - max_age_days * 24 * 3600
+            for key, entry in list(self.index.items()):
+                if entry["last_used"] < deadline:
+                    freed += self.remove(key)
+                    removed += 1
+
+        total = self.total_bytes()
+        for key, entry in sorted(self.index.items(), key=lambda item: item[1]["last_used"]):
+            if total <= self.max_bytes:
+                break
+            size = self.remove(key)
+            total -= size
+            freed += size
+            removed += 1
+        return removed, freed
@@ -0,0 +1,108 @@
+"""
+Двухступенчатое распознавание: быстрая модель для всей записи, большая — только для сомнительных мест.
+
+Быстрая (маленькая) модель распознаёт запись целиком с уверенностью для каждого
+слова. Фразы со средней уверенностью ниже порога собираются в участки, которые
+заново распознаются большой моделью, и её слова заменяют слова быстрой модели
+на этих участках. Склейка — та же, что при разбиении записи на части: слово
+достаётся участку, в который попадает его середина.
+
+С ограниченным словарём первая ступень распознаёт речь по грамматике, и большой
+модели передаются также фразы, в которых встретилось слово вне словаря ("[unk]").
+"""
+from segmenter import stitch_segments
+
+# Слово, которым распознаватель с грамматикой обозначает всё, что не входит в словарь
+UNKNOWN_WORD = "[unk]"
+
+# Сколько секунд добавлять к сомнительной фразе с каждой стороны
+ESCALATION_PADDING = 0.5
+
+# Соседние участки с промежутком меньше этого значения в секундах объединяются
+ESCALATION_MERGE_GAP = 1.0
+
+def utterance_confidence(words):
+    """
+    Средняя уверенность слов фразы.
+
+    :param words: Список слов (слово, начало, конец, уверенность)
+    """
+    return sum(word[3] for word in words) / len(words)
+
+def find_escalation_spans(utterances, threshold, padding=ESCALATION_PADDING, merge_gap=ESCALATION_MERGE_GAP):
+    """
+    Находит участки записи, которые нужно распознать большой моделью.
+
+    :param utterances: Фразы быстрой модели по порядку; фраза — список слов (слово, начало, конец, уверенность)
+    :param threshold: Фразы со средней уверенностью ниже порога передаются большой модели
+                      (как и фразы со словами вне словаря)
+    :return: Список пар (начало, конец) в секундах исходной записи
+    """
+    spans = []
+    for words in utterances:
+        if not words:
+            continue
+        has_unknown = any(word[0] == UNKNOWN_WORD for word in words)
+        if not has_unknown and utterance_confidence(words) >= threshold:
+            continue
+        start = max(0.0, words[0][1] - padding)
+        end = words[-1][2] + padding
+        if spans and start - spans[-1][1] <= merge_gap:
+            spans[-1][1] = max(spans[-1][1], end)
+        else:
+            spans.append([start, end])
+    return [tuple(span) for span in spans]
+
+def merge_tiers(fast_utterances, escalated):
+    """
+    Собирает текст из слов быстрой модели, заменяя их на участках escalated словами большой модели.
+
+    :param fast_utterances: Фразы быстрой модели; слово — (слово, начало, конец, уверенность)
+    :param escalated: Список (начало, конец, фразы большой модели) по порядку; слово — (слово, начало, конец)
+    :return: Текст, по фразе на строку
+    """
+    fast = [[word[:3] for word in words if word[0] != UNKNOWN_WORD] for words in fast_utterances]
+    segments = []
+    position = 0.0
+    for start, end, utterances in escalated:
+        segments.append((position, start, fast))
+        segments.append((start, end, utterances))
+        position = end
+    segments.append((position, None, fast))
+    return stitch_segments(segments)
+
+def format_two_tier_report(stats):
+    """
+    Формирует отчёт двухступенчатого режима: долю записи, переданную большой модели,
+    и процессорное время по сравнению с распознаванием только большой моделью.
+
+    :param stats: Словарь со значениями "audio_seconds" (вся запись), "escalated_seconds"
+                  (участки для большой модели), "decoded_seconds" (сколько большая модель
+                  декодировала вместе с перекрытием), "fast_cpu" и "large_cpu" (секунды процессора),
+                  "words" и "unknown_words" (слова первой ступени и из них вне словаря)
+                  и "vocabulary_size" (размер словаря или None)
+    """
+    audio_seconds = stats["audio_seconds"]
+    escalated_share = stats["escalated_seconds"] / audio_seconds if audio_seconds else 0.0
+    total_cpu = stats["fast_cpu"] + stats["large_cpu"]
+    lines = [
+        "\nДвухступенчатое распознавание:",
+        f"  Передано большой модели: {escalated_share:.1%} записи "
+        f"({stats['escalated_seconds']:.0f} с из {audio_seconds:.0f} с)",
+        f"  Процессорное время: быстрая модель {stats['fast_cpu']:.1f} с, "
+        f"большая модель {stats['large_cpu']:.1f} с, всего {total_cpu:.1f} с",
+    ]
+    if stats["decoded_seconds"] > 0 and stats["large_cpu"] > 0:
+        # Скорость большой модели измерена на переданных ей участках
+        large_only = stats["large_cpu"] / stats["decoded_seconds"] * audio_seconds
+        saved = 1 - total_cpu / large_only
+        lines.append(f"  Только большой моделью потребовалось бы ~{large_only:.1f} с, экономия ~{saved:.0%}")
+    else:
+        lines.append("  Большой модели ничего не передано, сравнить скорость не с чем")
+    if stats.get("vocabulary_size") is not None:
+        unknown_share = stats["unknown_words"] / stats["words"] if stats["words"] else 0.0
+        lines.append(
+            f"  Словарь: {stats['vocabulary_size']} фраз, вне словаря {unknown_share:.1%} слов первой ступени "
+            f"({stats['unknown_words']} из {stats['words']}); они распознаны большой моделью"
+        )
+    return "\n".join(lines)
@@ -0,0 +1,149 @@
+"""
+Отбрасывание тишины перед распознаванием (VAD по энергии сигнала).
+
+Поток PCM режется на кадры по 30 мс, для каждого кадра считается уровень в dBFS.
+Паузы длиннее min_silence вырезаются, по краям речи остаётся padding секунд
+тишины, чтобы распознаватель корректно завершал фразы. Карта времени позволяет
+перевести время в отфильтрованном потоке обратно во время исходной записи.
+"""
+import bisect
+from collections import deque
+
+import numpy as np
+
+from audio_source import CHUNK_BYTES, SAMPLE_RATE, SAMPLE_WIDTH
+
+FRAME_SECONDS = 0.03
+FRAME_SAMPLES = int(SAMPLE_RATE * FRAME_SECONDS)
+FRAME_BYTES = FRAME_SAMPLES * SAMPLE_WIDTH
+
+def frame_levels(frames, frame_samples=FRAME_SAMPLES):
+    """
+    Возвращает уровень каждого кадра в dBFS.
+
+    :param frames: Байты PCM s16le, длина кратна размеру кадра
+    :param frame_samples: Количество сэмплов в кадре
+    """
+    samples = np.frombuffer(frames, dtype=np.int16).reshape(-1, frame_samples).astype(np.float32)
+    rms = np.sqrt(np.mean(samples * samples, axis=1))
+    return 20 * np.log10(np.maximum(rms, 1.0) / 32768.0)
+
+class SpeechFilter:
+    """
+    Потоковый фильтр, пропускающий в распознаватель только участки с речью.
+
+    :param threshold_db: Порог уровня кадра в dBFS, выше которого кадр считается речью
+    :param min_silence: Минимальная длительность паузы в секундах, которая вырезается
+    :param padding: Сколько секунд тишины оставлять до и после речи
+    """
+
+    def __init__(self, threshold_db=-40.0, min_silence=1.0, padding=0.3):
+        self.threshold_db = threshold_db
+        self.padding_frames = max(1, round(padding / FRAME_SECONDS))
+        # Паузу короче двух отступов вырезать бессмысленно
+        self.min_silence_frames = max(round(min_silence / FRAME_SECONDS), 2 * self.padding_frames)
+
+        self.input_frames = 0
+        self.output_frames = 0
+        # Карта времени: пары (начало участка в выходном потоке, начало в исходном), в кадрах
+        self._map_output = []
+        self._map_input = []
+        self._next_input_frame = None
+
+    @property
+    def input_seconds(self):
+        return self.input_frames * FRAME_SECONDS
+
+    @property
+    def output_seconds(self):
+        return self.output_frames * FRAME_SECONDS
+
+    @property
+    def skipped_fraction(self):
+        """
+        Доля исходного аудио, не переданная в распознаватель.
+        """
+        if self.input_frames == 0:
+            return 0.0
+        return 1.0 - self.output_frames / self.input_frames
+
+    def map_time(self, output_seconds):
+        """
+        Переводит время в отфильтрованном потоке во время исходной записи.
+        """
+        if not self._map_output:
+            return output_seconds
+        output_frame = output_seconds / FRAME_SECONDS
+        index = max(0, bisect.bisect_right(self._map_output, output_frame) - 1)
+        return (self._map_input[index] + output_frame - self._map_output[index]) * FRAME_SECONDS
+
+    def _emit(self, input_frame, frame, output):
+        """
+        Добавляет кадр в выходной поток и при разрыве дописывает точку в карту времени.
+        """
+        if input_frame != self._next_input_frame:
+            self._map_output.append(self.output_frames)
+            self._map_input.append(input_frame)
+        self._next_input_frame = input_frame + 1
+        self.output_frames += 1
+        output.append(frame)
+
+    def filter(self, chunks):
+        """
+        Принимает блоки PCM и отдаёт блоки, из которых вырезаны длинные паузы.
+        """
+        pending = b""
+        output = []
+        speech_seen = False
+        # Текущая пауза: первые padding кадров (хвост после речи) и последние кадры
+        # (нужны целиком, если пауза окажется короче min_silence)
+        silence_head = []
+        silence_tail = deque(maxlen=self.min_silence_frames)
+        silence_length = 0
+
+        for chunk in chunks:
+            pending += chunk
+            frame_count = len(pending) // FRAME_BYTES
+            if frame_count == 0:
+                continue
+            frames = pending[:frame_count * FRAME_BYTES]
+            pending = pending[frame_count * FRAME_BYTES:]
+
+            levels = frame_levels(frames)
+            for i, level in enumerate(levels):
+                input_frame = self.input_frames
+                self.input_frames += 1
+                frame = frames[i * FRAME_BYTES:(i + 1) * FRAME_BYTES]
+
+                if level < self.threshold_db:
+                    if speech_seen and len(silence_head) < self.padding_frames:
+                        silence_head.append((input_frame, frame))
+                    silence_tail.append((input_frame, frame))
+                    silence_length += 1
+                    continue
+
+                if speech_seen and silence_length <= self.min_silence_frames:
+                    # Короткая пауза внутри речи остаётся целиком
+                    kept_silence = list(silence_tail)
+                else:
+                    kept_silence = silence_head + list(silence_tail)[-self.padding_frames:]
+                for silent_frame in kept_silence:
+                    self._emit(*silent_frame, output)
+                self._emit(input_frame, frame, output)
+
+                speech_seen = True
+                silence_head = []
+                silence_tail.clear()
+                silence_length = 0
+
+            if len(output) * FRAME_BYTES >= CHUNK_BYTES:
+                yield b"".join(output)
+                output = []
+
+        # Хвост паузы после последней речи и неполный последний кадр
+        if speech_seen:
+            for silent_frame in silence_head:
+                self._emit(*silent_frame, output)
+        self.input_frames += len(pending) / FRAME_BYTES
+        if output:
+            yield b"".join(output)
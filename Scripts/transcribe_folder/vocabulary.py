@@ -0,0 +1,43 @@
+"""
+Словарь предметной области для распознавания с ограниченной грамматикой.
+
+Словарь — текстовый файл, по фразе или слову на строку (строки с # пропускаются).
+Из него строится грамматика Vosk: список фраз и "[unk]" для всего, что в словарь
+не входит. Распознаватель с грамматикой ищет только среди этих фраз и работает
+заметно быстрее; участки с "[unk]" затем распознаются полной моделью.
+Грамматику поддерживают модели с динамическим графом (как правило, маленькие).
+"""
+import os
+import json
+
+from two_tier import UNKNOWN_WORD
+
+# Файл словаря, который подхватывается из папки с записями, если словарь не указан явно
+FOLDER_VOCABULARY_NAME = "vocabulary.txt"
+
+def find_vocabulary(folder_path):
+    """
+    Возвращает путь к словарю в папке с записями или None, если его там нет.
+    """
+    path = os.path.join(folder_path, FOLDER_VOCABULARY_NAME)
+    return path if os.path.isfile(path) else None
+
+def load_vocabulary(path):
+    """
+    Читает словарь: фразы в нижнем регистре без повторов, в порядке появления в файле.
+    """
+    phrases = []
+    seen = set()
+    with open(path, "r", encoding="utf-8-sig") as vocabulary_file:
+        for line in vocabulary_file:
+            phrase = " ".join(line.split()).lower()
+            if phrase and not phrase.startswith("#") and phrase not in seen:
+                seen.add(phrase)
+                phrases.append(phrase)
+    return phrases
+
+def make_grammar(phrases):
+    """
+    Строит строку грамматики для KaldiRecognizer.
+    """
+    return json.dumps(phrases + [UNKNOWN_WORD], ensure_ascii=False)
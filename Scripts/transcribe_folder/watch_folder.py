@@ -0,0 +1,198 @@
+"""
+Наблюдение за папкой: сообщает о файлах, которые полностью записаны.
+
+На Linux используется inotify (событие закрытия файла после записи или переноса
+в папку), на остальных системах — периодический опрос: файл считается готовым,
+когда его размер и время изменения не меняются stable_seconds секунд.
+Журнал обработанных файлов гарантирует, что каждый файл распознаётся один раз,
+в том числе после перезапуска.
+"""
+import os
+import sys
+import json
+import time
+import errno
+import select
+import struct
+import ctypes
+import ctypes.util
+
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_NONBLOCK = 0o4000
+INOTIFY_EVENT_HEADER = struct.Struct("iIII")
+
+def file_signature(path):
+    """
+    Возвращает (размер, время изменения) файла или None, если файла уже нет.
+    """
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return stat.st_size, stat.st_mtime_ns
+
+class PollingWatcher:
+    """
+    Находит готовые файлы периодическим опросом папки.
+
+    :param folder: Папка для наблюдения
+    :param extensions: Кортеж расширений файлов, которые нужно отслеживать
+    :param stable_seconds: Сколько секунд файл должен не меняться, чтобы считаться записанным
+    """
+
+    name = "опрос"
+
+    def __init__(self, folder, extensions, stable_seconds=5.0):
+        self.folder = folder
+        self.extensions = extensions
+        self.stable_seconds = stable_seconds
+        # {путь: (подпись, когда подпись последний раз менялась)}
+        self.candidates = {}
+        self.reported = {}
+
+    def _list_files(self):
+        return [
+            os.path.join(self.folder, name) for name in os.listdir(self.folder)
+            if name.lower().endswith(self.extensions)
+        ]
+
+    def _scan(self, paths):
+        """
+        Возвращает файлы из paths, которые не менялись stable_seconds секунд.
+        """
+        now = time.monotonic()
+        ready = []
+        for path in paths:
+            signature = file_signature(path)
+            if signature is None or self.reported.get(path) == signature:
+                continue
+
+            known = self.candidates.get(path)
+            if known is None or known[0] != signature:
+                self.candidates[path] = (signature, now)
+            elif now - known[1] >= self.stable_seconds:
+                del self.candidates[path]
+                self.reported[path] = signature
+                ready.append(path)
+        return ready
+
+    def poll(self, timeout):
+        """
+        Ждёт до timeout секунд и возвращает список готовых файлов.
+        """
+        ready = self._scan(self._list_files())
+        if not ready:
+            time.sleep(timeout)
+        return ready
+
+    def close(self):
+        pass
+
+class InotifyWatcher(PollingWatcher):
+    """
+    Находит готовые файлы по событиям inotify (только Linux). Файлы, которые уже лежали
+    в папке при запуске, проверяются так же, как при опросе.
+    """
+
+    name = "inotify"
+
+    def __init__(self, folder, extensions, stable_seconds=5.0):
+        super().__init__(folder, extensions, stable_seconds)
+        libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+        self.fd = libc.inotify_init1(IN_NONBLOCK)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 завершился с ошибкой")
+        if libc.inotify_add_watch(self.fd, os.fsencode(folder), IN_CLOSE_WRITE | IN_MOVED_TO) < 0:
+            os.close(self.fd)
+            raise OSError(ctypes.get_errno(), f"не удалось наблюдать за {folder}")
+        # Уже существующие файлы досматриваются опросом, пока все не будут признаны готовыми
+        self.initial = set(self._list_files())
+
+    def _read_events(self):
+        ready = []
+        try:
+            buffer = os.read(self.fd, 64 * 1024)
+        except OSError as e:
+            if e.errno == errno.EAGAIN:
+                return ready
+            raise
+        position = 0
+        while position < len(buffer):
+            _, _, _, name_length = INOTIFY_EVENT_HEADER.unpack_from(buffer, position)
+            position += INOTIFY_EVENT_HEADER.size
+            name = os.fsdecode(buffer[position:position + name_length].rstrip(b"\0"))
+            position += name_length
+            if name.lower().endswith(self.extensions):
+                path = os.path.join(self.folder, name)
+                signature = file_signature(path)
+                if signature is not None and self.reported.get(path) != signature:
+                    self.reported[path] = signature
+                    self.initial.discard(path)
+                    ready.append(path)
+        return ready
+
+    def poll(self, timeout):
+        ready = []
+        if self.initial:
+            ready = self._scan(sorted(self.initial))
+            self.initial.difference_update(ready)
+            self.initial = {path for path in self.initial if os.path.exists(path)}
+
+        readable, _, _ = select.select([self.fd], [], [], 0 if ready else timeout)
+        if readable:
+            ready += self._read_events()
+        return ready
+
+    def close(self):
+        os.close(self.fd)
+
+def create_watcher(folder, extensions, stable_seconds=5.0, use_polling=False):
+    """
+    Создаёт наблюдателя за папкой: inotify на Linux, иначе — опрос.
+    """
+    if not use_polling and sys.platform.startswith("linux"):
+        try:
+            return InotifyWatcher(folder, extensions, stable_seconds)
+        except OSError as e:
+            print(f"inotify недоступен ({e}), используется опрос папки.")
+    return PollingWatcher(folder, extensions, stable_seconds)
+
+class ProcessedLedger:
+    """
+    Журнал обработанных файлов: имя, размер и время изменения каждого файла,
+    текст для которого уже сохранён. Хранится в JSON рядом с результатами.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        try:
+            with open(path, "r", encoding="utf-8") as ledger_file:
+                self.entries = json.load(ledger_file)
+        except (FileNotFoundError, json.JSONDecodeError):
+            self.entries = {}
+
+    def _key(self, media_path):
+        return os.path.normcase(os.path.abspath(media_path))
+
+    def contains(self, media_path):
+        """
+        Проверяет, обработан ли файл в текущем виде (изменённый файл обрабатывается заново).
+        """
+        entry = self.entries.get(self._key(media_path))
+        signature = file_signature(media_path)
+        return entry is not None and signature is not None and tuple(entry["signature"]) == signature
+
+    def mark(self, media_path, text_file_path):
+        """
+        Отмечает файл обработанным и сразу сохраняет журнал.
+        """
+        self.entries[self._key(media_path)] = {
+            "signature": list(file_signature(media_path) or ()),
+            "output": text_file_path,
+            "done": time.time(),
+        }
+        temp_path = self.path + ".tmp"
+        with open(temp_path, "w", encoding="utf-8") as ledger_file:
+            json.dump(self.entries, ledger_file, ensure_ascii=False, indent=1)
+        os.replace(temp_path, self.path)
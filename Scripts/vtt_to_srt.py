@@ -0,0 +1,432 @@
+"""
+Конвертация субтитров WebVTT (.vtt) в SubRip (.srt) без запуска ffmpeg.
+
+download_subtitles раньше запускал ffmpeg на каждый файл; на плейлистах в тысячи
+видео почти всё время уходило на запуск процессов. Здесь тот же разбор, что у
+ffmpeg (демультиплексор webvtt, декодер webvtt и кодировщик subrip), сделан
+построчно на Python, а папка обрабатывается пулом процессов:
+
+- блоки заголовка (WEBVTT, NOTE, STYLE, REGION) пропускаются, идентификаторы
+  и настройки реплик (align:start position:0% и т.п.) отбрасываются;
+- теги <i>, <b>, <u> сохраняются (незакрытые закрываются в конце реплики),
+  остальные теги (<c>, <v>, временные метки <00:00:01.000>) удаляются,
+  сущности &amp; &lt; &gt; &lrm; &rlm; раскрываются, пробелы в начале текста
+  реплики отбрасываются;
+- реплики сортируются по времени начала, подряд идущие полные повторы удаляются;
+  упорядоченный файл (как у YouTube) пишется потоком, по одной реплике, а файл
+  с репликами не по порядку читается повторно и сортируется целиком;
+- строки внутри реплики разделяются \\r\\n, остальные — \\n, как в выводе ffmpeg.
+
+С txt_dir (в командной строке --txt) тот же проход сразу чистит .srt — удаляет
+текст в квадратных скобках и повторы бегущих автоматических субтитров — и пишет .txt.
+
+Отличия от ffmpeg намеренные: &nbsp; становится пробелом, а символы { и \\
+выводятся как есть (ffmpeg экранирует их для ASS и оставляет экранирование в .srt).
+На некорректных файлах результат тоже расходится: разбор останавливается на
+отрицательной метке времени, а у последней реплики с концом раньше начала конец
+остаётся как в файле (ffmpeg выводит длительность, переполненную до ~1193 часов).
+Режим --compare сравнивает результат с ffmpeg побайтно на своей папке.
+
+Примеры:
+    python vtt_to_srt.py subtitles --workers 4
+    python vtt_to_srt.py subtitles --txt subtitles/TXT
+    python vtt_to_srt.py subtitles --compare
+"""
+import os
+import re
+import sys
+import argparse
+import tempfile
+import subprocess
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+# Перевод строки внутри текста реплики — как у кодировщика SubRip в ffmpeg
+CUE_LINE_BREAK = "\r\n"
+
+# Замены декодера webvtt: проверяются по порядку в каждой позиции текста
+TAG_REPLACEMENTS = {
+    "<i>": ("open", "i"), "</i>": ("close", "i"),
+    "<b>": ("open", "b"), "</b>": ("close", "b"),
+    "<u>": ("open", "u"), "</u>": ("close", "u"),
+    "&gt;": ">", "&lt;": "<",
+    "&lrm;": "\u200e", "&rlm;": "\u200f",
+    "&amp;": "&", "&nbsp;": " ",
+}
+# Текст реплики делится на замены, отдельные служебные символы и куски обычного текста между ними
+CUE_TOKEN_RE = re.compile(
+    "|".join(re.escape(source) for source in TAG_REPLACEMENTS) + r"|[<>\n\r&]|[^<>\n\r&]+"
+)
+HEADER_PREFIXES = ("WEBVTT", "STYLE", "REGION", "NOTE")
+
+TAG_RE = re.compile(r"<[^>]*>")
+BRACKETED_RE = re.compile(r"\[.*?\]")
+# Сколько последних слов помнит дедупликация бегущих субтитров и минимальное учитываемое перекрытие
+ROLLING_WINDOW_WORDS = 64
+MIN_ROLLING_OVERLAP = 3
+
+def parse_timestamp(text):
+    """
+    Разбирает метку времени WebVTT (чч:мм:сс.ттт или мм:сс.ттт) в миллисекунды.
+    Возвращает None, если метка не распознана.
+    """
+    token = text.strip().split(None, 1)[0] if text.strip() else ""
+    clock, _, millis = token.partition(".")
+    parts = clock.split(":")
+    if not millis.isdigit() or len(parts) not in (2, 3) or not all(part.isdigit() for part in parts):
+        return None
+    if len(parts) == 2:
+        parts.insert(0, "0")
+    hours, minutes, seconds = (int(part) for part in parts)
+    return ((hours * 60 + minutes) * 60 + seconds) * 1000 + int(millis)
+
+def read_blocks(lines):
+    """
+    Делит строки файла на блоки, разделённые пустыми строками (строка из одних
+    пробелов пустой не считается). Возвращает генератор списков строк без переводов строк.
+    """
+    block = []
+    for line in lines:
+        line = line.rstrip("\r\n")
+        if line:
+            block.append(line)
+        elif block:
+            yield block
+            block = []
+    if block:
+        yield block
+
+def parse_vtt(lines):
+    """
+    Потоково разбирает WebVTT. Возвращает генератор реплик (начало мс, конец мс, текст).
+    Как и ffmpeg, разбор останавливается на первой реплике с нераспознанным временем.
+    """
+    for index, block in enumerate(read_blocks(lines)):
+        first = block[0].lstrip("\ufeff") if index == 0 else block[0]
+        if first.startswith(HEADER_PREFIXES):
+            continue
+        # Необязательный идентификатор реплики — строка без "-->"
+        if "-->" not in first:
+            block = block[1:]
+            if not block:
+                break
+            first = block[0]
+        start_text, arrow, rest = first.partition("-->")
+        start = parse_timestamp(start_text)
+        end = parse_timestamp(rest) if arrow else None
+        if start is None or end is None:
+            break
+        yield start, end, "\n".join(block[1:])
+
+def cue_to_srt_text(payload):
+    """
+    Переводит текст реплики WebVTT в текст SubRip: теги i/b/u сохраняются и
+    закрываются, прочие теги удаляются, сущности раскрываются.
+    """
+    output = []
+    open_tags = []
+    skip = False
+    length = len(payload)
+    for match in CUE_TOKEN_RE.finditer(payload):
+        token = match.group()
+        target = TAG_REPLACEMENTS.get(token)
+        if target is not None:
+            if isinstance(target, tuple):
+                action, tag = target
+                if action == "open":
+                    output.append(f"<{tag}>")
+                    open_tags.append(tag)
+                else:
+                    output.append(f"</{tag}>")
+                    if tag in open_tags:
+                        del open_tags[len(open_tags) - 1 - open_tags[::-1].index(tag)]
+            else:
+                output.append(target)
+            skip = False
+        elif token == "<":
+            skip = True
+        elif token == ">":
+            skip = False
+        elif token == "\n":
+            if match.end() < length:
+                output.append(CUE_LINE_BREAK)
+        elif not skip and token != "\r":
+            output.append(token)
+    for tag in reversed(open_tags):
+        output.append(f"</{tag}>")
+    # ffmpeg отбрасывает пробелы в начале текста реплики (табуляции и переводы строк остаются)
+    return "".join(output).lstrip(" ")
+
+def format_timestamp(milliseconds):
+    return (
+        f"{milliseconds // 3600000:02d}:{milliseconds // 60000 % 60:02d}:"
+        f"{milliseconds // 1000 % 60:02d},{milliseconds % 1000:03d}"
+    )
+
+class CueOrderError(ValueError):
+    """
+    Реплика начинается раньше предыдущей: потоковый вывод невозможен, нужна сортировка.
+    """
+
+def vtt_to_srt_cues(cues):
+    """
+    Потоково переводит реплики WebVTT (начало мс, конец мс, текст), идущие по
+    возрастанию начала, в реплики SubRip без подряд идущих полных повторов.
+    В памяти держится одна реплика: её конец может зависеть от начала следующей.
+    Бросает CueOrderError на реплике, которая начинается раньше предыдущей.
+    """
+    previous = None
+    last = None
+    for cue in cues:
+        if previous is not None:
+            if cue[0] < previous[0]:
+                raise CueOrderError(f"реплика {format_timestamp(cue[0])} идёт после {format_timestamp(previous[0])}")
+            start, end, payload = previous
+            if end < start:
+                # Реплика с концом раньше начала длится до следующей
+                end = cue[0]
+            converted = (start, end, cue_to_srt_text(payload))
+            if converted != last:
+                yield converted
+                last = converted
+        previous = cue
+    if previous is not None:
+        start, end, payload = previous
+        converted = (start, end, cue_to_srt_text(payload))
+        if converted != last:
+            yield converted
+
+def write_srt(cues, srt_file):
+    """
+    Пишет реплики SubRip в файл по мере поступления и возвращает их количество.
+    """
+    number = 0
+    for number, (start, end, text) in enumerate(cues, start=1):
+        srt_file.write(f"{number}\n{format_timestamp(start)} --> {format_timestamp(end)}\n{text}\n\n")
+    return number
+
+def convert_vtt_file(vtt_file_path, srt_file_path):
+    """
+    Конвертирует один .vtt файл в .srt. Упорядоченные реплики пишутся потоком;
+    если встретилась реплика не по порядку, .srt пишется заново из отсортированных
+    реплик всего файла (как у ffmpeg, при равном начале порядок файла сохраняется).
+
+    :return: Количество реплик в .srt
+    """
+    with open(vtt_file_path, "r", encoding="utf-8-sig", errors="replace", newline="") as vtt_file, \
+            open(srt_file_path, "w", encoding="utf-8", newline="") as srt_file:
+        try:
+            return write_srt(vtt_to_srt_cues(parse_vtt(vtt_file)), srt_file)
+        except CueOrderError:
+            vtt_file.seek(0)
+            srt_file.seek(0)
+            srt_file.truncate()
+            cues = sorted(parse_vtt(vtt_file), key=lambda cue: cue[0])
+            return write_srt(vtt_to_srt_cues(cues), srt_file)
+
+class RollingDeduplicator:
+    """
+    Убирает повторы «бегущих» автоматических субтитров YouTube: каждая реплика
+    начинается с уже показанного текста предыдущей. Помнит последние window слов
+    выведенного текста; из новой строки отбрасывается начало, совпадающее с концом
+    этого окна (поиск перекрытия — префикс-функцией, линейно по длине окна и строки).
+
+    Чтобы не съедать настоящие повторы слов на стыке реплик, перекрытие учитывается,
+    только если оно покрывает всю строку или не короче min_overlap слов.
+    """
+
+    def __init__(self, window=ROLLING_WINDOW_WORDS, min_overlap=MIN_ROLLING_OVERLAP):
+        self.tail = deque(maxlen=window)
+        self.min_overlap = min_overlap
+
+    def overlap(self, keys):
+        """
+        Возвращает длину наибольшего начала keys, совпадающего с концом окна.
+        """
+        limit = min(len(keys), len(self.tail))
+        if not limit:
+            return 0
+        # Префикс-функция для keys[:limit] + разделитель + последние limit слов окна
+        sequence = keys[:limit] + [None] + list(self.tail)[-limit:]
+        prefix = [0] * len(sequence)
+        for position in range(1, len(sequence)):
+            length = prefix[position - 1]
+            while length and sequence[position] != sequence[length]:
+                length = prefix[length - 1]
+            if sequence[position] == sequence[length]:
+                length += 1
+            prefix[position] = length
+        return prefix[-1]
+
+    def new_words(self, words):
+        """
+        Возвращает слова строки без начала, уже показанного предыдущими репликами,
+        и добавляет их в окно.
+        """
+        keys = [TAG_RE.sub("", word) for word in words]
+        skipped = self.overlap(keys)
+        if skipped < len(words) and skipped < self.min_overlap:
+            skipped = 0
+        self.tail.extend(keys[skipped:])
+        return words[skipped:]
+
+def clean_cue_lines(text, deduplicator):
+    """
+    Чистит текст реплики SubRip: удаляет текст в квадратных скобках и повторы
+    бегущих субтитров. Возвращает список непустых строк.
+    """
+    lines = []
+    for line in text.split(CUE_LINE_BREAK):
+        words = deduplicator.new_words(BRACKETED_RE.sub("", line).split())
+        if words:
+            lines.append(" ".join(words))
+    return lines
+
+def convert_vtt_to_clean_srt_and_txt(vtt_file_path, srt_file_path, txt_file_path):
+    """
+    За одно чтение .vtt пишет очищенный .srt и .txt: реплики идут потоком в порядке
+    файла (у YouTube они упорядочены), память ограничена окном дедупликации.
+    Реплики, в которых после очистки не осталось текста, не выводятся; в .txt
+    каждая реплика — одна строка без тегов.
+
+    :return: Количество реплик в .srt
+    """
+    number = 0
+    previous_cue = None
+    deduplicator = RollingDeduplicator()
+    with open(vtt_file_path, "r", encoding="utf-8-sig", errors="replace", newline="") as vtt_file, \
+            open(srt_file_path, "w", encoding="utf-8", newline="") as srt_file, \
+            open(txt_file_path, "w", encoding="utf-8") as txt_file:
+        for cue in parse_vtt(vtt_file):
+            if cue == previous_cue:
+                continue
+            previous_cue = cue
+            start, end, payload = cue
+            lines = clean_cue_lines(cue_to_srt_text(payload), deduplicator)
+            if not lines:
+                continue
+            number += 1
+            srt_file.write(
+                f"{number}\n{format_timestamp(start)} --> {format_timestamp(end)}\n"
+                f"{CUE_LINE_BREAK.join(lines)}\n\n"
+            )
+            txt_file.write(TAG_RE.sub("", " ".join(lines)) + "\n")
+    return number
+
+def convert_job(paths):
+    vtt_file_path, srt_file_path, txt_file_path = paths
+    try:
+        if txt_file_path is None:
+            return vtt_file_path, convert_vtt_file(vtt_file_path, srt_file_path), None
+        return vtt_file_path, convert_vtt_to_clean_srt_and_txt(vtt_file_path, srt_file_path, txt_file_path), None
+    except Exception as e:
+        return vtt_file_path, 0, str(e)
+
+def find_vtt_files(folder):
+    """
+    Возвращает список пар (.vtt, .srt) для всех .vtt файлов папки.
+    """
+    return [
+        (os.path.join(folder, name), os.path.join(folder, os.path.splitext(name)[0] + ".srt"))
+        for name in sorted(os.listdir(folder)) if name.lower().endswith(".vtt")
+    ]
+
+def convert_files(vtt_file_paths, workers=None, txt_dir=None):
+    """
+    Конвертирует перечисленные .vtt файлы в .srt (рядом с ними) пулом процессов.
+
+    :param workers: Количество процессов (по умолчанию — по числу ядер)
+    :param txt_dir: Если задана, .srt очищаются (скобки, повторы) и рядом пишутся .txt в эту папку
+    :return: Кортеж (список сконвертированных .vtt, словарь {.vtt: текст ошибки})
+    """
+    if txt_dir is not None:
+        os.makedirs(txt_dir, exist_ok=True)
+    jobs = []
+    for vtt_file_path in vtt_file_paths:
+        base = os.path.splitext(vtt_file_path)[0]
+        txt_file_path = None if txt_dir is None else os.path.join(txt_dir, os.path.basename(base) + ".txt")
+        jobs.append((vtt_file_path, base + ".srt", txt_file_path))
+    converted, errors = [], {}
+    if not jobs:
+        return converted, errors
+    workers = workers or os.cpu_count() or 1
+    # На маленьких папках запуск пула дороже самой работы
+    if workers == 1 or len(jobs) < 8:
+        results = [convert_job(job) for job in jobs]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            results = list(executor.map(convert_job, jobs, chunksize=max(1, len(jobs) // (workers * 4))))
+    for vtt_file_path, _, error in results:
+        if error is None:
+            converted.append(vtt_file_path)
+        else:
+            errors[vtt_file_path] = error
+    return converted, errors
+
+def convert_folder(folder, workers=None, txt_dir=None):
+    """
+    Конвертирует все .vtt файлы папки в .srt пулом процессов (см. convert_files).
+    """
+    return convert_files([vtt_file_path for vtt_file_path, _ in find_vtt_files(folder)], workers, txt_dir)
+
+def convert_with_ffmpeg(vtt_file_path, srt_file_path):
+    """
+    Конвертирует файл через ffmpeg (прежний способ) — для сравнения и бенчмарка.
+    """
+    subprocess.run(
+        ["ffmpeg", "-y", "-i", vtt_file_path, srt_file_path],
+        check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+
+def compare_with_ffmpeg(folder):
+    """
+    Сравнивает побайтно результат встроенного конвертера и ffmpeg для всех .vtt папки.
+
+    :return: Список .vtt файлов, для которых результаты различаются
+    """
+    different = []
+    with tempfile.TemporaryDirectory() as temp_dir:
+        native_path = os.path.join(temp_dir, "native.srt")
+        ffmpeg_path = os.path.join(temp_dir, "ffmpeg.srt")
+        for vtt_file_path, _ in find_vtt_files(folder):
+            convert_vtt_file(vtt_file_path, native_path)
+            convert_with_ffmpeg(vtt_file_path, ffmpeg_path)
+            with open(native_path, "rb") as native, open(ffmpeg_path, "rb") as reference:
+                if native.read() != reference.read():
+                    different.append(vtt_file_path)
+    return different
+
+def parse_args(argv=None):
+    """
+    Разбирает аргументы командной строки.
+    """
+    parser = argparse.ArgumentParser(description="Конвертирует .vtt субтитры в .srt без ffmpeg.")
+    parser.add_argument("folder", help="Папка с .vtt файлами.")
+    parser.add_argument("--workers", type=int, default=None, help="Количество процессов (по умолчанию — по числу ядер).")
+    parser.add_argument(
+        "--txt", default=None,
+        help="Папка для .txt: очистить .srt от скобок и повторов и сразу записать текст.",
+    )
+    parser.add_argument(
+        "--compare", action="store_true",
+        help="Не конвертировать, а сравнить побайтно с ffmpeg (нужен ffmpeg в PATH).",
+    )
+    return parser.parse_args(argv)
+
+def main():
+    args = parse_args()
+    if args.compare:
+        different = compare_with_ffmpeg(args.folder)
+        total = len(find_vtt_files(args.folder))
+        print(f"Совпадает с ffmpeg: {total - len(different)} из {total}")
+        for vtt_file_path in different:
+            print(f"  различается: {vtt_file_path}")
+        sys.exit(1 if different else 0)
+
+    converted, errors = convert_folder(args.folder, args.workers, args.txt)
+    print(f"Конвертировано: {len(converted)}")
+    for vtt_file_path, error in errors.items():
+        print(f"Ошибка конвертации {vtt_file_path}: {error}")
+
+if __name__ == "__main__":
+    main()